@@ -1,4 +1,4 @@
 # -*- coding: utf-8 -*-
 # Copyright 2020 - Today Techkhedut.
 # Part of Techkhedut. See LICENSE file for full copyright and licensing details.
-from . import models,wizard
\ No newline at end of file
+from . import controllers,models,wizard
\ No newline at end of file
@@ -15,7 +15,7 @@
         - Construction Waste Management
     """,
     'summary': """Construction Management - Job Costing, Job Order, Job Cost Sheet, Project Site, & Scrape Order Management""",
-    'version': "3.0.1.0.0",
+    'version': "3.0.1.0.1",
     'author': 'TechKhedut Inc.',
     'company': 'TechKhedut Inc.',
     'maintainer': 'TechKhedut Inc.',
@@ -23,15 +23,21 @@
     'category': 'Industry',
     'depends': ['base', 'contacts', 'account', 'sale_management', 'purchase', 'hr', 'project', 'calendar', 'stock',
                 'mail', 'hr_timesheet', 'web'],
+    'external_dependencies': {'python': ['numpy']},
     'data': [
         # security
         'security/ir.model.access.csv',
         # Data
         'data/sequence.xml',
         'data/construction_data.xml',
+        'data/ir_cron_data.xml',
         # Wizard Views
         'wizard/construction_inspection_view.xml',
         'wizard/import_task_library_view.xml',
+        'wizard/import_boq_view.xml',
+        'wizard/boq_revision_compare_view.xml',
+        'wizard/reprice_view.xml',
+        'wizard/escalation_view.xml',
         # Views
         'views/assets.xml',
         'views/construction_details_view.xml',
@@ -51,7 +57,10 @@
         'views/progress_billing_view.xml',
         'views/work_type_view.xml',
         'views/boq_view.xml',
+        'views/budget_variance_view.xml',
         'views/rate_analysis_view.xml',
+        'views/escalation_view.xml',
+        'views/scenario_view.xml',
         'views/wbs_view.xml',
         'views/material_requisition_view.xml',
         'views/subcontracting_view.xml',
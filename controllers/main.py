@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from flectra import http
+from flectra.http import request
+
+# Catalog of the type-ahead endpoint: (model, domain)
+CATALOG_SEARCH_MODELS = {
+    'task_library': ('construction.task.library', []),
+    'tools': ('construction.tools.catalog', []),
+    'material': ('product.product', [('is_material', '=', True)]),
+    'equipment': ('product.product', [('is_equipment', '=', True)]),
+    'product': ('product.product', []),
+}
+CATALOG_SEARCH_MAX_LIMIT = 50
+
+
+class CatalogSearchController(http.Controller):
+
+    @http.route('/construction/catalog_search/<string:catalog>', type='json', auth='user')
+    def catalog_search(self, catalog, term='', limit=8):
+        """Type-ahead over a construction catalog: the best matches of ``term`` as ``[{id, name}]``"""
+        if catalog not in CATALOG_SEARCH_MODELS:
+            raise request.not_found()
+        model, domain = CATALOG_SEARCH_MODELS[catalog]
+        limit = max(1, min(int(limit), CATALOG_SEARCH_MAX_LIMIT))
+        return [{'id': record_id, 'name': name}
+                for record_id, name in request.env[model].name_search(term, domain, limit=limit)]
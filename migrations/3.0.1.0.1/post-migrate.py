@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+from flectra import api, SUPERUSER_ID
+
+
+def migrate(cr, version):
+    # the ledger replaces the bill aggregation, fill it from the existing bills
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    env['construction.cost.ledger']._rebuild_ledger()
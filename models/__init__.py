@@ -7,15 +7,22 @@ from . import purchase_order
 from . import project_project
 from . import construction_dashboard
 from . import construction_project
+from . import rate_analysis
 from . import job_costing
 from . import progress_billing
 from . import work_type
+from . import rollup
 from . import boq
-from . import rate_analysis
+from . import boq_revision
 from . import wbs
 from . import material_requisition
 from . import subcontracting
 from . import consume_order
 from . import stock
+from . import catalog_search
 from . import tools_catalog
-from . import task_library
\ No newline at end of file
+from . import task_library
+from . import escalation
+from . import scenario
+from . import cost_ledger
+from . import budget_variance
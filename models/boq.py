@@ -5,6 +5,7 @@ from flectra.exceptions import ValidationError
 
 class BOQ(models.Model):
     _name = 'construction.boq'
+    _inherit = ['construction.rollup.parent.mixin']
     _description = 'Bill of Quantity'
     _order = 'id desc'
 
@@ -13,11 +14,11 @@ class BOQ(models.Model):
     company_id = fields.Many2one('res.company', string='Company', default=lambda self: self.env.company)
     currency_id = fields.Many2one(related='company_id.currency_id', string='Currency', readonly=True)
     line_ids = fields.One2many('construction.boq.line', 'boq_id', string='BOQ Lines')
-    total_material = fields.Monetary(string='Total Material', compute='_compute_totals', store=True)
-    total_equipment = fields.Monetary(string='Total Equipment', compute='_compute_totals', store=True)
-    total_labor = fields.Monetary(string='Total Labor', compute='_compute_totals', store=True)
-    total_overhead = fields.Monetary(string='Total Overhead', compute='_compute_totals', store=True)
-    total_budget = fields.Monetary(string='Total Budget', compute='_compute_totals', store=True)
+    total_material = fields.Monetary(string='Total Material', readonly=True, copy=False)
+    total_equipment = fields.Monetary(string='Total Equipment', readonly=True, copy=False)
+    total_labor = fields.Monetary(string='Total Labor', readonly=True, copy=False)
+    total_overhead = fields.Monetary(string='Total Overhead', readonly=True, copy=False)
+    total_budget = fields.Monetary(string='Total Budget', readonly=True, copy=False)
     state = fields.Selection([
         ('draft', 'Draft'),
         ('approved', 'Approved'),
@@ -31,8 +32,8 @@ class BOQ(models.Model):
                 vals['name'] = self.env['ir.sequence'].next_by_code('construction.boq') or 'New'
         return super().create(vals_list)
 
-    @api.depends('line_ids')
-    def _compute_totals(self):
+    @api.onchange('line_ids')
+    def _onchange_totals(self):
         for rec in self:
             rec.total_material = sum(rec.line_ids.mapped('material_total'))
             rec.total_equipment = sum(rec.line_ids.mapped('equipment_total'))
@@ -40,16 +41,120 @@ class BOQ(models.Model):
             rec.total_overhead = sum(rec.line_ids.mapped('overhead_total'))
             rec.total_budget = rec.total_material + rec.total_equipment + rec.total_labor + rec.total_overhead
 
+    @api.model
+    def _cron_reconcile_totals(self):
+        """Rebuild the rolled-up totals of the BOQs and WBS phases, lines first"""
+        self.env['construction.boq.line']._reconcile_rollup_totals()
+        self._reconcile_rollup_totals()
+        self.env['construction.project.phase']._reconcile_rollup_totals()
+
     def action_approve(self):
         self.write({'state': 'approved'})
 
+    def action_apply_rates(self):
+        """Price every BOQ line from the rate analysis of its work type, sub type and unit"""
+        self.line_ids.action_apply_rates()
+
     def action_cancel(self):
         self.write({'state': 'cancel'})
 
+    def action_generate_phases(self):
+        """Generate one WBS phase per BOQ line of the approved BOQs, with all their entries.
+
+        Phases and entries are created in batches; the phase totals are taken over from the
+        BOQ lines so the entries skip the rollup. Lines that already have a phase are skipped.
+        """
+        if any(rec.state != 'approved' for rec in self):
+            raise ValidationError("! Only approved BOQs can generate WBS phases")
+        Phase = self.env['construction.project.phase']
+        done_line_ids = set(Phase.search([('boq_line_id', 'in', self.line_ids.ids)]).boq_line_id.ids)
+        lines = self.line_ids.filtered(lambda line: line.id not in done_line_ids)
+        phases = Phase.create([{
+            'name': '%s - %s' % (line.work_type_id.name, line.description.splitlines()[0]),
+            'project_id': line.boq_id.project_id.id,
+            'sequence': 10 * (index + 1),
+            'work_type_id': line.work_type_id.id,
+            'work_subtype_id': line.work_subtype_id.id,
+            'description': line.description,
+            'boq_line_id': line.id,
+            'total_material': line.material_total,
+            'total_equipment': line.equipment_total,
+            'total_labor': line.labor_total,
+            'total_overhead': line.overhead_total,
+            'total_cost': line.total,
+        } for index, line in enumerate(lines)])
+        entries = {'material': [], 'equipment': [], 'labor': [], 'overhead': []}
+        for line, phase in zip(lines, phases):
+            for entry in line.material_line_ids:
+                entries['material'].append({
+                    'phase_id': phase.id,
+                    'product_id': entry.product_id.id,
+                    'boq_quantity': entry.quantity,
+                    'quantity': entry.quantity,
+                    'unit_price': entry.unit_price,
+                })
+            for entry in line.equipment_line_ids:
+                entries['equipment'].append({
+                    'phase_id': phase.id,
+                    'product_id': entry.product_id.id,
+                    'boq_quantity': entry.quantity,
+                    'quantity': entry.quantity,
+                    'unit_price': entry.unit_price,
+                })
+            for entry in line.labor_line_ids:
+                entries['labor'].append({
+                    'phase_id': phase.id,
+                    'name': entry.name,
+                    'boq_hours': entry.hours,
+                    'hours': entry.hours,
+                    'rate': entry.rate,
+                })
+            for entry in line.overhead_line_ids:
+                entries['overhead'].append({
+                    'phase_id': phase.id,
+                    'name': entry.name,
+                    'amount': entry.amount,
+                })
+        for entry_type, vals_list in entries.items():
+            if vals_list:
+                self.env['construction.phase.%s.entry' % entry_type].with_context(rollup_skip=True).create(vals_list)
+        return self.action_view_phases()
+
+    def action_view_phases(self):
+        return {
+            'type': 'ir.actions.act_window',
+            'name': 'Project Phases',
+            'res_model': 'construction.project.phase',
+            'view_mode': 'tree,form',
+            'domain': [('boq_line_id.boq_id', 'in', self.ids)],
+            'target': 'current'
+        }
+
+    def action_import_lines(self):
+        """Open wizard to import BOQ lines from a CSV or XLSX file"""
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': 'Import BOQ Lines',
+            'res_model': 'construction.import.boq.wizard',
+            'view_mode': 'form',
+            'target': 'new',
+            'context': {'default_boq_id': self.id}
+        }
+
 
 class BOQLine(models.Model):
     _name = 'construction.boq.line'
+    _inherit = ['construction.rollup.mixin', 'construction.rollup.parent.mixin',
+                'construction.rate.pricing.mixin']
     _description = 'BOQ Line'
+    _rollup_parent = 'boq_id'
+    _rollup_fields = {
+        'material_total': ('total_material', 'total_budget'),
+        'equipment_total': ('total_equipment', 'total_budget'),
+        'labor_total': ('total_labor', 'total_budget'),
+        'overhead_total': ('total_overhead', 'total_budget'),
+    }
 
     boq_id = fields.Many2one('construction.boq', string='BOQ', required=True, ondelete='cascade')
     work_type_id = fields.Many2one('construction.work.type', string='Work Type', required=True)
@@ -60,27 +165,27 @@ class BOQLine(models.Model):
     
     # Material
     material_line_ids = fields.One2many('construction.boq.material.line', 'boq_line_id', string='Materials')
-    material_total = fields.Monetary(string='Material Total', compute='_compute_totals', store=True)
+    material_total = fields.Monetary(string='Material Total', readonly=True, copy=False)
     
     # Equipment
     equipment_line_ids = fields.One2many('construction.boq.equipment.line', 'boq_line_id', string='Equipment')
-    equipment_total = fields.Monetary(string='Equipment Total', compute='_compute_totals', store=True)
+    equipment_total = fields.Monetary(string='Equipment Total', readonly=True, copy=False)
     
     # Labor
     labor_line_ids = fields.One2many('construction.boq.labor.line', 'boq_line_id', string='Labor')
-    labor_total = fields.Monetary(string='Labor Total', compute='_compute_totals', store=True)
+    labor_total = fields.Monetary(string='Labor Total', readonly=True, copy=False)
     
     # Overhead
     overhead_line_ids = fields.One2many('construction.boq.overhead.line', 'boq_line_id', string='Overhead')
-    overhead_total = fields.Monetary(string='Overhead Total', compute='_compute_totals', store=True)
+    overhead_total = fields.Monetary(string='Overhead Total', readonly=True, copy=False)
     
-    total = fields.Monetary(string='Line Total', compute='_compute_totals', store=True)
+    total = fields.Monetary(string='Line Total', readonly=True, copy=False)
     
     company_id = fields.Many2one(related='boq_id.company_id', store=True, readonly=True)
     currency_id = fields.Many2one(related='boq_id.currency_id', store=True, readonly=True)
 
-    @api.depends('material_line_ids', 'equipment_line_ids', 'labor_line_ids', 'overhead_line_ids')
-    def _compute_totals(self):
+    @api.onchange('material_line_ids', 'equipment_line_ids', 'labor_line_ids', 'overhead_line_ids')
+    def _onchange_totals(self):
         for rec in self:
             rec.material_total = sum(rec.material_line_ids.mapped('total'))
             rec.equipment_total = sum(rec.equipment_line_ids.mapped('total'))
@@ -97,7 +202,10 @@ class BOQLine(models.Model):
 
 class BOQMaterialLine(models.Model):
     _name = 'construction.boq.material.line'
+    _inherit = ['construction.rollup.mixin']
     _description = 'BOQ Material Line'
+    _rollup_parent = 'boq_line_id'
+    _rollup_fields = {'total': ('material_total', 'total')}
 
     boq_line_id = fields.Many2one('construction.boq.line', string='BOQ Line', required=True, ondelete='cascade')
     product_id = fields.Many2one('product.product', string='Material', required=True, domain=[('is_material', '=', True)])
@@ -116,7 +224,10 @@ class BOQMaterialLine(models.Model):
 
 class BOQEquipmentLine(models.Model):
     _name = 'construction.boq.equipment.line'
+    _inherit = ['construction.rollup.mixin']
     _description = 'BOQ Equipment Line'
+    _rollup_parent = 'boq_line_id'
+    _rollup_fields = {'total': ('equipment_total', 'total')}
 
     boq_line_id = fields.Many2one('construction.boq.line', string='BOQ Line', required=True, ondelete='cascade')
     product_id = fields.Many2one('product.product', string='Equipment', required=True, domain=[('is_equipment', '=', True)])
@@ -135,7 +246,10 @@ class BOQEquipmentLine(models.Model):
 
 class BOQLaborLine(models.Model):
     _name = 'construction.boq.labor.line'
+    _inherit = ['construction.rollup.mixin']
     _description = 'BOQ Labor Line'
+    _rollup_parent = 'boq_line_id'
+    _rollup_fields = {'total': ('labor_total', 'total')}
 
     boq_line_id = fields.Many2one('construction.boq.line', string='BOQ Line', required=True, ondelete='cascade')
     name = fields.Char(string='Labor Description', required=True)
@@ -153,7 +267,10 @@ class BOQLaborLine(models.Model):
 
 class BOQOverheadLine(models.Model):
     _name = 'construction.boq.overhead.line'
+    _inherit = ['construction.rollup.mixin']
     _description = 'BOQ Overhead Line'
+    _rollup_parent = 'boq_line_id'
+    _rollup_fields = {'total': ('overhead_total', 'total')}
 
     boq_line_id = fields.Many2one('construction.boq.line', string='BOQ Line', required=True, ondelete='cascade')
     name = fields.Char(string='Overhead Description', required=True)
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+
+from flectra import fields, api, models
+from flectra.exceptions import ValidationError
+from flectra.tools import lru
+
+# BOQ line fields kept in a revision
+REVISION_LINE_FIELDS = ['work_type_id', 'work_subtype_id', 'description', 'quantity', 'unit_id',
+                        'material_total', 'equipment_total', 'labor_total', 'overhead_total', 'total']
+REVISION_TOTAL_FIELDS = ['material_total', 'equipment_total', 'labor_total', 'overhead_total', 'total']
+# Cost lines kept with each BOQ line of a revision: snapshot key: (line model, fields)
+REVISION_COST_LINES = {
+    'material_lines': ('construction.boq.material.line', ['product_id', 'quantity', 'unit_price', 'total']),
+    'equipment_lines': ('construction.boq.equipment.line', ['product_id', 'quantity', 'unit_price', 'total']),
+    'labor_lines': ('construction.boq.labor.line', ['name', 'hours', 'rate', 'total']),
+    'overhead_lines': ('construction.boq.overhead.line', ['name', 'amount', 'total']),
+}
+# Rebuilt revisions never change, they are kept per (database, revision id)
+REVISION_CACHE = lru.LRU(128)
+
+
+class BOQRevision(models.Model):
+    _name = 'construction.boq.revision'
+    _description = 'BOQ Revision'
+    _order = 'boq_id, number desc'
+
+    name = fields.Char(string='Revision', required=True, readonly=True)
+    boq_id = fields.Many2one('construction.boq', string='BOQ', required=True, index=True, ondelete='cascade')
+    number = fields.Integer(string='Number', readonly=True)
+    parent_id = fields.Many2one('construction.boq.revision', string='Previous Revision', readonly=True,
+                                ondelete='restrict')
+    date = fields.Datetime(string='Date', default=fields.Datetime.now, readonly=True)
+    user_id = fields.Many2one('res.users', string='Revised By', default=lambda self: self.env.user, readonly=True)
+    note = fields.Char(string='Note')
+    diff = fields.Json(string='Changes', readonly=True)
+    changed_line_count = fields.Integer(string='Changed Lines', readonly=True)
+    removed_line_count = fields.Integer(string='Removed Lines', readonly=True)
+    company_id = fields.Many2one(related='boq_id.company_id', store=True, readonly=True)
+    currency_id = fields.Many2one(related='boq_id.currency_id', readonly=True)
+    total_budget = fields.Monetary(string='Total Budget', readonly=True)
+
+    _sql_constraints = [
+        ('unique_boq_number', 'unique (boq_id, number)', 'Revision numbers must be unique per BOQ')
+    ]
+
+    @api.model
+    def _diff_snapshots(self, old, new):
+        """Return the lines of ``new`` that differ from ``old`` and the lines ``new`` no longer has"""
+        return {
+            'changed': {key: values for key, values in new.items() if old.get(key) != values},
+            'removed': [key for key in old if key not in new],
+        }
+
+    def _get_snapshot(self):
+        """Rebuild the BOQ lines of the revision as ``{line id: values}``.
+
+        The values hold the BOQ line fields and, under the keys of ``REVISION_COST_LINES``, the
+        material, equipment, labor and overhead lines as lists of field values. A BOQ line whose
+        cost lines changed is stored whole in the diff. The diffs are applied from the first
+        revision on; the result is shared and must not be modified.
+        """
+        self.ensure_one()
+        dbname = self.env.cr.dbname
+        chain = []
+        snapshot = None
+        revision = self
+        while revision:
+            snapshot = REVISION_CACHE.get((dbname, revision.id))
+            if snapshot is not None:
+                break
+            chain.append(revision)
+            revision = revision.parent_id
+        snapshot = snapshot or {}
+        for revision in reversed(chain):
+            snapshot = dict(snapshot)
+            for line_key in revision.diff['removed']:
+                snapshot.pop(line_key, None)
+            snapshot.update(revision.diff['changed'])
+            REVISION_CACHE[(dbname, revision.id)] = snapshot
+        return snapshot
+
+    def _get_work_type_totals(self):
+        """Return the costs of the revision per work type as ``{work type id: {field: amount}}``"""
+        totals = defaultdict(lambda: dict.fromkeys(REVISION_TOTAL_FIELDS, 0.0))
+        for values in self._get_snapshot().values():
+            for field in REVISION_TOTAL_FIELDS:
+                totals[values['work_type_id']][field] += values[field] or 0.0
+        return totals
+
+    def _compare(self, other):
+        """Compare the revision with ``other`` per work type.
+
+        :return: list of dicts with the work type, the totals of both revisions and the
+            cost deltas of ``other`` against this revision, biggest change first
+        """
+        self.ensure_one()
+        other.ensure_one()
+        old_totals, new_totals = self._get_work_type_totals(), other._get_work_type_totals()
+        result = []
+        for work_type_id in set(old_totals) | set(new_totals):
+            old, new = old_totals.get(work_type_id), new_totals.get(work_type_id)
+            old = old or dict.fromkeys(REVISION_TOTAL_FIELDS, 0.0)
+            new = new or dict.fromkeys(REVISION_TOTAL_FIELDS, 0.0)
+            values = {'work_type_id': work_type_id, 'old_total': old['total'], 'new_total': new['total']}
+            for field in REVISION_TOTAL_FIELDS:
+                values['%s_delta' % field] = new[field] - old[field]
+            result.append(values)
+        result.sort(key=lambda values: abs(values['total_delta']), reverse=True)
+        return result
+
+    def write(self, vals):
+        if {'diff', 'parent_id', 'boq_id', 'number'}.intersection(vals):
+            raise ValidationError("! A BOQ revision cannot be changed once created")
+        return super().write(vals)
+
+
+class BOQ(models.Model):
+    _inherit = 'construction.boq'
+
+    revision_ids = fields.One2many('construction.boq.revision', 'boq_id', string='Revisions')
+    current_revision_id = fields.Many2one('construction.boq.revision', string='Current Revision', readonly=True,
+                                          copy=False)
+    revision_count = fields.Integer(string='Revision Count', compute='_compute_revision_count')
+
+    @api.depends('revision_ids')
+    def _compute_revision_count(self):
+        data = self.env['construction.boq.revision'].read_group(
+            [('boq_id', 'in', self.ids)], ['__count'], ['boq_id'], lazy=False)
+        counts = {entry['boq_id'][0]: entry['__count'] for entry in data}
+        for rec in self:
+            rec.revision_count = counts.get(rec.id, 0)
+
+    def _get_line_snapshots(self):
+        """Return the current lines of each BOQ as ``{boq id: {line id: values}}``"""
+        snapshots = {rec.id: {} for rec in self}
+        lines = self.env['construction.boq.line'].search_read([('boq_id', 'in', self.ids)],
+                                                                ['boq_id'] + REVISION_LINE_FIELDS)
+        line_values = {}
+        for line in lines:
+            values = {field: line[field][0] if isinstance(line[field], tuple) else line[field]
+                      for field in REVISION_LINE_FIELDS}
+            values.update({key: [] for key in REVISION_COST_LINES})
+            snapshots[line['boq_id'][0]][str(line['id'])] = line_values[line['id']] = values
+        for key, (model, fields_list) in REVISION_COST_LINES.items():
+            cost_lines = self.env[model].search_read([('boq_line_id', 'in', list(line_values))],
+                                                     ['boq_line_id'] + fields_list, load=None,
+                                                     order='boq_line_id, id')
+            for cost_line in cost_lines:
+                line_values[cost_line['boq_line_id']][key].append([cost_line[field] for field in fields_list])
+        return snapshots
+
+    def action_create_revision(self, note=False):
+        """Record the current lines of the BOQs as a new revision holding only the lines changed since
+        the previous one"""
+        Revision = self.env['construction.boq.revision']
+        snapshots = self._get_line_snapshots()
+        vals_list = []
+        for rec in self:
+            parent = rec.current_revision_id
+            diff = Revision._diff_snapshots(parent._get_snapshot() if parent else {}, snapshots[rec.id])
+            if parent and not diff['changed'] and not diff['removed']:
+                continue
+            number = parent.number + 1 if parent else 1
+            vals_list.append({
+                'name': '%s - Rev %s' % (rec.name, number),
+                'boq_id': rec.id,
+                'number': number,
+                'parent_id': parent.id,
+                'note': note,
+                'diff': diff,
+                'changed_line_count': len(diff['changed']),
+                'removed_line_count': len(diff['removed']),
+                'total_budget': rec.total_budget,
+            })
+        revisions = Revision.create(vals_list)
+        for revision in revisions:
+            revision.boq_id.current_revision_id = revision
+        return revisions
+
+    def action_approve(self):
+        res = super().action_approve()
+        self.action_create_revision(note="Approved")
+        return res
+
+    def action_compare_revisions(self):
+        """Open wizard to compare two revisions of the BOQ"""
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': 'Compare Revisions',
+            'res_model': 'construction.boq.revision.compare',
+            'view_mode': 'form',
+            'target': 'new',
+            'context': {'default_boq_id': self.id}
+        }
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+from flectra import fields, models, tools
+
+
+class BudgetVarianceReport(models.Model):
+    """Budget against actual costs per sub-project, work type and sub type.
+
+    Budgets come from the BOQ lines and the WBS phases. Committed costs are the confirmed purchase
+    order lines, actual costs are the posted vendor bills and the consumed stock moves. Documents
+    only linked to a construction are reported on its project, without work type.
+    """
+    _name = 'construction.budget.variance.report'
+    _description = 'Budget vs Actual Report'
+    _auto = False
+    _rec_name = 'project_id'
+    _order = 'project_id, work_type_id, work_subtype_id'
+
+    project_id = fields.Many2one('project.project', string='Sub Project', readonly=True)
+    work_type_id = fields.Many2one('construction.work.type', string='Work Type', readonly=True)
+    work_subtype_id = fields.Many2one('construction.work.subtype', string='Work Sub Type', readonly=True)
+    company_id = fields.Many2one('res.company', string='Company', readonly=True)
+    currency_id = fields.Many2one(related='company_id.currency_id', readonly=True)
+    boq_amount = fields.Monetary(string='BOQ Budget', readonly=True)
+    wbs_amount = fields.Monetary(string='WBS Budget', readonly=True)
+    committed_amount = fields.Monetary(string='Committed (PO)', readonly=True)
+    billed_amount = fields.Monetary(string='Billed', readonly=True)
+    consumed_amount = fields.Monetary(string='Consumed Stock', readonly=True)
+    actual_amount = fields.Monetary(string='Actual Cost', readonly=True)
+    variance_amount = fields.Monetary(string='Variance', readonly=True)
+
+    def _budget_query(self):
+        return """
+            SELECT boq.project_id, line.work_type_id, line.work_subtype_id, line.company_id,
+                   line.total AS boq_amount, 0.0 AS wbs_amount, 0.0 AS committed_amount,
+                   0.0 AS billed_amount, 0.0 AS consumed_amount
+              FROM construction_boq_line line
+              JOIN construction_boq boq ON boq.id = line.boq_id
+             WHERE boq.state != 'cancel'
+            UNION ALL
+            SELECT phase.project_id, phase.work_type_id, phase.work_subtype_id, phase.company_id,
+                   0.0, phase.total_cost, 0.0, 0.0, 0.0
+              FROM construction_project_phase phase
+             WHERE phase.state != 'cancel'
+        """
+
+    def _actual_query(self):
+        # Purchase orders and bills take their phase from a requisition or a subcontract,
+        # directly or through its work order; order lines are converted to the company currency
+        # at the rate of their order
+        return """
+            SELECT COALESCE(requisition.project_id, subcontract.project_id, construction.project_id),
+                   phase.work_type_id, phase.work_subtype_id, po.company_id,
+                   0.0, 0.0, pol.price_subtotal / COALESCE(NULLIF(po.currency_rate, 0), 1), 0.0, 0.0
+              FROM purchase_order_line pol
+              JOIN purchase_order po ON po.id = pol.order_id
+         LEFT JOIN construction_material_requisition requisition ON requisition.id = po.material_requisition_id
+         LEFT JOIN construction_subcontract subcontract ON subcontract.id = po.subcontract_id
+         LEFT JOIN construction_details construction ON construction.id = po.construction_id
+         LEFT JOIN construction_work_order work_order
+                ON work_order.id = COALESCE(requisition.work_order_id, subcontract.work_order_id)
+         LEFT JOIN construction_project_phase phase
+                ON phase.id = COALESCE(requisition.phase_id, subcontract.phase_id, work_order.phase_id)
+             WHERE po.state IN ('purchase', 'done')
+            UNION ALL
+            SELECT COALESCE(subcontract.project_id, construction.project_id),
+                   phase.work_type_id, phase.work_subtype_id, move.company_id,
+                   0.0, 0.0, 0.0, -move.amount_untaxed_signed, 0.0
+              FROM account_move move
+         LEFT JOIN construction_subcontract subcontract ON subcontract.id = move.subcontract_id
+         LEFT JOIN construction_details construction ON construction.id = move.construction_id
+         LEFT JOIN construction_work_order work_order ON work_order.id = subcontract.work_order_id
+         LEFT JOIN construction_project_phase phase
+                ON phase.id = COALESCE(subcontract.phase_id, work_order.phase_id)
+             WHERE move.state = 'posted' AND move.move_type IN ('in_invoice', 'in_refund')
+               AND (move.subcontract_id IS NOT NULL OR move.construction_id IS NOT NULL)
+            UNION ALL
+            SELECT consume.project_id, work_order.work_type_id, work_order.work_subtype_id, sm.company_id,
+                   0.0, 0.0, 0.0, 0.0, sm.product_uom_qty * COALESCE(sm.price_unit, 0.0)
+              FROM stock_move sm
+              JOIN construction_consume_order consume ON consume.id = sm.consume_order_id
+         LEFT JOIN construction_work_order work_order ON work_order.id = consume.work_order_id
+             WHERE sm.state = 'done'
+        """
+
+    def _query(self):
+        return """
+            SELECT ROW_NUMBER() OVER (ORDER BY project_id, work_type_id, work_subtype_id, company_id) AS id,
+                   project_id, work_type_id, work_subtype_id, company_id,
+                   SUM(boq_amount) AS boq_amount,
+                   SUM(wbs_amount) AS wbs_amount,
+                   SUM(committed_amount) AS committed_amount,
+                   SUM(billed_amount) AS billed_amount,
+                   SUM(consumed_amount) AS consumed_amount,
+                   SUM(billed_amount + consumed_amount) AS actual_amount,
+                   SUM(boq_amount - billed_amount - consumed_amount) AS variance_amount
+              FROM (%s UNION ALL %s) AS source (project_id, work_type_id, work_subtype_id, company_id,
+                                               boq_amount, wbs_amount, committed_amount,
+                                               billed_amount, consumed_amount)
+             WHERE project_id IS NOT NULL
+          GROUP BY project_id, work_type_id, work_subtype_id, company_id
+        """ % (self._budget_query(), self._actual_query())
+
+    def init(self):
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        self.env.cr.execute("CREATE OR REPLACE VIEW %s AS (%s)" % (self._table, self._query()))
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import logging
+
+import psycopg2
+
+from flectra import fields, api, models
+from flectra.tools import SQL
+
+_logger = logging.getLogger(__name__)
+
+# Trigrams need three characters, shorter terms keep the default prefix search
+TRIGRAM_MIN_LENGTH = 3
+# SQL wrapper of the ``<%`` word similarity operator, inlined by the planner so that the trigram
+# indexes are used; the ``%`` character can not be written in composed queries
+TRIGRAM_MATCH_FUNCTION = """
+    CREATE OR REPLACE FUNCTION construction_trigram_match(term text, value text) RETURNS boolean
+    AS $$ SELECT term <% value $$ LANGUAGE sql STABLE PARALLEL SAFE
+"""
+
+
+class CatalogSearchMixin(models.AbstractModel):
+    """Ranked fuzzy ``name_search`` over trigram indexed columns.
+
+    The searched fields are declared with ``index='trigram'``. A record matches when one of them
+    contains the term or holds a word similar to it; the matches are ranked by word similarity.
+    """
+    _name = 'construction.catalog.search.mixin'
+    _description = 'Catalog Trigram Search'
+    _catalog_search_fields = ['name']
+
+    def init(self):
+        super().init()
+        if not self.pool.has_trigram:
+            try:
+                with self.env.cr.savepoint():
+                    self.env.cr.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+                self.pool.has_trigram = True
+            except psycopg2.Error:
+                _logger.warning("The pg_trgm extension is not available, %s is searched without ranking",
+                                self._name)
+                return
+        self.env.cr.execute(TRIGRAM_MATCH_FUNCTION)
+
+    @api.model
+    def _get_catalog_search_expression(self, model, alias, field_name):
+        """Return the SQL expression of a searched field, as indexed by ``index='trigram'``"""
+        column = SQL.identifier(alias, field_name)
+        if model._fields[field_name].translate:
+            column = SQL("(jsonb_path_query_array(%s, '$.*')::text)", column)
+        return self.pool.unaccent(column)
+
+    def _get_catalog_search_expressions(self, query):
+        return [self._get_catalog_search_expression(self, query.table, field_name)
+                for field_name in self._catalog_search_fields]
+
+    @api.model
+    def _catalog_name_search(self, name, domain=None, operator='ilike', limit=100):
+        """Return the query of the records matching ``name``, best match first, or None when the
+        search can not be ranked"""
+        name = (name or '').strip()
+        if operator != 'ilike' or not self.pool.has_trigram or len(name) < TRIGRAM_MIN_LENGTH:
+            return None
+        query = self._search(list(domain or []), limit=limit)
+        expressions = self._get_catalog_search_expressions(query)
+        term = self.pool.unaccent(SQL("%s", name))
+        pattern = self.pool.unaccent(SQL("%s", '%' + name + '%'))
+        query.add_where(SQL("(%s)", SQL(" OR ").join(
+            SQL("construction_trigram_match(%s, %s) OR %s ILIKE %s", term, expression, expression, pattern)
+            for expression in expressions
+        )))
+        query.order = SQL("GREATEST(%s) DESC, %s", SQL(", ").join(
+            SQL("word_similarity(%s, %s)", term, expression) for expression in expressions
+        ), SQL.identifier(query.table, 'id'))
+        return query
+
+    @api.model
+    def _name_search(self, name, domain=None, operator='ilike', limit=100, order=None):
+        query = self._catalog_name_search(name, domain, operator, limit)
+        if query is None:
+            return super()._name_search(name, domain, operator, limit, order)
+        return query
+
+
+class ProductTemplate(models.Model):
+    _inherit = 'product.template'
+
+    default_code = fields.Char(index='trigram')
+    description = fields.Html(index='trigram')
+
+
+class ProductProduct(models.Model):
+    _name = 'product.product'
+    _inherit = ['product.product', 'construction.catalog.search.mixin']
+    _catalog_search_fields = ['default_code']
+    _catalog_search_template_fields = ['name', 'default_code', 'description']
+
+    default_code = fields.Char(index='trigram')
+
+    def _get_catalog_search_expressions(self, query):
+        """Search the reference of the variant and the name, reference and description of its template"""
+        Template = self.env['product.template']
+        alias = '%s__catalog_template' % query.table
+        query.add_join('JOIN', alias, Template._table, SQL(
+            "%s = %s", SQL.identifier(alias, 'id'), SQL.identifier(query.table, 'product_tmpl_id')))
+        return super()._get_catalog_search_expressions(query) + [
+            self._get_catalog_search_expression(Template, alias, field_name)
+            for field_name in self._catalog_search_template_fields
+        ]
+
+    @api.model
+    def _name_search(self, name, domain=None, operator='ilike', limit=100, order=None):
+        # the product module overrides the search by reference, rank the fuzzy matches before it
+        query = self._catalog_name_search(name, domain, operator, limit)
+        if query is None:
+            return super()._name_search(name, domain, operator, limit, order)
+        return query
@@ -5,6 +5,42 @@ from collections import defaultdict
 
 from flectra import fields, api, models
 from flectra.exceptions import ValidationError
+from flectra.tools import str2bool
+
+# Fields the dashboard statistics depend on; writing them invalidates the cached statistics
+DASHBOARD_FIELDS = {'stage', 'site_id', 'name', 'start_date', 'end_date', 'estimate_cost', 'accountancy_type',
+                    'company_id'}
+# Bill type with the fields holding its counted total and its amount left to pay
+ACCOUNTANCY_FIELDS = [
+    ('equipment', 'total_equipment_po_amount', 'remaining_equipment_po_amount'),
+    ('material', 'total_material_po_amount', 'remaining_material_po_amount'),
+    ('labour', 'total_labour_bill_amount', 'remaining_labour_bill_amount'),
+    ('eng_arc', 'total_engineer_bill_amount', 'remaining_engineer_bill_amount'),
+    ('expense', 'total_extra_expense_amount', 'remaining_extra_expense_amount'),
+    ('insurance', 'total_insurance_amount', 'remaining_insurance_amount'),
+]
+# Stage: stages a construction may be moved to from it
+STAGE_TRANSITIONS = {
+    'confirm': {'a_costing', 'cancel'},
+    'a_costing': {'confirm', 'in_progress', 'cancel'},
+    'in_progress': {'done', 'cancel'},
+    'done': {'close'},
+    'close': set(),
+    'cancel': {'confirm'},
+}
+# Order type: product billed on the generated vendor bill
+BILL_PRODUCTS = {
+    'labour': 'construction_management.construction_product_1',
+    'eng_arc': 'construction_management.construction_product_2',
+    'insurance': 'construction_management.construction_product_3',
+}
+# Order type: (group field, group PO field, PO back-link field, group cost field, group lines field)
+PURCHASE_ORDER_SOURCES = {
+    'equipment': ('equipment_ids', 'equipment_po_id', 'equipment_id', 'total_equipment_cost',
+                  'construction_equipment_ids'),
+    'material': ('material_ids', 'material_po_id', 'material_id', 'total_material_cost',
+                 'construction_material_ids'),
+}
 
 
 class ConstructionDetails(models.Model):
@@ -38,7 +74,8 @@ class ConstructionDetails(models.Model):
     area_plot = fields.Float(string='Area of Plot')
     construction_rate = fields.Monetary(string='Construction Rate')
     cost_of_construction = fields.Monetary(string="Cost of Construction", compute="_compute_cost_of_construction")
-    is_approved_document = fields.Boolean(string="Approved", compute="_compute_is_approved")
+    is_approved_document = fields.Boolean(string="Approved", compute="_compute_is_approved", store=True,
+                                          index=True)
     customer_company_id = fields.Many2one('res.partner', domain=[('is_construction_company', '=', True)],
                                           string="Company ")
     project_id = fields.Many2one('project.project', string="Project ")
@@ -55,7 +92,8 @@ class ConstructionDetails(models.Model):
     equipment_ids = fields.One2many('construction.equipment', 'construction_id', string="Equipments")
     material_ids = fields.One2many('construction.material', 'construction_id', string="Material")
     construction_engineer_ids = fields.One2many('construction.engineer.line', 'construction_id', string="Engineers")
-    total_engineer_charges = fields.Monetary(string="Total Charges", compute="_compute_engineer_charges")
+    total_engineer_charges = fields.Monetary(string="Total Charges", compute="_compute_engineer_charges",
+                                             store=True)
     document_ids = fields.One2many('construction.document.line', 'construction_id')
     construction_labours_ids = fields.One2many('construction.labour.line', 'construction_id', string="Labours")
     construction_expense_ids = fields.One2many('construction.expense', 'construction_id', string="Expense")
@@ -70,15 +108,15 @@ class ConstructionDetails(models.Model):
     # Count
     equip_po_count = fields.Integer(compute='_compute_po_count')
     material_po_count = fields.Integer(compute='_compute_po_count')
-    equip_bill_count = fields.Integer(compute='_compute_po_count')
-    material_bill_count = fields.Integer(compute='_compute_po_count')
+    equip_bill_count = fields.Integer(compute='_compute_bill_count')
+    material_bill_count = fields.Integer(compute='_compute_bill_count')
     task_count = fields.Integer(related="project_id.task_count", string="Task Count")
-    labour_bill_count = fields.Integer(compute='_compute_po_count')
-    eng_arc_bill_count = fields.Integer(compute="_compute_po_count")
-    expense_bill_count = fields.Integer(compute="_compute_po_count")
-    meeting_count = fields.Integer(compute="_compute_po_count")
-    equipment_delivery_order_count = fields.Integer(compute="_compute_po_count")
-    material_delivery_order_count = fields.Integer(compute="_compute_po_count")
+    labour_bill_count = fields.Integer(compute='_compute_bill_count')
+    eng_arc_bill_count = fields.Integer(compute="_compute_bill_count")
+    expense_bill_count = fields.Integer(compute="_compute_bill_count")
+    meeting_count = fields.Integer(compute="_compute_meeting_count")
+    equipment_delivery_order_count = fields.Integer(compute="_compute_delivery_order_count")
+    material_delivery_order_count = fields.Integer(compute="_compute_delivery_order_count")
 
     # Accountancy
     accountancy_type = fields.Selection([('paid', 'Paid'), ('all_bill', 'All Bills')], string="Accountancy")
@@ -107,7 +145,20 @@ class ConstructionDetails(models.Model):
             if vals.get('name', ('New')) == ('New'):
                 vals['name'] = self.env['ir.sequence'].next_by_code(
                     'construction.details') or ('New')
-        return super(ConstructionDetails, self).create(vals_list)
+        records = super(ConstructionDetails, self).create(vals_list)
+        self.env['construction.dashboard']._invalidate_stats_cache()
+        return records
+
+    def write(self, vals):
+        res = super(ConstructionDetails, self).write(vals)
+        if DASHBOARD_FIELDS.intersection(vals):
+            self.env['construction.dashboard']._invalidate_stats_cache()
+        return res
+
+    def unlink(self):
+        res = super(ConstructionDetails, self).unlink()
+        self.env['construction.dashboard']._invalidate_stats_cache()
+        return res
 
     def name_get(self):
         data = []
@@ -127,177 +178,99 @@ class ConstructionDetails(models.Model):
 
     @api.depends('estimate_cost', 'scrap_id.total', 'accountancy_type')
     def _compute_accountancy(self):
-        orders = ['equipment', 'material', 'labour', 'eng_arc', 'expense', 'insurance']
-        AccountMove = self.env['account.move'].sudo()
-        construction_ids = self.ids
-        amounts_all = defaultdict(float)
-        amounts_paid = defaultdict(float)
-
-        if construction_ids:
-            grouped_fields = ['construction_id', 'order_type']
-            aggregated_fields = ['amount_total:sum']
-
-            all_moves = AccountMove.read_group(
-                [('construction_id', 'in', construction_ids)],
-                aggregated_fields,
-                grouped_fields
-            )
-            for entry in all_moves:
-                construction = entry.get('construction_id')
-                if not construction:
-                    continue
-                amount = entry.get('amount_total_sum', entry.get('amount_total', 0.0))
-                amounts_all[(construction[0], entry.get('order_type'))] = amount
-
-            paid_moves = AccountMove.read_group(
-                [('construction_id', 'in', construction_ids), ('payment_state', '=', 'paid')],
-                aggregated_fields,
-                grouped_fields
-            )
-            for entry in paid_moves:
-                construction = entry.get('construction_id')
-                if not construction:
-                    continue
-                amount = entry.get('amount_total_sum', entry.get('amount_total', 0.0))
-                amounts_paid[(construction[0], entry.get('order_type'))] = amount
+        # Bill totals are maintained in the cost ledger instead of being re-aggregated here
+        amounts_all, amounts_paid = self.env['construction.cost.ledger']._get_amounts(self.ids)
 
         for rec in self:
             scrap_amount = rec.scrap_id.total if rec.scrap_id else 0.0
-            totals_all = {order: amounts_all[(rec.id, order)] for order in orders}
-            totals_paid = {order: amounts_paid[(rec.id, order)] for order in orders}
-
-            total_all_amount = sum(totals_all.values())
-            total_paid_amount = sum(totals_paid.values())
-
-            rec.total_scrap_order_amount = scrap_amount
-
-            if rec.accountancy_type == "all_bill":
-                rec.total_equipment_po_amount = totals_all['equipment']
-                rec.total_material_po_amount = totals_all['material']
-                rec.total_labour_bill_amount = totals_all['labour']
-                rec.total_engineer_bill_amount = totals_all['eng_arc']
-                rec.total_extra_expense_amount = totals_all['expense']
-                rec.total_insurance_amount = totals_all['insurance']
-
-                rec.remaining_budget_amount = (rec.estimate_cost or 0.0) - total_all_amount + scrap_amount
-                rec.remaining_equipment_po_amount = 0.0
-                rec.remaining_material_po_amount = 0.0
-                rec.remaining_labour_bill_amount = 0.0
-                rec.remaining_engineer_bill_amount = 0.0
-                rec.remaining_extra_expense_amount = 0.0
-                rec.remaining_insurance_amount = 0.0
-                rec.remaining_to_pay = 0.0
-                rec.total_to_pay = total_all_amount
-                rec.is_negative_remaining = rec.remaining_budget_amount < 0.0
-
-            elif rec.accountancy_type == "paid":
-                rec.total_equipment_po_amount = totals_paid['equipment']
-                rec.total_material_po_amount = totals_paid['material']
-                rec.total_labour_bill_amount = totals_paid['labour']
-                rec.total_engineer_bill_amount = totals_paid['eng_arc']
-                rec.total_extra_expense_amount = totals_paid['expense']
-                rec.total_insurance_amount = totals_paid['insurance']
-
-                rec.remaining_budget_amount = (rec.estimate_cost or 0.0) - total_paid_amount + scrap_amount
-                rec.remaining_equipment_po_amount = max(totals_all['equipment'] - totals_paid['equipment'], 0.0)
-                rec.remaining_material_po_amount = max(totals_all['material'] - totals_paid['material'], 0.0)
-                rec.remaining_labour_bill_amount = max(totals_all['labour'] - totals_paid['labour'], 0.0)
-                rec.remaining_engineer_bill_amount = max(totals_all['eng_arc'] - totals_paid['eng_arc'], 0.0)
-                rec.remaining_extra_expense_amount = max(totals_all['expense'] - totals_paid['expense'], 0.0)
-                rec.remaining_insurance_amount = max(totals_all['insurance'] - totals_paid['insurance'], 0.0)
-                rec.total_to_pay = total_all_amount
-                rec.remaining_to_pay = max(total_all_amount - total_paid_amount, 0.0)
-                rec.is_negative_remaining = rec.remaining_budget_amount < 0.0
+            totals_all = {order: amounts_all[(rec.id, order)] for order, dummy, dummy in ACCOUNTANCY_FIELDS}
+            totals_paid = {order: amounts_paid[(rec.id, order)] for order, dummy, dummy in ACCOUNTANCY_FIELDS}
+            is_paid = rec.accountancy_type == "paid"
+            # "All Bills" reports every bill, "Paid" only the paid ones plus what remains to pay
+            counted = totals_paid if is_paid else totals_all
+            values = {'total_scrap_order_amount': scrap_amount}
+
+            if rec.accountancy_type in ("all_bill", "paid"):
+                for order, total_field, remaining_field in ACCOUNTANCY_FIELDS:
+                    values[total_field] = counted[order]
+                    values[remaining_field] = max(totals_all[order] - totals_paid[order], 0.0) if is_paid else 0.0
+                total_all_amount = sum(totals_all.values())
+                values['remaining_budget_amount'] = (rec.estimate_cost or 0.0) - sum(counted.values()) + scrap_amount
+                values['total_to_pay'] = total_all_amount
+                values['remaining_to_pay'] = (
+                    max(total_all_amount - sum(totals_paid.values()), 0.0) if is_paid else 0.0)
+                values['is_negative_remaining'] = values['remaining_budget_amount'] < 0.0
             else:
-                rec.total_equipment_po_amount = 0.0
-                rec.total_material_po_amount = 0.0
-                rec.total_labour_bill_amount = 0.0
-                rec.total_engineer_bill_amount = 0.0
-                rec.total_extra_expense_amount = 0.0
-                rec.total_insurance_amount = 0.0
-                rec.remaining_budget_amount = 0.0
-                rec.remaining_equipment_po_amount = 0.0
-                rec.remaining_material_po_amount = 0.0
-                rec.remaining_labour_bill_amount = 0.0
-                rec.remaining_engineer_bill_amount = 0.0
-                rec.remaining_extra_expense_amount = 0.0
-                rec.remaining_insurance_amount = 0.0
-                rec.remaining_to_pay = 0.0
-                rec.total_to_pay = 0.0
-                rec.is_negative_remaining = False
+                for dummy, total_field, remaining_field in ACCOUNTANCY_FIELDS:
+                    values[total_field] = 0.0
+                    values[remaining_field] = 0.0
+                values.update({
+                    'remaining_budget_amount': 0.0,
+                    'total_to_pay': 0.0,
+                    'remaining_to_pay': 0.0,
+                    'is_negative_remaining': False,
+                })
+            rec.update(values)
 
     def _compute_sub_project_count(self):
+        sub_project_counts = self.env['project.project']._count_sub_projects(self.project_id.ids)
         for rec in self:
             if rec.project_id:
-                domain = [('parent_id', '=', rec.project_id.id)]
-                if rec.site_id:
-                    domain.append(('site_id', '=', rec.site_id.id))
-                else:
-                    domain.append(('site_id', '!=', False))
-                rec.sub_project_count = self.env['project.project'].search_count(domain)
+                rec.sub_project_count = sub_project_counts[(rec.project_id.id, rec.site_id.id)]
             else:
                 rec.sub_project_count = 0
 
-    def _compute_po_count(self):
-        PurchaseOrder = self.env['purchase.order'].sudo()
-        AccountMove = self.env['account.move'].sudo()
-        CalendarEvent = self.env['calendar.event'].sudo()
-        StockPicking = self.env['stock.picking'].sudo()
-
-        construction_ids = self.ids
-        purchase_counts = defaultdict(int)
-        invoice_counts = defaultdict(int)
-        meeting_counts = defaultdict(int)
+    # Counters are grouped by the table they read, so a view only pays for the ones it shows
+    def _count_by_construction(self, model_name, domain, groupby=None):
+        """Return {(construction id, group value): count} for the current records"""
+        counts = defaultdict(int)
+        if not self.ids:
+            return counts
+        groupby_fields = ['construction_id'] + ([groupby] if groupby else [])
+        data = self.env[model_name].sudo().read_group(
+            [('construction_id', 'in', self.ids)] + domain, ['__count'], groupby_fields, lazy=False)
+        for entry in data:
+            construction = entry.get('construction_id')
+            if construction:
+                counts[(construction[0], entry.get(groupby) if groupby else False)] = entry.get('__count', 0)
+        return counts
 
-        equipment_po_map = {}
-        material_po_map = {}
-        all_purchase_ids = set()
+    def _compute_po_count(self):
+        purchase_counts = self._count_by_construction('purchase.order', [], 'order_type')
+        for rec in self:
+            rec.equip_po_count = purchase_counts[(rec.id, 'equipment')]
+            rec.material_po_count = purchase_counts[(rec.id, 'material')]
 
+    def _compute_bill_count(self):
+        invoice_counts = self._count_by_construction('account.move', [], 'order_type')
         for rec in self:
-            equipment_po_ids = set(rec.equipment_ids.mapped('equipment_po_id').ids)
-            material_po_ids = set(rec.material_ids.mapped('material_po_id').ids)
-            equipment_po_map[rec.id] = equipment_po_ids
-            material_po_map[rec.id] = material_po_ids
-            all_purchase_ids.update(equipment_po_ids)
-            all_purchase_ids.update(material_po_ids)
-
-        if construction_ids:
-            purchase_data = PurchaseOrder.read_group(
-                [('construction_id', 'in', construction_ids)],
-                ['__count'],
-                ['construction_id', 'order_type']
-            )
-            for entry in purchase_data:
-                construction = entry.get('construction_id')
-                if not construction:
-                    continue
-                purchase_counts[(construction[0], entry.get('order_type'))] = entry.get('__count', 0)
-
-            invoice_data = AccountMove.read_group(
-                [('construction_id', 'in', construction_ids)],
-                ['__count'],
-                ['construction_id', 'order_type']
-            )
-            for entry in invoice_data:
-                construction = entry.get('construction_id')
-                if not construction:
-                    continue
-                invoice_counts[(construction[0], entry.get('order_type'))] = entry.get('__count', 0)
-
-            meeting_data = CalendarEvent.read_group(
-                [('construction_id', 'in', construction_ids), ('is_construction_meeting', '=', True)],
-                ['__count'],
-                ['construction_id']
-            )
-            for entry in meeting_data:
-                construction = entry.get('construction_id')
-                if not construction:
-                    continue
-                meeting_counts[construction[0]] = entry.get('__count', 0)
+            rec.equip_bill_count = invoice_counts[(rec.id, 'equipment')]
+            rec.material_bill_count = invoice_counts[(rec.id, 'material')]
+            rec.labour_bill_count = invoice_counts[(rec.id, 'labour')]
+            rec.eng_arc_bill_count = invoice_counts[(rec.id, 'eng_arc')]
+            rec.expense_bill_count = invoice_counts[(rec.id, 'expense')]
 
+    def _compute_meeting_count(self):
+        meeting_counts = self._count_by_construction('calendar.event', [('is_construction_meeting', '=', True)])
+        for rec in self:
+            rec.meeting_count = meeting_counts[(rec.id, False)]
+
+    def _compute_delivery_order_count(self):
+        # One read per line model fetches the purchase orders of the whole batch
+        equipment_po_map = defaultdict(set)
+        material_po_map = defaultdict(set)
+        if self.ids:
+            for model_name, po_field, po_map in [('construction.equipment', 'equipment_po_id', equipment_po_map),
+                                                 ('construction.material', 'material_po_id', material_po_map)]:
+                lines = self.env[model_name].sudo().search_read(
+                    [('construction_id', 'in', self.ids), (po_field, '!=', False)], ['construction_id', po_field])
+                for line in lines:
+                    po_map[line['construction_id'][0]].add(line[po_field][0])
+
+        all_purchase_ids = set().union(*equipment_po_map.values(), *material_po_map.values())
         delivered_purchase_ids = set()
         if all_purchase_ids:
-            picking_data = StockPicking.read_group(
+            picking_data = self.env['stock.picking'].sudo().read_group(
                 [('purchase_id', 'in', list(all_purchase_ids))],
                 ['__count'],
                 ['purchase_id']
@@ -308,19 +281,8 @@ class ConstructionDetails(models.Model):
                     delivered_purchase_ids.add(purchase[0])
 
         for rec in self:
-            rec.equip_po_count = purchase_counts[(rec.id, 'equipment')]
-            rec.material_po_count = purchase_counts[(rec.id, 'material')]
-            rec.equip_bill_count = invoice_counts[(rec.id, 'equipment')]
-            rec.material_bill_count = invoice_counts[(rec.id, 'material')]
-            rec.labour_bill_count = invoice_counts[(rec.id, 'labour')]
-            rec.eng_arc_bill_count = invoice_counts[(rec.id, 'eng_arc')]
-            rec.expense_bill_count = invoice_counts[(rec.id, 'expense')]
-            rec.meeting_count = meeting_counts.get(rec.id, 0)
-
-            equipment_pos = equipment_po_map.get(rec.id, set())
-            material_pos = material_po_map.get(rec.id, set())
-            rec.equipment_delivery_order_count = len(equipment_pos & delivered_purchase_ids)
-            rec.material_delivery_order_count = len(material_pos & delivered_purchase_ids)
+            rec.equipment_delivery_order_count = len(equipment_po_map[rec.id] & delivered_purchase_ids)
+            rec.material_delivery_order_count = len(material_po_map[rec.id] & delivered_purchase_ids)
 
     @api.onchange('document_template_id')
     def _onchange_document_template(self):
@@ -335,13 +297,13 @@ class ConstructionDetails(models.Model):
                     }))
                 rec.document_ids = lines
 
-    @api.depends('document_ids')
+    @api.depends('document_ids.state')
     def _compute_is_approved(self):
         for rec in self:
             documents = rec.document_ids
             rec.is_approved_document = bool(documents) and all(doc.state == "approved" for doc in documents)
 
-    @api.depends('construction_engineer_ids')
+    @api.depends('construction_engineer_ids.charges')
     def _compute_engineer_charges(self):
         for rec in self:
             rec.total_engineer_charges = sum(rec.construction_engineer_ids.mapped('charges'))
@@ -375,21 +337,62 @@ class ConstructionDetails(models.Model):
             ])
             rec.profit_margin = (rec.estimate_cost or 0.0) - total_cost
 
+    # Stage Transitions
+    def _check_stage_transition(self, stage):
+        """Return the records that have to move to ``stage``, raise if one of them may not."""
+        if stage not in STAGE_TRANSITIONS:
+            raise ValidationError("! Unknown construction stage %s" % stage)
+        records = self.filtered(lambda rec: rec.stage != stage)
+        invalid = records.filtered(lambda rec: stage not in STAGE_TRANSITIONS.get(rec.stage, ()))
+        if invalid:
+            stage_labels = dict(self._fields['stage']._description_selection(self.env))
+            raise ValidationError("! %s cannot be moved to %s" % (
+                ", ".join(invalid.mapped('name')), stage_labels[stage]))
+        return records
+
+    def action_transition_stage(self, stage):
+        """Move the records to ``stage`` with a single write.
+
+        Every record must be allowed to reach ``stage`` from its current stage,
+        otherwise nothing is written. Records already in ``stage`` are left as is.
+        """
+        records = self._check_stage_transition(stage)
+        stage_labels = dict(self._fields['stage']._description_selection(self.env))
+        bodies = {rec.id: "Stage changed from %s to %s" % (stage_labels[rec.stage], stage_labels[stage])
+                  for rec in records}
+        records.write({'stage': stage})
+        records._message_log_batch(bodies=bodies)
+        return True
+
+    @api.model
+    def bulk_transition_stage(self, transitions):
+        """Apply several stage transitions at once, one write per target stage.
+
+        :param transitions: dict mapping a target stage to a list of record ids
+        """
+        batches = {stage: self.browse(ids) for stage, ids in transitions.items()}
+        records = self.browse()
+        for batch in batches.values():
+            records |= batch
+        if len(records) != sum(len(batch) for batch in batches.values()):
+            raise ValidationError("! A construction cannot be moved to several stages at once")
+        for stage, batch in batches.items():
+            batch._check_stage_transition(stage)
+        for stage, batch in batches.items():
+            batch.action_transition_stage(stage)
+        return True
+
     def action_confirm(self):
-        for rec in self:
-            rec.stage = 'confirm'
+        return self.action_transition_stage('confirm')
 
     def action_cancel(self):
-        for rec in self:
-            rec.stage = 'cancel'
+        return self.action_transition_stage('cancel')
 
     def action_complete(self):
-        for rec in self:
-            rec.stage = "done"
+        return self.action_transition_stage('done')
 
     def action_close_project(self):
-        for rec in self:
-            rec.stage = "close"
+        return self.action_transition_stage('close')
 
     def action_gmap_location(self):
         self.ensure_one()
@@ -433,35 +436,65 @@ class ConstructionDetails(models.Model):
                         'sticky': False,
                     }
                 }
-        self.write({'stage': 'a_costing'})
-        return True
+        return self.action_transition_stage('a_costing')
+
+    # Purchase Orders
+    def _prepare_purchase_order_line(self, order_type, line):
+        if order_type == 'equipment':
+            return {
+                'product_id': line.equipment_id.id,
+                'name': dict(line._fields['cost_type'].selection).get(line.cost_type),
+                'product_qty': line.qty,
+                'product_uom': line.equipment_id.uom_po_id.id,
+                'price_unit': line.cost,
+            }
+        return {
+            'product_id': line.material_id.id,
+            'name': "Material",
+            'product_qty': line.qty,
+            'product_uom': line.uom_id.id,
+            'price_unit': line.cost,
+        }
+
+    def _generate_purchase_orders(self, order_type, consolidate=None):
+        """Create the missing purchase orders of every equipment or material group of the records.
+
+        All order values are built first and created with a single ``create``. With
+        ``consolidate`` the groups of one site sharing a vendor go into one order.
+        """
+        groups_field, po_field, link_field, cost_field, lines_field = PURCHASE_ORDER_SOURCES[order_type]
+        if consolidate is None:
+            consolidate = str2bool(self.env['ir.config_parameter'].sudo().get_param(
+                'construction_management.consolidate_purchase_orders', 'False'))
+        groups = self.mapped(groups_field).filtered(lambda g: not g[po_field] and g[cost_field] > 0)
+        batches = {}
+        for group in groups:
+            construction = group.construction_id
+            key = (construction.id, construction.customer_company_id.id) if consolidate else group.id
+            if key not in batches:
+                batches[key] = ({
+                    'partner_id': construction.customer_company_id.id,
+                    'order_line': [],
+                    'construction_id': construction.id,
+                    'order_type': order_type,
+                }, [])
+            order_vals, order_groups = batches[key]
+            order_vals['order_line'] += [(0, 0, self._prepare_purchase_order_line(order_type, line))
+                                         for line in group[lines_field]]
+            order_groups.append(group)
+        for order_vals, order_groups in batches.values():
+            if len(order_groups) == 1:
+                order_vals[link_field] = order_groups[0].id
+        orders = self.env['purchase.order'].create([order_vals for order_vals, dummy in batches.values()])
+        for order, (dummy, order_groups) in zip(orders, batches.values()):
+            for group in order_groups:
+                group[po_field] = order
+        return orders
 
     # Equipment Purchase Order
     def action_equipment_po(self):
-        for rec in self:
-            if rec.equipment_ids:
-                for data in rec.equipment_ids:
-                    if not data.equipment_po_id:
-                        if data.total_equipment_cost > 0:
-                            lines = []
-                            for product in data.construction_equipment_ids:
-                                record = {
-                                    'product_id': product.equipment_id.id,
-                                    'name': dict(product._fields['cost_type'].selection).get(product.cost_type),
-                                    'product_qty': product.qty,
-                                    'product_uom': product.equipment_id.uom_po_id.id,
-                                    'price_unit': product.cost,
-                                }
-                                lines.append((0, 0, record))
-                            record = {
-                                'partner_id': rec.customer_company_id.id,
-                                'order_line': lines,
-                                'construction_id': rec.id,
-                                'order_type': 'equipment'
-                            }
-                            purchase_order_id = self.env['purchase.order'].create(record)
-                            purchase_order_id.equipment_id = data.id
-                            data.equipment_po_id = purchase_order_id.id
+        self._generate_purchase_orders('equipment')
+        return True
 
     def action_view_equipment_po(self):
         self.ensure_one()
@@ -501,30 +534,8 @@ class ConstructionDetails(models.Model):
 
     # Material Purchase Order
     def action_material_po(self):
-        for rec in self:
-            if rec.material_ids:
-                for data in rec.material_ids:
-                    if not data.material_po_id:
-                        if data.total_material_cost > 0:
-                            lines = []
-                            for product in data.construction_material_ids:
-                                record = {
-                                    'product_id': product.material_id.id,
-                                    'name': "Material",
-                                    'product_qty': product.qty,
-                                    'product_uom': product.uom_id.id,
-                                    'price_unit': product.cost,
-                                }
-                                lines.append((0, 0, record))
-                            record = {
-                                'partner_id': rec.customer_company_id.id,
-                                'order_line': lines,
-                                'construction_id': rec.id,
-                                'order_type': 'material'
-                            }
-                            purchase_order_id = self.env['purchase.order'].create(record)
-                            purchase_order_id.material_id = data.id
-                            data.material_po_id = purchase_order_id.id
+        self._generate_purchase_orders('material')
+        return True
 
     def action_view_material_po(self):
         self.ensure_one()
@@ -608,33 +619,81 @@ class ConstructionDetails(models.Model):
             'target': 'current'
         }
 
+    # Vendor Bills
+    @api.model
+    def _prepare_bill_vals(self, construction, partner, order_type, line_vals, move_type='in_invoice'):
+        return {
+            'partner_id': partner.id,
+            'move_type': move_type,
+            'invoice_date': fields.date.today(),
+            'construction_id': construction.id,
+            'invoice_line_ids': [(0, 0, line_vals)],
+            'order_type': order_type
+        }
+
+    @api.model
+    def _create_bills(self, bill_sources):
+        """Create and post the bills of ``bill_sources`` in one batch.
+
+        :param bill_sources: list of ``(record, bill field, bill values)``; each
+            record is linked back to its bill through the bill field
+        :return: the posted ``account.move`` records
+        """
+        if not bill_sources:
+            return self.env['account.move']
+        bills = self.env['account.move'].create([vals for dummy, dummy, vals in bill_sources])
+        bills.action_post()
+        for bill, (record, bill_field, dummy) in zip(bills, bill_sources):
+            record[bill_field] = bill
+        return bills
+
+    def _get_labour_bill_sources(self):
+        product = self.env.ref(BILL_PRODUCTS['labour'])
+        sources = []
+        for data in self.construction_labours_ids.filtered(lambda line: not line.labour_bill_id):
+            labours = "".join("{}, ".format(lab.name) for lab in data.labours_ids)
+            record = {
+                'product_id': product.id,
+                'name': "Labours : \n" + labours,
+                'quantity': 1,
+                'price_unit': data.total_labour_cost
+            }
+            sources.append((data, 'labour_bill_id', self._prepare_bill_vals(
+                data.construction_id, data.labour_responsible_id, 'labour', record)))
+        return sources
+
+    def _get_eng_arc_bill_sources(self):
+        product = self.env.ref(BILL_PRODUCTS['eng_arc'])
+        sources = []
+        invoice_lines = self.construction_engineer_ids.eng_invoice_line_ids
+        for data in invoice_lines.filtered(lambda line: not line.eng_arc_bill_id):
+            record = {
+                'product_id': product.id,
+                'name': data.name + " Bill",
+                'quantity': 1,
+                'price_unit': data.charges
+            }
+            engineer = data.construction_engineer_id
+            sources.append((data, 'eng_arc_bill_id', self._prepare_bill_vals(
+                engineer.construction_id, engineer.employee_id, 'eng_arc', record)))
+        return sources
+
+    def action_create_bills(self):
+        """Month-end billing: bill every pending labour, engineer, expense and insurance line of the
+        in-progress constructions in a single create and post."""
+        constructions = self.filtered(lambda rec: rec.stage == 'in_progress')
+        expenses = constructions.construction_expense_ids.filtered(
+            lambda rec: rec.expense_product_id and not rec.expense_bill_id)
+        risks = constructions.risk_ids.filtered(
+            lambda rec: rec.is_insurance and rec.total_charge > 0 and not rec.insurance_invoice_id)
+        return self._create_bills(constructions._get_labour_bill_sources()
+                                  + constructions._get_eng_arc_bill_sources()
+                                  + expenses._get_bill_sources()
+                                  + risks._get_bill_sources())
+
     # Labour Bill
     def action_labours_bill(self):
-        for rec in self:
-            if rec.construction_labours_ids:
-                for data in rec.construction_labours_ids:
-                    if not data.labour_bill_id:
-                        labours = ""
-                        for lab in data.labours_ids:
-                            labours = labours + "{}, ".format(lab.name)
-                        record = {
-                            'product_id': self.env.ref('construction_management.construction_product_1').id,
-                            'name': "Labours : \n" + labours,
-                            'quantity': 1,
-                            'price_unit': data.total_labour_cost
-                        }
-                        line = [(0, 0, record)]
-                        main_data = {
-                            'partner_id': data.labour_responsible_id.id,
-                            'move_type': 'in_invoice',
-                            'invoice_date': fields.date.today(),
-                            'construction_id': rec.id,
-                            'invoice_line_ids': line,
-                            'order_type': 'labour'
-                        }
-                        bill_id = self.env['account.move'].create(main_data)
-                        bill_id.action_post()
-                        data.labour_bill_id = bill_id.id
+        self._create_bills(self._get_labour_bill_sources())
 
     def action_view_labour_bill(self):
         self.ensure_one()
@@ -650,30 +709,7 @@ class ConstructionDetails(models.Model):
 
     # Engineer & Architect Bill
     def action_eng_arc_bill(self):
-        for rec in self:
-            if rec.construction_engineer_ids:
-                for record in rec.construction_engineer_ids:
-                    if record.eng_invoice_line_ids:
-                        for data in record.eng_invoice_line_ids:
-                            if not data.eng_arc_bill_id:
-                                record = {
-                                    'product_id': self.env.ref('construction_management.construction_product_2').id,
-                                    'name': data.name + " Bill",
-                                    'quantity': 1,
-                                    'price_unit': data.charges
-                                }
-                                line = [(0, 0, record)]
-                                main_data = {
-                                    'partner_id': data.construction_engineer_id.employee_id.id,
-                                    'move_type': 'in_invoice',
-                                    'invoice_date': fields.date.today(),
-                                    'construction_id': rec.id,
-                                    'invoice_line_ids': line,
-                                    'order_type': 'eng_arc'
-                                }
-                                bill_id = self.env['account.move'].create(main_data)
-                                bill_id.action_post()
-                                data.eng_arc_bill_id = bill_id.id
+        self._create_bills(self._get_eng_arc_bill_sources())
 
     def action_view_eng_arc_bill(self):
         self.ensure_one()
@@ -916,16 +952,13 @@ class ConstructionDocumentLine(models.Model):
     construction_id = fields.Many2one('construction.details')
 
     def action_approve(self):
-        for rec in self:
-            rec.state = 'approved'
+        self.write({'state': 'approved'})
 
     def action_in_progress(self):
-        for rec in self:
-            rec.state = 'in_progress'
+        self.write({'state': 'in_progress'})
 
     def action_failed(self):
-        for rec in self:
-            rec.state = 'failed'
+        self.write({'state': 'failed'})
 
 
 class ConstructionLabourLine(models.Model):
@@ -996,28 +1029,23 @@ class ConstructionExpense(models.Model):
                     }
                 }
 
+        self.env['construction.details']._create_bills(
+            self.filtered(lambda rec: rec.expense_product_id and not rec.expense_bill_id)._get_bill_sources())
+        return True
+
+    def _get_bill_sources(self):
+        details = self.env['construction.details']
+        sources = []
         for rec in self:
-            if not rec.expense_product_id:
-                continue
             record = {
                 'product_id': rec.expense_product_id.id,
                 'name': rec.note,
                 'quantity': 1,
                 'price_unit': rec.cost
             }
-            line = [(0, 0, record)]
-            main_data = {
-                'partner_id': rec.construction_id.customer_company_id.id,
-                'move_type': 'in_invoice',
-                'invoice_date': fields.date.today(),
-                'construction_id': rec.construction_id.id,
-                'invoice_line_ids': line,
-                'order_type': 'expense'
-            }
-            bill_id = self.env['account.move'].create(main_data)
-            bill_id.action_post()
-            rec.expense_bill_id = bill_id.id
-        return True
+            sources.append((rec, 'expense_bill_id', details._prepare_bill_vals(
+                rec.construction_id, rec.construction_id.customer_company_id, 'expense', record)))
+        return sources
 
 
 class ConstructionRisk(models.Model):
@@ -1048,62 +1076,41 @@ class ConstructionRisk(models.Model):
     payment_state = fields.Selection(related='insurance_invoice_id.payment_state', string="Payment Status")
 
     def action_insurance_bill(self):
-        self.ensure_one()
-        if self.construction_id.stage == "in_progress":
-            if self.is_insurance:
-                if self.total_charge > 0:
-                    record = {
-                        'product_id': self.env.ref('construction_management.construction_product_3').id,
-                        'name': self.policy_name + " " + self.policy_no,
-                        'quantity': 1,
-                        'price_unit': self.total_charge
-                    }
-                    line = [(0, 0, record)]
-                    main_data = {
-                        'partner_id': self.construction_id.customer_company_id.id,
-                        'move_type': 'out_invoice',
-                        'invoice_date': fields.date.today(),
-                        'construction_id': self.construction_id.id,
-                        'invoice_line_ids': line,
-                        'order_type': 'insurance'
-                    }
-                    invoice_id = self.env['account.move'].create(main_data)
-                    invoice_id.action_post()
-                    self.insurance_invoice_id = invoice_id.id
-                    return True
-                else:
-                    message = {
-                        'type': 'ir.actions.client',
-                        'tag': 'display_notification',
-                        'params': {
-                            'type': 'danger',
-                            'title': ('Insurance Charge Cannot be Zero !'),
-                            'sticky': False,
-                        }
-                    }
-                    return message
-            else:
-                message = {
-                    'type': 'ir.actions.client',
-                    'tag': 'display_notification',
-                    'params': {
-                        'type': 'danger',
-                        'title': ('No Insurance Found !'),
-                        'sticky': False,
-                    }
-                }
-                return message
+        if any(rec.construction_id.stage != "in_progress" for rec in self):
+            title = 'Start Construction to Create Bill and Invoice'
+        elif not all(self.mapped('is_insurance')):
+            title = 'No Insurance Found !'
+        elif any(rec.total_charge <= 0 for rec in self):
+            title = 'Insurance Charge Cannot be Zero !'
         else:
-            message = {
-                'type': 'ir.actions.client',
-                'tag': 'display_notification',
-                'params': {
-                    'type': 'danger',
-                    'title': ('Start Construction to Create Bill and Invoice'),
-                    'sticky': False,
-                }
+            self.env['construction.details']._create_bills(
+                self.filtered(lambda rec: not rec.insurance_invoice_id)._get_bill_sources())
+            return True
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'type': 'danger',
+                'title': title,
+                'sticky': False,
+            }
+        }
+
+    def _get_bill_sources(self):
+        details = self.env['construction.details']
+        product = self.env.ref(BILL_PRODUCTS['insurance'])
+        sources = []
+        for rec in self:
+            record = {
+                'product_id': product.id,
+                'name': rec.policy_name + " " + rec.policy_no,
+                'quantity': 1,
+                'price_unit': rec.total_charge
             }
-            return message
+            sources.append((rec, 'insurance_invoice_id', details._prepare_bill_vals(
+                rec.construction_id, rec.construction_id.customer_company_id, 'insurance', record,
+                move_type='out_invoice')))
+        return sources
 
 
 class PolicyRisk(models.Model):
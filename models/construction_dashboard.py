@@ -1,7 +1,38 @@
 # -*- coding: utf-8 -*-
 # Copyright 2020 - Today Techkhedut.
 # Part of Techkhedut. See LICENSE file for full copyright and licensing details.
+import copy
+from collections import defaultdict
+from datetime import timedelta
+
 from flectra import fields, api, models
+from flectra.tools import lru
+
+STAGE_STAT_FIELDS = [
+    ('confirm', 'job_order'),
+    ('a_costing', 'document_verified'),
+    ('in_progress', 'site_in_progress'),
+    ('done', 'complete_site'),
+    ('close', 'close_site'),
+    ('cancel', 'cancel_site'),
+]
+STAT_FIELDS = [
+    'total_site', 'planning_site', 'job_order', 'document_verified', 'site_in_progress', 'complete_site',
+    'close_site', 'cancel_site', 'total_projects', 'total_sub_projects', 'active_phases', 'active_work_orders',
+    'total_equipment_po', 'total_material_po', 'total_requisitions', 'total_budget', 'total_spent',
+    'remaining_budget',
+]
+# Maximum age of a snapshot: it is recomputed past it even if the stats version did not move,
+# to pick up changes that bypass the ORM hooks bumping the version, such as SQL updates
+SNAPSHOT_MAX_AGE = timedelta(hours=6)
+
+# Per-process cache of get_construction_stats payloads. Keys carry the value of a
+# database sequence that relevant writes bump, so every worker sees invalidations.
+STATS_CACHE = lru.LRU(256)
+STATS_CACHE_INFO = {'hits': 0, 'misses': 0}
+STATS_VERSION_SEQUENCE = 'construction_dashboard_stats_version'
+# Number of in-progress sites plotted on the timeline and PO charts
+CHART_TOP_N = 50
 
 
 class ConstructionDashboard(models.TransientModel):
@@ -35,93 +66,109 @@ class ConstructionDashboard(models.TransientModel):
     remaining_budget = fields.Monetary(string="Remaining Budget", compute='_compute_stats', store=False)
     
     currency_id = fields.Many2one('res.currency', default=lambda self: self.env.company.currency_id)
+    snapshot_date = fields.Datetime(string="Last Refresh", compute='_compute_stats', store=False)
+    snapshot_age = fields.Char(string="Data Age", compute='_compute_stats', store=False)
+
+    def init(self):
+        self.env.cr.execute("CREATE SEQUENCE IF NOT EXISTS %s" % STATS_VERSION_SEQUENCE)
+
+    @api.model
+    def _read_group_counts(self, model_name, domain, groupby):
+        """Return a {group value: record count} mapping from a single grouped query"""
+        counts = {}
+        for entry in self.env[model_name].read_group(domain, ['__count'], [groupby], lazy=False):
+            value = entry.get(groupby)
+            if isinstance(value, (list, tuple)):
+                value = value[0]
+            counts[value] = entry.get('__count', 0)
+        return counts
+
+    @api.model
+    def _get_company_domain(self):
+        """Restrict the statistics to the companies of the environment, shared records included.
+
+        The construction models have no multi-company record rules, so this also applies in sudo mode.
+        """
+        return [('company_id', 'in', self.env.companies.ids + [False])]
+
+    @api.model
+    def _get_dashboard_stats(self):
+        """Collect every dashboard counter with a handful of grouped queries"""
+        company_domain = self._get_company_domain()
+        stage_counts = self._read_group_counts('construction.details', company_domain, 'stage')
+        site_type_counts = self._read_group_counts('construction.site', company_domain, 'site_type_id')
+        phase_counts = self._read_group_counts('construction.project.phase', company_domain, 'state')
+        work_order_counts = self._read_group_counts('construction.work.order', company_domain, 'state')
+        po_counts = self._read_group_counts('purchase.order', company_domain + [('construction_id', '!=', False)],
+                                            'order_type')
+        construction_projects = self.env['project.project'].search_count(
+            company_domain + [('construction_id', '!=', False)])
+        sub_projects = self.env['project.project'].search_count(
+            company_domain + [('construction_id', '!=', False), ('parent_id', '!=', False)])
+
+        stats = {
+            'total_site': sum(site_type_counts.values()),
+            'planning_site': self.env['job.costing'].search_count(company_domain + [('state', '=', 'planning')]),
+            'total_projects': construction_projects - sub_projects,
+            'total_sub_projects': sub_projects,
+            'active_phases': phase_counts.get('draft', 0) + phase_counts.get('in_progress', 0),
+            'active_work_orders': work_order_counts.get('approved', 0) + work_order_counts.get('in_progress', 0),
+            'total_equipment_po': po_counts.get('equipment', 0),
+            'total_material_po': po_counts.get('material', 0),
+            'total_requisitions': self.env['construction.material.requisition'].search_count(company_domain),
+        }
+        for stage, field_name in STAGE_STAT_FIELDS:
+            stats[field_name] = stage_counts.get(stage, 0)
+
+        site_types = self.env['site.type'].search([])
+        stats['site_type'] = [site_types.mapped('name'), [site_type_counts.get(s.id, 0) for s in site_types]]
+        stats.update(self._get_financial_stats())
+        return stats
+
+    @api.model
+    def _get_financial_stats(self):
+        """Sum budget and spending in the database; spending mirrors ``total_to_pay``,
+        which only counts bills of constructions with an accountancy type."""
+        Construction = self.env['construction.details']
+        company_domain = self._get_company_domain()
+        budget_data = Construction.read_group(company_domain, ['estimate_cost:sum'], [])
+        budget = (budget_data[0].get('estimate_cost') if budget_data else 0.0) or 0.0
+        accounted_ids = Construction._search(company_domain + [('accountancy_type', 'in', ['paid', 'all_bill'])])
+        Ledger = self.env['construction.cost.ledger']
+        Ledger._refresh_pending()
+        spent_data = Ledger.sudo().read_group(
+            [('construction_id', 'in', accounted_ids)], ['amount_all:sum'], [])
+        spent = (spent_data[0].get('amount_all') if spent_data else 0.0) or 0.0
+        return {
+            'total_budget': budget,
+            'total_spent': spent,
+            'remaining_budget': budget - spent,
+        }
 
     @api.depends()
     def _compute_stats(self):
-        """Compute all dashboard statistics"""
+        """Read all dashboard statistics from the company snapshot"""
+        values = self.env['construction.dashboard.snapshot']._get_snapshot()._get_stats_values()
         for rec in self:
-            # Site Statistics
-            rec.total_site = self.env['construction.site'].search_count([])
-            rec.planning_site = self.env['job.costing'].search_count([('state', '=', 'planning')])
-            rec.job_order = self.env['construction.details'].search_count([('stage', '=', 'confirm')])
-            rec.document_verified = self.env['construction.details'].search_count([('stage', '=', 'a_costing')])
-            rec.site_in_progress = self.env['construction.details'].search_count([('stage', '=', 'in_progress')])
-            rec.complete_site = self.env['construction.details'].search_count([('stage', '=', 'done')])
-            rec.close_site = self.env['construction.details'].search_count([('stage', '=', 'close')])
-            rec.cancel_site = self.env['construction.details'].search_count([('stage', '=', 'cancel')])
-            
-            # Project Statistics
-            rec.total_projects = self.env['project.project'].search_count([('construction_id', '!=', False), ('parent_id', '=', False)])
-            rec.total_sub_projects = self.env['project.project'].search_count([('parent_id', '!=', False), ('construction_id', '!=', False)])
-            rec.active_phases = self.env['construction.project.phase'].search_count([('state', 'in', ['draft', 'in_progress'])])
-            rec.active_work_orders = self.env['construction.work.order'].search_count([('state', 'in', ['approved', 'in_progress'])])
-            
-            # Material & Equipment
-            rec.total_equipment_po = self.env['purchase.order'].search_count([('construction_id', '!=', False), ('order_type', '=', 'equipment')])
-            rec.total_material_po = self.env['purchase.order'].search_count([('construction_id', '!=', False), ('order_type', '=', 'material')])
-            rec.total_requisitions = self.env['construction.material.requisition'].search_count([])
-            
-            # Financial Statistics
-            constructions = self.env['construction.details'].search([])
-            rec.total_budget = sum(constructions.mapped('estimate_cost') or [0])
-            rec.total_spent = sum(constructions.mapped('total_to_pay') or [0])
-            rec.remaining_budget = rec.total_budget - rec.total_spent
+            rec.update(values)
 
     @api.model
     def default_get(self, fields_list):
         """Return default values for dashboard"""
         res = super().default_get(fields_list)
-        # Compute stats directly without creating a record to avoid recursion
-        # Site Statistics
-        if 'total_site' in fields_list:
-            res['total_site'] = self.env['construction.site'].search_count([])
-        if 'planning_site' in fields_list:
-            res['planning_site'] = self.env['job.costing'].search_count([('state', '=', 'planning')])
-        if 'job_order' in fields_list:
-            res['job_order'] = self.env['construction.details'].search_count([('stage', '=', 'confirm')])
-        if 'document_verified' in fields_list:
-            res['document_verified'] = self.env['construction.details'].search_count([('stage', '=', 'a_costing')])
-        if 'site_in_progress' in fields_list:
-            res['site_in_progress'] = self.env['construction.details'].search_count([('stage', '=', 'in_progress')])
-        if 'complete_site' in fields_list:
-            res['complete_site'] = self.env['construction.details'].search_count([('stage', '=', 'done')])
-        if 'close_site' in fields_list:
-            res['close_site'] = self.env['construction.details'].search_count([('stage', '=', 'close')])
-        if 'cancel_site' in fields_list:
-            res['cancel_site'] = self.env['construction.details'].search_count([('stage', '=', 'cancel')])
-        
-        # Project Statistics
-        if 'total_projects' in fields_list:
-            res['total_projects'] = self.env['project.project'].search_count([('construction_id', '!=', False), ('parent_id', '=', False)])
-        if 'total_sub_projects' in fields_list:
-            res['total_sub_projects'] = self.env['project.project'].search_count([('parent_id', '!=', False), ('construction_id', '!=', False)])
-        if 'active_phases' in fields_list:
-            res['active_phases'] = self.env['construction.project.phase'].search_count([('state', 'in', ['draft', 'in_progress'])])
-        if 'active_work_orders' in fields_list:
-            res['active_work_orders'] = self.env['construction.work.order'].search_count([('state', 'in', ['approved', 'in_progress'])])
-        
-        # Material & Equipment
-        if 'total_equipment_po' in fields_list:
-            res['total_equipment_po'] = self.env['purchase.order'].search_count([('construction_id', '!=', False), ('order_type', '=', 'equipment')])
-        if 'total_material_po' in fields_list:
-            res['total_material_po'] = self.env['purchase.order'].search_count([('construction_id', '!=', False), ('order_type', '=', 'material')])
-        if 'total_requisitions' in fields_list:
-            res['total_requisitions'] = self.env['construction.material.requisition'].search_count([])
-        
-        # Financial Statistics
-        if any(f in fields_list for f in ['total_budget', 'total_spent', 'remaining_budget']):
-            constructions = self.env['construction.details'].search([])
-            budget = sum(constructions.mapped('estimate_cost') or [0])
-            spent = sum(constructions.mapped('total_to_pay') or [0])
-            if 'total_budget' in fields_list:
-                res['total_budget'] = budget
-            if 'total_spent' in fields_list:
-                res['total_spent'] = spent
-            if 'remaining_budget' in fields_list:
-                res['remaining_budget'] = budget - spent
-        
+        # Read the stored snapshot instead of creating a record to avoid recursion
+        if any(field_name in fields_list for field_name in STAT_FIELDS):
+            values = self.env['construction.dashboard.snapshot']._get_snapshot()._get_stats_values()
+            res.update({field_name: value for field_name, value in values.items() if field_name in fields_list})
         return res
 
+    def action_refresh_snapshot(self):
+        self.env['construction.dashboard.snapshot']._get_snapshot().action_refresh()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'reload',
+        }
+
     def action_view_sites(self):
         return {
             'type': 'ir.actions.act_window',
@@ -171,62 +218,223 @@ class ConstructionDashboard(models.TransientModel):
             'target': 'current'
         }
 
+    @api.model
+    def _get_stats_version(self):
+        self.env.cr.execute("SELECT last_value FROM %s" % STATS_VERSION_SEQUENCE)
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    def _invalidate_stats_cache(self):
+        """Bump the stats version now and again once the transaction commits, so a
+        payload computed before the commit cannot stay cached under the new version."""
+        self.env.cr.execute("SELECT nextval('%s')" % STATS_VERSION_SEQUENCE)
+        postcommit = self.env.cr.postcommit
+        if postcommit.data.get('construction_dashboard_stats'):
+            return
+        postcommit.data['construction_dashboard_stats'] = True
+        registry = self.env.registry
+
+        @postcommit.add
+        def bump_version():
+            with registry.cursor() as cr:
+                cr.execute("SELECT nextval('%s')" % STATS_VERSION_SEQUENCE)
+
+    @api.model
+    def _get_stats_cache_key(self):
+        # Users see different records through access rules, so entries are per user and companies
+        return (self.env.cr.dbname, self._get_stats_version(), self.env.uid, tuple(self.env.companies.ids))
+
     @api.model
     def get_construction_stats(self):
-        construction_obj = self.env['construction.details'].sudo()
-        total_site = self.env['construction.site'].search_count([])
-        planning_site = self.env['job.costing'].search_count([('state', '=', 'planning')])
-        job_order = construction_obj.search_count([('stage', '=', 'confirm')])
-        document_verified = construction_obj.search_count([('stage', '=', 'a_costing')])
-        site_in_progress = construction_obj.search_count([('stage', '=', 'in_progress')])
-        complete_site = construction_obj.search_count([('stage', '=', 'done')])
-        close_site = construction_obj.search_count([('stage', '=', 'close')])
-        cancel_site = construction_obj.search_count([('stage', '=', 'cancel')])
+        key = self._get_stats_cache_key()
+        data = STATS_CACHE.get(key)
+        if data is not None:
+            STATS_CACHE_INFO['hits'] += 1
+            return copy.deepcopy(data)
+        STATS_CACHE_INFO['misses'] += 1
+        data = self._compute_construction_stats()
+        STATS_CACHE[key] = data
+        return copy.deepcopy(data)
+
+    @api.model
+    def get_stats_cache_info(self):
+        return {
+            'hits': STATS_CACHE_INFO['hits'],
+            'misses': STATS_CACHE_INFO['misses'],
+            'size': len(STATS_CACHE),
+            'version': self._get_stats_version(),
+        }
+
+    @api.model
+    def _compute_construction_stats(self):
+        stats = self._get_dashboard_stats()
         site_state = [['Job Order', 'Document Verified', 'In Progress', 'Complete', 'Close', 'Cancel'],
-                      [job_order, document_verified, site_in_progress, complete_site, close_site, cancel_site]]
-        data = {
-            'total_site': total_site,
-            'planning_site': planning_site,
-            'job_order': job_order,
-            'site_in_progress': site_in_progress,
-            'complete_site': complete_site + close_site,
+                      [stats[field_name] for dummy, field_name in STAGE_STAT_FIELDS]]
+        return {
+            'total_site': stats['total_site'],
+            'planning_site': stats['planning_site'],
+            'job_order': stats['job_order'],
+            'site_in_progress': stats['site_in_progress'],
+            'complete_site': stats['complete_site'] + stats['close_site'],
             'site_state': site_state,
-            'construction_time_line': self.construction_time_line(),
-            'material_equipment_po': self.material_equipment_po()
+            'site_type': stats['site_type'],
+            'construction_time_line': self.construction_time_line(limit=CHART_TOP_N),
+            'material_equipment_po': self.material_equipment_po(limit=CHART_TOP_N)
         }
-        site, site_count = [], []
-        site_ids = self.env['site.type'].search([])
-        if not site_ids:
-            data['site_type'] = [[], []]
-        for s in site_ids:
-            site_data = self.env['construction.site'].sudo().search_count([('site_type_id', '=', s.id)])
-            site_count.append(site_data)
-            site.append(s.name)
-        data['site_type'] = [site, site_count]
-
-        return data
 
-    def construction_time_line(self):
+    @api.model
+    def construction_time_line(self, limit=None, offset=0):
+        """In-progress sites ordered by start date, paged with ``limit``/``offset``"""
         site_data = []
-        construction_site_data = self.env['construction.details'].search([])
+        construction_site_data = self.env['construction.details'].search_read(
+            self._get_company_domain() + [('stage', '=', 'in_progress')], ['name', 'site_id', 'start_date', 'end_date'],
+            offset=offset, limit=limit, order='start_date, id')
         for site in construction_site_data:
-            if site.stage == "in_progress":
-                site_data.append({
-                    'name': str(site.name) + " " + str(site.site_id.name),
-                    'start_date': str(site.start_date),
-                    'end_date': str(site.end_date),
-                })
+            site_data.append({
+                'name': str(site['name']) + " " + str(site['site_id'] and site['site_id'][1]),
+                'start_date': str(site['start_date']),
+                'end_date': str(site['end_date']),
+            })
         return site_data
 
-    def material_equipment_po(self):
-        site_name = []
-        equipment_po = []
-        material_po = []
-        construction_site = self.env['construction.details'].sudo().search([])
-        for site in construction_site:
-            if site.stage == "in_progress":
-                site_name.append(site.site_id.name)
-                equipment_po.append(site.equip_po_count)
-                material_po.append(site.material_po_count)
+    @api.model
+    def material_equipment_po(self, limit=None, offset=0):
+        """Equipment and material PO counts of in-progress sites, busiest sites first"""
+        Construction = self.env['construction.details'].sudo()
+        in_progress_domain = self._get_company_domain() + [('stage', '=', 'in_progress')]
+        po_counts = defaultdict(int)
+        po_data = self.env['purchase.order'].sudo().read_group(
+            [('construction_id', 'in', Construction._search(in_progress_domain)),
+             ('order_type', 'in', ['equipment', 'material'])],
+            ['__count'], ['construction_id', 'order_type'], lazy=False)
+        for entry in po_data:
+            po_counts[(entry['construction_id'][0], entry['order_type'])] = entry['__count']
+
+        def total_po(construction_id):
+            return po_counts[(construction_id, 'equipment')] + po_counts[(construction_id, 'material')]
+
+        construction_ids = sorted(Construction.search(in_progress_domain).ids, key=lambda c: (-total_po(c), c))
+        construction_ids = construction_ids[offset:offset + limit if limit else None]
+        site_names = {
+            site['id']: site['site_id'] and site['site_id'][1]
+            for site in Construction.browse(construction_ids).read(['site_id'])
+        }
+        site_name = [site_names[construction_id] for construction_id in construction_ids]
+        equipment_po = [po_counts[(construction_id, 'equipment')] for construction_id in construction_ids]
+        material_po = [po_counts[(construction_id, 'material')] for construction_id in construction_ids]
         data = [site_name, equipment_po, material_po]
         return data
+
+
+class ConstructionDashboardSnapshot(models.Model):
+    _name = 'construction.dashboard.snapshot'
+    _description = "Construction Dashboard Snapshot"
+    _rec_name = 'company_id'
+
+    company_id = fields.Many2one('res.company', string='Company', required=True, ondelete='cascade',
+                                 default=lambda self: self.env.company)
+    currency_id = fields.Many2one('res.currency', related='company_id.currency_id', string='Currency')
+    refresh_date = fields.Datetime(string="Last Refresh", readonly=True)
+    stats_version = fields.Integer(string="Stats Version", readonly=True,
+                                   help="Value of the stats version sequence the snapshot was computed at")
+    snapshot_age = fields.Char(string="Data Age", compute='_compute_snapshot_age')
+
+    # Site Stats
+    total_site = fields.Integer(string="Total Sites")
+    planning_site = fields.Integer(string="Planning Sites")
+    job_order = fields.Integer(string="Job Orders")
+    document_verified = fields.Integer(string="Document Verified")
+    site_in_progress = fields.Integer(string="In Progress")
+    complete_site = fields.Integer(string="Completed")
+    close_site = fields.Integer(string="Closed")
+    cancel_site = fields.Integer(string="Cancelled")
+
+    # Project Stats
+    total_projects = fields.Integer(string="Total Projects")
+    total_sub_projects = fields.Integer(string="Total Sub Projects")
+    active_phases = fields.Integer(string="Active Phases")
+    active_work_orders = fields.Integer(string="Active Work Orders")
+
+    # Material & Equipment
+    total_equipment_po = fields.Integer(string="Equipment POs")
+    total_material_po = fields.Integer(string="Material POs")
+    total_requisitions = fields.Integer(string="Material Requisitions")
+
+    # Financial
+    total_budget = fields.Monetary(string="Total Budget")
+    total_spent = fields.Monetary(string="Total Spent")
+    remaining_budget = fields.Monetary(string="Remaining Budget")
+
+    _sql_constraints = [
+        ('unique_company_id', 'unique (company_id)', 'Only one Dashboard Snapshot is Valid for One Company')
+    ]
+
+    @api.depends('refresh_date')
+    def _compute_snapshot_age(self):
+        now = fields.Datetime.now()
+        for rec in self:
+            if not rec.refresh_date:
+                rec.snapshot_age = "Never refreshed"
+                continue
+            minutes = int((now - rec.refresh_date).total_seconds() // 60)
+            if minutes < 1:
+                rec.snapshot_age = "Just now"
+            elif minutes < 60:
+                rec.snapshot_age = "%s min ago" % minutes
+            else:
+                rec.snapshot_age = "%s h %s min ago" % divmod(minutes, 60)
+
+    @api.model
+    def _get_snapshot(self):
+        """Return the snapshot of the current company, building it on first use"""
+        snapshot = self.search([('company_id', '=', self.env.company.id)], limit=1)
+        if not snapshot:
+            snapshot = self.sudo().create({'company_id': self.env.company.id})
+            snapshot.action_refresh()
+        return snapshot
+
+    def _get_stats_values(self):
+        self.ensure_one()
+        values = {field_name: self[field_name] for field_name in STAT_FIELDS}
+        values.update({
+            'snapshot_date': self.refresh_date,
+            'snapshot_age': self.snapshot_age,
+        })
+        return values
+
+    def _is_outdated(self, version):
+        """Creations, writes and deletions of the dashboard sources bump the stats version, again
+        when their transaction commits, so a write committed after a refresh is never missed"""
+        self.ensure_one()
+        if not self.refresh_date or self.refresh_date < fields.Datetime.now() - SNAPSHOT_MAX_AGE:
+            return True
+        return self.stats_version != version
+
+    def _refresh(self, force=False):
+        """Recompute the outdated snapshots.
+
+        A snapshot stores the stats version it was computed at and is outdated once the version
+        moved past it. The version is read before computing, so changes made meanwhile leave the
+        snapshot outdated.
+        """
+        Dashboard = self.env['construction.dashboard']
+        version = Dashboard._get_stats_version()
+        for rec in self.sudo():
+            if not force and not rec._is_outdated(version):
+                continue
+            refresh_date = fields.Datetime.now()
+            stats = Dashboard.sudo().with_context(allowed_company_ids=rec.company_id.ids)._get_dashboard_stats()
+            values = {field_name: stats[field_name] for field_name in STAT_FIELDS}
+            values.update(refresh_date=refresh_date, stats_version=version)
+            rec.write(values)
+
+    def action_refresh(self):
+        self._refresh(force=True)
+        return True
+
+    @api.model
+    def _cron_refresh_snapshots(self):
+        snapshots = self.sudo().search([])
+        missing_companies = self.env['res.company'].sudo().search([('id', 'not in', snapshots.company_id.ids)])
+        snapshots |= self.sudo().create([{'company_id': company.id} for company in missing_companies])
+        snapshots._refresh()
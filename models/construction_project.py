@@ -39,6 +39,23 @@ class ConstructionSite(models.Model):
     certificate_count = fields.Integer(string="Certificate Count", compute="_compute_catalog_count")
     certificate_ids = fields.One2many('construction.certificate', 'construction_id')
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        sites = super(ConstructionSite, self).create(vals_list)
+        self.env['construction.dashboard']._invalidate_stats_cache()
+        return sites
+
+    def write(self, vals):
+        res = super(ConstructionSite, self).write(vals)
+        if 'site_type_id' in vals or 'name' in vals or 'company_id' in vals:
+            self.env['construction.dashboard']._invalidate_stats_cache()
+        return res
+
+    def unlink(self):
+        res = super(ConstructionSite, self).unlink()
+        self.env['construction.dashboard']._invalidate_stats_cache()
+        return res
+
     def action_gmap_location(self):
         if self.longitude and self.latitude:
             longitude = self.longitude
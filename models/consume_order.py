@@ -78,6 +78,7 @@ class ConsumeOrder(models.Model):
                     'product_id': line.product_id.id,
                     'product_uom_qty': line.quantity,
                     'product_uom': line.product_id.uom_id.id,
+                    'price_unit': line.product_id.standard_price,
                     'location_id': rec.warehouse_id.lot_stock_id.id,
                     'location_dest_id': self.env.ref('stock.stock_location_scrapped').id,
                     'picking_type_id': rec.warehouse_id.int_type_id.id,
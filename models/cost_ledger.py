@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+
+from flectra import fields, api, models
+from flectra.tools import split_every
+
+ORDER_TYPES = [('equipment', 'Equipment'), ('material', 'Material'), ('labour', 'Labour Bill'),
+               ('eng_arc', 'Engineer & Architect'), ('expense', 'Expense'), ('insurance', 'Risk & Insurance')]
+
+
+class ConstructionCostLedger(models.Model):
+    _name = 'construction.cost.ledger'
+    _description = 'Construction Cost Ledger'
+    _rec_name = 'construction_id'
+
+    construction_id = fields.Many2one('construction.details', string="Construction", required=True, index=True,
+                                      ondelete='cascade')
+    order_type = fields.Selection(ORDER_TYPES, string="Bill", required=True)
+    company_id = fields.Many2one(related='construction_id.company_id', store=True, readonly=True)
+    currency_id = fields.Many2one(related='construction_id.currency_id', readonly=True)
+    amount_all = fields.Monetary(string="All Bills")
+    amount_paid = fields.Monetary(string="Paid Bills")
+
+    _sql_constraints = [
+        ('unique_construction_order_type', 'unique (construction_id, order_type)',
+         'Only one Ledger Entry is Valid for One Construction and Bill Type')
+    ]
+
+    @api.model
+    def _schedule_refresh(self, construction_ids):
+        """Refresh the ledger of the given constructions when it is next read through
+        ``_get_amounts``, at the latest right before the transaction commits"""
+        construction_ids = {cid for cid in construction_ids if isinstance(cid, int)}
+        if not construction_ids:
+            return
+        precommit = self.env.cr.precommit
+        pending = precommit.data.get('construction.cost.ledger')
+        if pending is None:
+            pending = precommit.data['construction.cost.ledger'] = set()
+
+            @precommit.add
+            def refresh_ledger():
+                # precommit hooks run after the last flush of the transaction: write the rows
+                # now, and refresh again the constructions that flushing scheduled
+                while pending:
+                    self._refresh_pending()
+                    self.env.flush_all()
+                del precommit.data['construction.cost.ledger']
+        pending.update(construction_ids)
+        self._invalidate_construction_amounts(construction_ids)
+
+    @api.model
+    def _refresh_pending(self):
+        """Refresh the ledger rows of the constructions whose bills changed in this transaction;
+        called before reading the ledger"""
+        pending = self.env.cr.precommit.data.get('construction.cost.ledger')
+        if not pending:
+            return
+        # recomputing the bill amounts may schedule more constructions
+        self.env['account.move'].flush_model(['construction_id', 'order_type', 'amount_total', 'payment_state'])
+        construction_ids = set(pending)
+        pending.clear()
+        self._refresh_constructions(construction_ids)
+
+    @api.model
+    def _invalidate_construction_amounts(self, construction_ids):
+        """Drop the cached bill amounts of the constructions, which are computed from the ledger"""
+        Construction = self.env['construction.details']
+        fnames = [name for name, field in Construction._fields.items() if field.compute == '_compute_accountancy']
+        Construction.browse(construction_ids).invalidate_recordset(fnames)
+
+    @api.model
+    def _aggregate_bills(self, construction_ids):
+        """Return {(construction id, order type): [all amount, paid amount]} from a single pass
+        grouped by payment state"""
+        amounts = defaultdict(lambda: [0.0, 0.0])
+        move_data = self.env['account.move'].sudo().read_group(
+            [('construction_id', 'in', construction_ids), ('order_type', '!=', False)],
+            ['amount_total:sum'], ['construction_id', 'order_type', 'payment_state'], lazy=False)
+        for entry in move_data:
+            amount = entry.get('amount_total') or 0.0
+            totals = amounts[(entry['construction_id'][0], entry['order_type'])]
+            totals[0] += amount
+            if entry['payment_state'] == 'paid':
+                totals[1] += amount
+        return amounts
+
+    @api.model
+    def _refresh_constructions(self, construction_ids):
+        """Rewrite the ledger rows of the given constructions from their bills"""
+        construction_ids = list(construction_ids)
+        if not construction_ids:
+            return
+        Ledger = self.sudo()
+        amounts = self._aggregate_bills(construction_ids)
+        existing = {
+            (line.construction_id.id, line.order_type): line
+            for line in Ledger.search([('construction_id', 'in', construction_ids)])
+        }
+        to_create = []
+        changed = False
+        for (construction_id, order_type), (amount_all, amount_paid) in amounts.items():
+            line = existing.pop((construction_id, order_type), None)
+            if not line:
+                to_create.append({
+                    'construction_id': construction_id,
+                    'order_type': order_type,
+                    'amount_all': amount_all,
+                    'amount_paid': amount_paid,
+                })
+            elif line.amount_all != amount_all or line.amount_paid != amount_paid:
+                line.write({'amount_all': amount_all, 'amount_paid': amount_paid})
+                changed = True
+        if to_create:
+            Ledger.create(to_create)
+        if existing:
+            Ledger.browse([line.id for line in existing.values()]).unlink()
+        if changed or to_create or existing:
+            # the dashboard spending and the construction bill amounts are read from the ledger
+            self.env['construction.dashboard']._invalidate_stats_cache()
+            self._invalidate_construction_amounts(construction_ids)
+
+    @api.model
+    def _rebuild_ledger(self):
+        construction_ids = self.env['construction.details'].sudo().with_context(active_test=False).search([]).ids
+        for ids in split_every(1000, construction_ids, list):
+            self._refresh_constructions(ids)
+
+    @api.model
+    def _get_amounts(self, construction_ids):
+        """Return the ledger amounts as two {(construction id, order type): amount} mappings"""
+        self._refresh_pending()
+        amounts_all = defaultdict(float)
+        amounts_paid = defaultdict(float)
+        ledger_data = self.sudo().search_read([('construction_id', 'in', construction_ids)],
+                                              ['construction_id', 'order_type', 'amount_all', 'amount_paid'])
+        for entry in ledger_data:
+            key = (entry['construction_id'][0], entry['order_type'])
+            amounts_all[key] = entry['amount_all']
+            amounts_paid[key] = entry['amount_paid']
+        return amounts_all, amounts_paid
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+import numpy
+
+from flectra import fields, api, models
+from flectra.exceptions import ValidationError
+
+# Cost type: (BOQ line model, rate analysis line model, priced by product)
+ESCALATION_SOURCES = {
+    'material': ('construction.boq.material.line', 'construction.rate.analysis.material', True),
+    'equipment': ('construction.boq.equipment.line', 'construction.rate.analysis.equipment', True),
+    'labor': ('construction.boq.labor.line', 'construction.rate.analysis.labor', False),
+    'overhead': ('construction.boq.overhead.line', 'construction.rate.analysis.overhead', False),
+}
+
+
+class EscalationIndex(models.Model):
+    _name = 'construction.escalation.index'
+    _description = 'Price Escalation Index'
+    _order = 'cost_type, categ_id, name'
+
+    name = fields.Char(string='Index', required=True)
+    cost_type = fields.Selection([
+        ('material', 'Material'),
+        ('equipment', 'Equipment'),
+        ('labor', 'Labor'),
+        ('overhead', 'Overhead'),
+    ], string='Cost Type', required=True, default='material')
+    categ_id = fields.Many2one('product.category', string='Product Category',
+                               help="Leave empty to index every cost of the type without a more specific index")
+    value_ids = fields.One2many('construction.escalation.index.value', 'index_id', string='Values')
+    active = fields.Boolean(string='Active', default=True)
+    company_id = fields.Many2one('res.company', string='Company', default=lambda self: self.env.company)
+
+    def init(self):
+        # one active index per cost type, category and company; categ_id and company_id are
+        # nullable, which a unique constraint would let through
+        self.env.cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS %(table)s_cost_type_categ_company_uniq
+                ON %(table)s (cost_type, COALESCE(categ_id, 0), COALESCE(company_id, 0)) WHERE active
+        """ % {'table': self._table})
+
+    @api.model
+    def _get_factors(self, indices, base_date, dates, rows=None):
+        """Return the escalation factors as an array of ``len(indices) + 1`` rows by ``len(dates)`` columns.
+
+        An index value holds from its date until the next one; the factor is the value on each date
+        divided by the value on the base date. Dates before the first value keep a factor of 1, as
+        does the last row, used for the costs without index. Only the given ``rows`` are computed,
+        the indices no line uses keep a factor of 1 and need no value on the base date.
+        """
+        factors = numpy.ones((len(indices) + 1, len(dates)))
+        targets = numpy.array(dates, dtype='datetime64[D]')
+        base = numpy.datetime64(base_date, 'D')
+        series = {index.id: ([], []) for index in indices}
+        for value in self.env['construction.escalation.index.value'].search_read(
+                [('index_id', 'in', indices.ids)], ['index_id', 'date', 'value'], load=None, order='index_id, date'):
+            series[value['index_id']][0].append(value['date'])
+            series[value['index_id']][1].append(value['value'])
+        for row, index in enumerate(indices):
+            if rows is not None and row not in rows:
+                continue
+            index_dates = numpy.array(series[index.id][0], dtype='datetime64[D]')
+            values = numpy.array(series[index.id][1], dtype=float)
+            base_position = numpy.searchsorted(index_dates, base, side='right') - 1
+            if base_position < 0 or not values[base_position]:
+                raise ValidationError("! The index %s has no value on the base date %s" % (index.name, base_date))
+            positions = numpy.searchsorted(index_dates, targets, side='right') - 1
+            factors[row] = numpy.where(positions >= 0, values[positions] / values[base_position], 1.0)
+        return factors
+
+    @api.model
+    def _get_index_rows(self, indices, cost_type, categ_ids):
+        """Return the factor row of each product category, or of the cost type when ``categ_ids`` is None.
+
+        A category takes the index of its nearest indexed parent, then the general index of the cost type.
+        The index of the company is preferred over a shared one.
+        """
+        rows = {}
+        for row, index in enumerate(indices):
+            key = (index.cost_type, index.categ_id.id)
+            if key not in rows or index.company_id:
+                rows[key] = row
+        default = rows.get((cost_type, False), len(indices))
+        if categ_ids is None:
+            return default
+        result = {}
+        for categ in self.env['product.category'].browse(categ_ids):
+            parent_ids = [int(categ_id) for categ_id in categ.parent_path.split('/') if categ_id]
+            result[categ.id] = next((rows[(cost_type, categ_id)] for categ_id in reversed(parent_ids)
+                                     if (cost_type, categ_id) in rows), default)
+        return result
+
+    @api.model
+    def _escalate(self, owner_field, models_by_type, owner_ids, base_date, dates):
+        """Escalate the cost lines of the owners for every date.
+
+        :param models_by_type: ``{cost type: line model}``, the line models having ``owner_field`` and ``total``
+        :return: array of ``len(owner_ids)`` rows by ``len(dates)`` columns
+        """
+        indices = self.search([('company_id', 'in', [self.env.company.id, False])])
+        owner_rows = {owner_id: row for row, owner_id in enumerate(owner_ids)}
+        amounts, line_owners, line_rows = [], [], []
+        for cost_type, model in models_by_type.items():
+            by_product = ESCALATION_SOURCES[cost_type][2]
+            lines = self.env[model].search_read([(owner_field, 'in', list(owner_ids))],
+                                                [owner_field, 'total'] + (['product_id'] if by_product else []),
+                                                load=None)
+            if by_product:
+                products = self.env['product.product'].search_read(
+                    [('id', 'in', list({line['product_id'] for line in lines}))], ['categ_id'], load=None)
+                product_categs = {product['id']: product['categ_id'] for product in products}
+                categ_rows = self._get_index_rows(indices, cost_type, set(product_categs.values()))
+                line_rows += [categ_rows[product_categs[line['product_id']]] for line in lines]
+            else:
+                line_rows += [self._get_index_rows(indices, cost_type, None)] * len(lines)
+            amounts += [line['total'] or 0.0 for line in lines]
+            line_owners += [owner_rows[line[owner_field]] for line in lines]
+        result = numpy.zeros((len(owner_ids), len(dates)))
+        if amounts:
+            factors = self._get_factors(indices, base_date, dates, set(line_rows))
+            numpy.add.at(result, numpy.array(line_owners),
+                         numpy.array(amounts)[:, None] * factors[numpy.array(line_rows)])
+        return result
+
+    @api.model
+    def _escalate_boq_lines(self, lines, base_date, dates):
+        """Return the escalated totals of the BOQ lines, one row per line and one column per date"""
+        models_by_type = {cost_type: source[0] for cost_type, source in ESCALATION_SOURCES.items()}
+        return self._escalate('boq_line_id', models_by_type, lines.ids, base_date, dates)
+
+    @api.model
+    def _escalate_rate_analyses(self, rates, base_date, dates):
+        """Return the escalated total rates, one row per rate and one column per date.
+
+        Composite rates add the escalated rates of their components, evaluated first.
+        """
+        components, dummy = self.env['construction.rate.analysis']._get_rate_graph()
+        order, seen = [], set()
+
+        def visit(rate_id):
+            if rate_id in seen:
+                return
+            seen.add(rate_id)
+            for dummy, component_id, dummy in components.get(rate_id, []):
+                visit(component_id)
+            order.append(rate_id)
+
+        for rate_id in rates.ids:
+            visit(rate_id)
+        models_by_type = {cost_type: source[1] for cost_type, source in ESCALATION_SOURCES.items()}
+        result = self._escalate('rate_analysis_id', models_by_type, order, base_date, dates)
+        rows = {rate_id: row for row, rate_id in enumerate(order)}
+        for rate_id in order:
+            for dummy, component_id, quantity in components.get(rate_id, []):
+                result[rows[rate_id]] += quantity * result[rows[component_id]]
+        return result[[rows[rate_id] for rate_id in rates.ids]]
+
+
+class EscalationIndexValue(models.Model):
+    _name = 'construction.escalation.index.value'
+    _description = 'Price Escalation Index Value'
+    _order = 'index_id, date'
+
+    index_id = fields.Many2one('construction.escalation.index', string='Index', required=True, index=True,
+                               ondelete='cascade')
+    date = fields.Date(string='Date', required=True)
+    value = fields.Float(string='Value', required=True, digits=(16, 4))
+
+    _sql_constraints = [
+        ('unique_index_date', 'unique (index_id, date)', 'Only one value per index and date is allowed'),
+        ('positive_value', 'CHECK (value > 0)', 'Index values must be positive'),
+    ]
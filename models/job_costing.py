@@ -6,6 +6,7 @@ from flectra import fields, api, models
 
 class JobCosting(models.Model):
     _name = "job.costing"
+    _inherit = ['construction.rate.pricing.mixin']
     _description = "Job Costing"
 
     name = fields.Char(string='Sequence', required=True, readonly=True, default=lambda self: ('New'))
@@ -17,6 +18,10 @@ class JobCosting(models.Model):
     area_plot = fields.Float(string='Area of Plot')
     construction_rate = fields.Monetary(string='Construction Rate')
     cost_of_construction = fields.Monetary(string="Cost of Construction")
+    work_type_id = fields.Many2one('construction.work.type', string='Work Type')
+    work_subtype_id = fields.Many2one('construction.work.subtype', string='Work Sub Type',
+                                      domain="[('work_type_id', '=', work_type_id)]")
+    area_unit_id = fields.Many2one('uom.uom', string='Area Unit')
     start_date = fields.Date(string="Start Date")
     end_date = fields.Date(string="End Date")
     desc = fields.Html(string="Description")
@@ -69,7 +74,33 @@ class JobCosting(models.Model):
             if vals.get('name', ('New')) == ('New'):
                 vals['name'] = self.env['ir.sequence'].next_by_code(
                     'job.costing') or ('New')
-        return super(JobCosting, self).create(vals_list)
+        records = super(JobCosting, self).create(vals_list)
+        self.env['construction.dashboard']._invalidate_stats_cache()
+        return records
+
+    def write(self, vals):
+        res = super(JobCosting, self).write(vals)
+        if 'state' in vals or 'company_id' in vals:
+            self.env['construction.dashboard']._invalidate_stats_cache()
+        return res
+
+    def unlink(self):
+        res = super(JobCosting, self).unlink()
+        self.env['construction.dashboard']._invalidate_stats_cache()
+        return res
+
+    def _get_rate_key(self):
+        return (self.company_id.id or self.env.company.id, self.work_type_id.id, self.work_subtype_id.id,
+                self.area_unit_id.id)
+
+    def _get_rate_quantity(self):
+        return self.area_plot
+
+    def _prepare_rate_vals(self, rate):
+        vals = super()._prepare_rate_vals(rate)
+        if rate:
+            vals.update(construction_rate=vals['unit_rate'], cost_of_construction=vals['rate_amount'])
+        return vals
 
     @api.onchange('material_ids')
     def _onchange_material_total(self):
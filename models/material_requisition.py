@@ -41,7 +41,20 @@ class MaterialRequisition(models.Model):
         for vals in vals_list:
             if vals.get('name') in (False, 'New'):
                 vals['name'] = self.env['ir.sequence'].next_by_code('construction.material.requisition') or 'New'
-        return super().create(vals_list)
+        requisitions = super().create(vals_list)
+        self.env['construction.dashboard']._invalidate_stats_cache()
+        return requisitions
+
+    def write(self, vals):
+        res = super().write(vals)
+        if 'project_id' in vals:
+            self.env['construction.dashboard']._invalidate_stats_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env['construction.dashboard']._invalidate_stats_cache()
+        return res
 
     @api.depends('purchase_order_ids', 'internal_transfer_ids', 'line_ids')
     def _compute_back_orders(self):
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 # Copyright 2020 - Today Techkhedut.
 # Part of Techkhedut. See LICENSE file for full copyright and licensing details.
+from collections import defaultdict
+
 from flectra import fields, api, models
 from flectra.exceptions import ValidationError
 
@@ -50,7 +52,23 @@ class ConstructionProject(models.Model):
                     construction = self.env['construction.details'].search([('site_id', '=', site.id)], limit=1)
                     if construction:
                         vals['construction_id'] = construction.id
-        return super().create(vals_list)
+        projects = super().create(vals_list)
+        if projects.filtered('construction_id'):
+            self.env['construction.dashboard']._invalidate_stats_cache()
+        return projects
+
+    def write(self, vals):
+        res = super().write(vals)
+        if {'construction_id', 'parent_id', 'company_id'}.intersection(vals):
+            self.env['construction.dashboard']._invalidate_stats_cache()
+        return res
+
+    def unlink(self):
+        construction_projects = self.filtered('construction_id')
+        res = super().unlink()
+        if construction_projects:
+            self.env['construction.dashboard']._invalidate_stats_cache()
+        return res
     
     @api.constrains('parent_id', 'site_id')
     def _check_parent_id(self):
@@ -90,18 +108,39 @@ class ConstructionProject(models.Model):
         if self.construction_id and self.construction_id.site_id and not self.site_id:
             self.site_id = self.construction_id.site_id
 
+    @api.model
+    def _count_sub_projects(self, parent_ids):
+        """Count sub-projects linked to a site per (parent id, site id) with one grouped query.
+
+        The (parent id, False) key totals every site, which is what a parent without a site counts.
+        """
+        counts = defaultdict(int)
+        parent_ids = [parent_id for parent_id in parent_ids if isinstance(parent_id, int)]
+        if not parent_ids:
+            return counts
+        child_data = self.env['project.project'].read_group(
+            [('parent_id', 'in', parent_ids), ('site_id', '!=', False)],
+            ['__count'], ['parent_id', 'site_id'], lazy=False)
+        for entry in child_data:
+            parent_id = entry['parent_id'][0]
+            counts[(parent_id, entry['site_id'][0])] += entry['__count']
+            counts[(parent_id, False)] += entry['__count']
+        return counts
+
     def _compute_child_count(self):
+        child_counts = self._count_sub_projects(self.ids)
         for rec in self:
-            domain = [('parent_id', '=', rec.id)]
-            if rec.site_id:
-                domain.append(('site_id', '=', rec.site_id.id))
-            else:
-                domain.append(('site_id', '!=', False))
-            rec.child_count = self.env['project.project'].search_count(domain)
+            rec.child_count = child_counts[(rec.id, rec.site_id.id)]
 
     def _compute_phase_count(self):
+        phase_counts = defaultdict(int)
+        if self.ids:
+            phase_data = self.env['construction.project.phase'].read_group(
+                [('project_id', 'in', self.ids)], ['__count'], ['project_id'], lazy=False)
+            for entry in phase_data:
+                phase_counts[entry['project_id'][0]] = entry['__count']
         for rec in self:
-            rec.phase_count = self.env['construction.project.phase'].search_count([('project_id', '=', rec.id)])
+            rec.phase_count = phase_counts[rec.id]
 
     def action_view_sub_projects(self):
         self.ensure_one()
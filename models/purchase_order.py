@@ -14,6 +14,26 @@ class ConstructionPo(models.Model):
     material_requisition_id = fields.Many2one('construction.material.requisition', string='Material Requisition')
     subcontract_id = fields.Many2one('construction.subcontract', string='Subcontract')
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        orders = super(ConstructionPo, self).create(vals_list)
+        if any(vals.get('construction_id') for vals in vals_list):
+            self.env['construction.dashboard']._invalidate_stats_cache()
+        return orders
+
+    def write(self, vals):
+        res = super(ConstructionPo, self).write(vals)
+        if 'construction_id' in vals or 'order_type' in vals:
+            self.env['construction.dashboard']._invalidate_stats_cache()
+        return res
+
+    def unlink(self):
+        invalidate = bool(self.mapped('construction_id'))
+        res = super(ConstructionPo, self).unlink()
+        if invalidate:
+            self.env['construction.dashboard']._invalidate_stats_cache()
+        return res
+
     def _prepare_invoice(self):
         res = super(ConstructionPo, self)._prepare_invoice()
         if self.construction_id:
@@ -80,3 +100,36 @@ class ConstructionBills(models.Model):
                                    ('insurance', 'Risk & Insurance')],
                                   string="Bill")
     subcontract_id = fields.Many2one('construction.subcontract', string='Subcontract')
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        moves = super(ConstructionBills, self).create(vals_list)
+        if any(vals.get('construction_id') for vals in vals_list):
+            self.env['construction.dashboard']._invalidate_stats_cache()
+            moves._schedule_cost_ledger_refresh()
+        return moves
+
+    def write(self, vals):
+        if 'construction_id' not in vals and 'order_type' not in vals:
+            return super(ConstructionBills, self).write(vals)
+        old_constructions = self.construction_id
+        res = super(ConstructionBills, self).write(vals)
+        self.env['construction.cost.ledger']._schedule_refresh((old_constructions | self.construction_id).ids)
+        return res
+
+    def unlink(self):
+        self._schedule_cost_ledger_refresh()
+        return super(ConstructionBills, self).unlink()
+
+    def _compute_amount(self):
+        super(ConstructionBills, self)._compute_amount()
+        self._schedule_cost_ledger_refresh()
+
+    def _compute_payment_state(self):
+        super(ConstructionBills, self)._compute_payment_state()
+        self._schedule_cost_ledger_refresh()
+
+    def _schedule_cost_ledger_refresh(self):
+        construction_ids = self.construction_id._origin.ids
+        if construction_ids:
+            self.env['construction.cost.ledger']._schedule_refresh(construction_ids)
@@ -1,9 +1,55 @@
 # -*- coding: utf-8 -*-
+from collections import defaultdict
+
 from flectra import fields, api, models
+from flectra.exceptions import ValidationError
+from flectra.tools import lru
+
+# Per-process cache of resolved rates. Keys carry the value of a database sequence
+# bumped on every rate analysis change, so every worker sees invalidations.
+RATE_CACHE = lru.LRU(4096)
+RATE_VERSION_SEQUENCE = 'construction_rate_analysis_version'
+RATE_COST_FIELDS = ['material_cost', 'equipment_cost', 'labor_cost', 'overhead_cost', 'component_cost',
+                    'total_rate']
+
+
+class RateCacheMixin(models.AbstractModel):
+    """Invalidate the resolved rates whenever a rate analysis or one of its lines changes, and
+    re-evaluate the composite rates built on the changed ones"""
+    _name = 'construction.rate.cache.mixin'
+    _description = 'Rate Analysis Cache'
+
+    def _get_changed_rates(self):
+        return self.rate_analysis_id
+
+    @api.model
+    def _rates_changed(self, rates):
+        self.env['construction.rate.analysis']._invalidate_rate_cache()
+        # the evaluation writes the component costs itself
+        if rates and not self.env.context.get('rate_graph_update'):
+            rates._update_downstream_rates()
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self._rates_changed(records._get_changed_rates())
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        self._rates_changed(self._get_changed_rates())
+        return res
+
+    def unlink(self):
+        rates = self._get_changed_rates()
+        res = super().unlink()
+        self._rates_changed(rates.exists())
+        return res
 
 
 class RateAnalysis(models.Model):
     _name = 'construction.rate.analysis'
+    _inherit = ['construction.rate.cache.mixin']
     _description = 'Rate Analysis'
     _order = 'work_type_id, work_subtype_id'
 
@@ -24,19 +70,34 @@ class RateAnalysis(models.Model):
     overhead_line_ids = fields.One2many('construction.rate.analysis.overhead', 'rate_analysis_id', string='Overhead')
     overhead_cost = fields.Monetary(string='Overhead Cost', compute='_compute_costs', store=True)
     
+    component_line_ids = fields.One2many('construction.rate.analysis.component', 'rate_analysis_id',
+                                         string='Components')
+    component_cost = fields.Monetary(string='Component Cost', readonly=True, copy=False)
+    
     total_rate = fields.Monetary(string='Total Rate', compute='_compute_costs', store=True)
     
     company_id = fields.Many2one('res.company', string='Company', default=lambda self: self.env.company)
     currency_id = fields.Many2one(related='company_id.currency_id', string='Currency', readonly=True)
 
-    @api.depends('material_line_ids', 'equipment_line_ids', 'labor_line_ids', 'overhead_line_ids')
+    @api.depends('material_line_ids.total', 'equipment_line_ids.total', 'labor_line_ids.total',
+                 'overhead_line_ids.total', 'component_cost')
     def _compute_costs(self):
         for rec in self:
             rec.material_cost = sum(rec.material_line_ids.mapped('total'))
             rec.equipment_cost = sum(rec.equipment_line_ids.mapped('total'))
             rec.labor_cost = sum(rec.labor_line_ids.mapped('total'))
             rec.overhead_cost = sum(rec.overhead_line_ids.mapped('total'))
-            rec.total_rate = rec.material_cost + rec.equipment_cost + rec.labor_cost + rec.overhead_cost
+            rec.total_rate = (rec.material_cost + rec.equipment_cost + rec.labor_cost + rec.overhead_cost
+                              + rec.component_cost)
+
+    def name_get(self):
+        data = []
+        for rec in self:
+            name = rec.work_type_id.name
+            if rec.work_subtype_id:
+                name = '%s / %s' % (name, rec.work_subtype_id.name)
+            data.append((rec.id, '%s (%s)' % (name, rec.unit_id.name)))
+        return data
 
     @api.onchange('work_type_id')
     def _onchange_work_type(self):
@@ -44,9 +105,245 @@ class RateAnalysis(models.Model):
             return {'domain': {'work_subtype_id': [('work_type_id', '=', self.work_type_id.id)]}}
         return {'domain': {'work_subtype_id': []}}
 
+    def init(self):
+        self.env.cr.execute("CREATE SEQUENCE IF NOT EXISTS %s" % RATE_VERSION_SEQUENCE)
+
+    def _get_changed_rates(self):
+        return self
+
+    @api.model
+    def _get_rate_graph(self):
+        """Return the component edges as ``({rate id: [(component line id, component id, quantity)]},
+        {component id: [rate ids using it]})``"""
+        components = defaultdict(list)
+        users = defaultdict(list)
+        lines = self.env['construction.rate.analysis.component'].search_read(
+            [], ['rate_analysis_id', 'component_id', 'quantity'], load=None)
+        for line in lines:
+            components[line['rate_analysis_id']].append((line['id'], line['component_id'], line['quantity']))
+            users[line['component_id']].append(line['rate_analysis_id'])
+        return components, users
+
+    def _sort_downstream_rates(self, components, users):
+        """Return the ids of the rates and of every rate built on them, each one after its components"""
+        nodes = set(self.ids)
+        stack = list(self.ids)
+        while stack:
+            for rate_id in users.get(stack.pop(), []):
+                if rate_id not in nodes:
+                    nodes.add(rate_id)
+                    stack.append(rate_id)
+        # components outside the affected nodes are already evaluated
+        pending = {node: sum(1 for dummy, component_id, dummy in components.get(node, []) if component_id in nodes)
+                   for node in nodes}
+        ready = [node for node, count in pending.items() if not count]
+        order = []
+        while ready:
+            node = ready.pop()
+            order.append(node)
+            for rate_id in users.get(node, []):
+                pending[rate_id] -= 1
+                if not pending[rate_id]:
+                    ready.append(rate_id)
+        if len(order) < len(nodes):
+            cycle = self.browse([node for node, count in pending.items() if count])
+            raise ValidationError("! Circular rate analysis components: %s"
+                                  % ", ".join(name for dummy, name in cycle.name_get()))
+        return order
+
+    def _evaluate_downstream_rates(self, overrides=None):
+        """Evaluate in memory the rates and every rate built on them.
+
+        Only the affected part of the graph is evaluated, in topological order, each rate once:
+        the other rates keep their stored total. ``overrides`` maps rate ids to a total rate used
+        instead of the one of their lines.
+
+        :return: ``(totals, component_costs, line_rates)``: the total rate and the component cost of
+            every evaluated rate, and the component line ids per unit rate
+        """
+        overrides = overrides or {}
+        components, users = self._get_rate_graph()
+        order = self._sort_downstream_rates(components, users)
+        rate_ids = set(order)
+        for node in order:
+            rate_ids.update(component_id for dummy, component_id, dummy in components.get(node, []))
+        self.flush_model()
+        rates = {rate['id']: rate for rate in self.search_read([('id', 'in', list(rate_ids))], RATE_COST_FIELDS)}
+        totals = {rate_id: overrides.get(rate_id, rate['total_rate']) for rate_id, rate in rates.items()}
+        line_rates = defaultdict(list)
+        component_costs = {}
+        for node in order:
+            rate = rates[node]
+            component_cost = 0.0
+            for line_id, component_id, quantity in components.get(node, []):
+                line_rates[totals[component_id]].append(line_id)
+                component_cost += quantity * totals[component_id]
+            component_costs[node] = component_cost
+            totals[node] = overrides.get(node, rate['material_cost'] + rate['equipment_cost'] + rate['labor_cost']
+                                         + rate['overhead_cost'] + component_cost)
+        return {node: totals[node] for node in order}, component_costs, line_rates
+
+    def _update_downstream_rates(self):
+        """Re-evaluate the component costs of the rates and of every rate built on them"""
+        dummy, component_costs, line_rates = self._evaluate_downstream_rates()
+        RateAnalysis = self.with_context(rate_graph_update=True)
+        Component = self.env['construction.rate.analysis.component'].with_context(rate_graph_update=True)
+        for unit_rate, line_ids in line_rates.items():
+            lines = Component.browse(line_ids).filtered(lambda line: line.unit_rate != unit_rate)
+            lines.write({'unit_rate': unit_rate})
+        for rate in RateAnalysis.browse(list(component_costs)):
+            if rate.currency_id.compare_amounts(component_costs[rate.id], rate.component_cost):
+                rate.write({'component_cost': component_costs[rate.id]})
+
+    @api.model
+    def _get_rate_version(self):
+        self.env.cr.execute("SELECT last_value FROM %s" % RATE_VERSION_SEQUENCE)
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    def _invalidate_rate_cache(self):
+        """Bump the rate version now and again once the transaction commits, so a
+        rate resolved before the commit cannot stay cached under the new version."""
+        self.env.cr.execute("SELECT nextval('%s')" % RATE_VERSION_SEQUENCE)
+        postcommit = self.env.cr.postcommit
+        if postcommit.data.get('construction_rate_analysis'):
+            return
+        postcommit.data['construction_rate_analysis'] = True
+        registry = self.env.registry
+
+        @postcommit.add
+        def bump_version():
+            with registry.cursor() as cr:
+                cr.execute("SELECT nextval('%s')" % RATE_VERSION_SEQUENCE)
+
+    @api.model
+    def _find_rates(self, keys):
+        """Search the rate analyses of ``keys`` in one go.
+
+        A rate of the same company is preferred to a shared one, the exact sub type to a rate
+        without sub type and the exact unit to another unit of the same category, whose rate
+        is converted.
+        """
+        self.flush_model()
+        rates = self.search_read([
+            ('work_type_id', 'in', list({key[1] for key in keys})),
+            ('company_id', 'in', list({key[0] for key in keys}) + [False]),
+        ], ['company_id', 'work_type_id', 'work_subtype_id', 'unit_id'] + RATE_COST_FIELDS, load=None, order='id')
+        uoms = self.env['uom.uom'].browse({rate['unit_id'] for rate in rates} | {key[3] for key in keys if key[3]})
+        uoms = {uom.id: uom for uom in uoms}
+        result = {}
+        for key in keys:
+            company_id, work_type_id, work_subtype_id, uom_id = key
+            uom = uoms.get(uom_id)
+            best = best_rank = None
+            for rate in rates:
+                if rate['work_type_id'] != work_type_id or rate['company_id'] not in (company_id, False):
+                    continue
+                if rate['work_subtype_id'] not in (work_subtype_id, False):
+                    continue
+                rate_uom = uoms[rate['unit_id']]
+                if uom and rate_uom.category_id != uom.category_id:
+                    continue
+                rank = (rate['company_id'] == company_id, rate['work_subtype_id'] == work_subtype_id,
+                        not uom or rate_uom == uom)
+                if best_rank is None or rank > best_rank:
+                    best, best_rank = rate, rank
+            if best is None:
+                result[key] = False
+                continue
+            rate_uom = uoms[best['unit_id']]
+            values = {'rate_analysis_id': best['id'], 'unit_id': (uom or rate_uom).id}
+            for field in RATE_COST_FIELDS:
+                values[field] = rate_uom._compute_price(best[field], uom) if uom else best[field]
+            result[key] = values
+        return result
+
+    @api.model
+    def _resolve_rates(self, keys):
+        """Return the rate of each ``(company id, work type id, sub type id, unit id)`` key.
+
+        :return: ``{key: {'rate_analysis_id', 'unit_id', 'material_cost', 'equipment_cost',
+            'labor_cost', 'overhead_cost', 'total_rate'}}``, or False for the keys without rate.
+            Rates are given per unit of the key; the missing ones are searched in a single query.
+        """
+        prefix = (self.env.cr.dbname, self._get_rate_version())
+        result = {}
+        missing = []
+        for key in set(keys):
+            values = RATE_CACHE.get(prefix + key)
+            if values is None:
+                missing.append(key)
+            else:
+                result[key] = values
+        if missing:
+            for key, values in self._find_rates(missing).items():
+                RATE_CACHE[prefix + key] = values
+                result[key] = values
+        return {key: values and dict(values) for key, values in result.items()}
+
+
+class RatePricingMixin(models.AbstractModel):
+    """Records priced from the rate analysis of their work type, sub type and unit"""
+    _name = 'construction.rate.pricing.mixin'
+    _description = 'Rate Analysis Pricing'
+
+    rate_analysis_id = fields.Many2one('construction.rate.analysis', string='Rate Analysis', readonly=True,
+                                       copy=False)
+    unit_rate = fields.Monetary(string='Unit Rate', readonly=True, copy=False)
+    rate_amount = fields.Monetary(string='Rated Amount', readonly=True, copy=False)
+
+    def _get_rate_key(self):
+        """Return the ``(company id, work type id, sub type id, unit id)`` key of the record's rate"""
+        return (self.company_id.id or self.env.company.id, self.work_type_id.id, self.work_subtype_id.id,
+                self.unit_id.id)
+
+    def _get_rate_quantity(self):
+        return self.quantity
+
+    def _prepare_rate_vals(self, rate):
+        if not rate:
+            return {'rate_analysis_id': False, 'unit_rate': 0.0, 'rate_amount': 0.0}
+        return {
+            'rate_analysis_id': rate['rate_analysis_id'],
+            'unit_rate': rate['total_rate'],
+            'rate_amount': rate['total_rate'] * (self._get_rate_quantity() or 0.0),
+        }
+
+    def action_apply_rates(self):
+        """Price the records from their rate analysis, all rates being resolved at once"""
+        records = self.filtered('work_type_id')
+        keys = {rec.id: rec._get_rate_key() for rec in records}
+        rates = self.env['construction.rate.analysis']._resolve_rates(keys.values())
+        for rec in records:
+            rec.write(rec._prepare_rate_vals(rates[keys[rec.id]]))
+        return rates
+
+
+class RateAnalysisComponent(models.Model):
+    _name = 'construction.rate.analysis.component'
+    _inherit = ['construction.rate.cache.mixin']
+    _description = 'Rate Analysis Component'
+
+    rate_analysis_id = fields.Many2one('construction.rate.analysis', string='Rate Analysis', required=True,
+                                       index=True, ondelete='cascade')
+    component_id = fields.Many2one('construction.rate.analysis', string='Component Rate', required=True,
+                                   index=True, ondelete='restrict')
+    unit_id = fields.Many2one(related='component_id.unit_id', string='Unit', readonly=True)
+    quantity = fields.Float(string='Quantity', required=True, default=1.0)
+    unit_rate = fields.Monetary(string='Unit Rate', readonly=True, copy=False)
+    total = fields.Monetary(string='Total', compute='_compute_total', store=True)
+    company_id = fields.Many2one(related='rate_analysis_id.company_id', store=True, readonly=True)
+    currency_id = fields.Many2one(related='rate_analysis_id.currency_id', store=True, readonly=True)
+
+    @api.depends('quantity', 'unit_rate')
+    def _compute_total(self):
+        for rec in self:
+            rec.total = (rec.quantity or 0.0) * (rec.unit_rate or 0.0)
+
 
 class RateAnalysisMaterial(models.Model):
     _name = 'construction.rate.analysis.material'
+    _inherit = ['construction.rate.cache.mixin']
     _description = 'Rate Analysis Material'
 
     rate_analysis_id = fields.Many2one('construction.rate.analysis', string='Rate Analysis', required=True, ondelete='cascade')
@@ -65,6 +362,7 @@ class RateAnalysisMaterial(models.Model):
 
 class RateAnalysisEquipment(models.Model):
     _name = 'construction.rate.analysis.equipment'
+    _inherit = ['construction.rate.cache.mixin']
     _description = 'Rate Analysis Equipment'
 
     rate_analysis_id = fields.Many2one('construction.rate.analysis', string='Rate Analysis', required=True, ondelete='cascade')
@@ -83,6 +381,7 @@ class RateAnalysisEquipment(models.Model):
 
 class RateAnalysisLabor(models.Model):
     _name = 'construction.rate.analysis.labor'
+    _inherit = ['construction.rate.cache.mixin']
     _description = 'Rate Analysis Labor'
 
     rate_analysis_id = fields.Many2one('construction.rate.analysis', string='Rate Analysis', required=True, ondelete='cascade')
@@ -101,6 +400,7 @@ class RateAnalysisLabor(models.Model):
 
 class RateAnalysisOverhead(models.Model):
     _name = 'construction.rate.analysis.overhead'
+    _inherit = ['construction.rate.cache.mixin']
     _description = 'Rate Analysis Overhead'
 
     rate_analysis_id = fields.Many2one('construction.rate.analysis', string='Rate Analysis', required=True, ondelete='cascade')
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+
+from flectra import api, models
+
+
+class RollupMixin(models.AbstractModel):
+    """Keep the totals of a parent record up to date by applying deltas.
+
+    Instead of re-summing every child on each change, creating, editing or
+    deleting a child adds the difference of its values to its parent. The
+    parent totals are plain stored fields; ``_reconcile_rollup_totals`` of the
+    parent rebuilds them from scratch. Bulk loaders that already wrote the
+    parent totals can bypass the deltas with the ``rollup_skip`` context key.
+    """
+    _name = 'construction.rollup.mixin'
+    _description = 'Rolled-up Totals'
+
+    # Many2one to the parent holding the totals
+    _rollup_parent = None
+    # Child field: parent fields it adds up into
+    _rollup_fields = {}
+
+    def _rollup_trigger_fields(self):
+        """Fields whose change may change what the records add to their parent"""
+        fields = {self._rollup_parent}
+        for name in self._rollup_fields:
+            fields.add(name)
+            field = self._fields[name]
+            if field.compute:
+                fields.update(path.split('.')[0] for path in field.get_depends(self)[0])
+        return fields
+
+    def _rollup_snapshot(self, field_names=None):
+        """Return what the records add to their parent, as ``[(parent id, {parent field: value})]``"""
+        snapshot = []
+        for rec in self:
+            parent = rec[self._rollup_parent]
+            if not parent:
+                continue
+            values = defaultdict(float)
+            for name, parent_fields in self._rollup_fields.items():
+                if field_names is None or name in field_names:
+                    for parent_field in parent_fields:
+                        values[parent_field] += rec[name]
+            snapshot.append((parent.id, values))
+        return snapshot
+
+    @api.model
+    def _apply_rollup(self, before, after):
+        """Add to each parent the difference between the ``after`` and ``before`` snapshots"""
+        if self.env.context.get('rollup_skip'):
+            return
+        deltas = defaultdict(lambda: defaultdict(float))
+        for sign, snapshot in ((-1, before), (1, after)):
+            for parent_id, values in snapshot:
+                for parent_field, value in values.items():
+                    deltas[parent_id][parent_field] += sign * value
+        parent_model = self.env[self._fields[self._rollup_parent].comodel_name]
+        for parent in parent_model.browse(list(deltas)).exists():
+            currency = parent.currency_id or self.env.company.currency_id
+            vals = {parent_field: parent[parent_field] + delta
+                    for parent_field, delta in deltas[parent.id].items() if not currency.is_zero(delta)}
+            if vals:
+                parent.write(vals)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        # Stored totals are counted as soon as they exist, plain ones only when given: the
+        # children created along with the record add themselves to it through ``write``.
+        computed = {name for name in self._rollup_fields if self._fields[name].compute}
+        after = []
+        for rec, vals in zip(records, vals_list):
+            after += rec._rollup_snapshot(computed.union(vals))
+        self._apply_rollup([], after)
+        return records
+
+    def write(self, vals):
+        if not self._rollup_trigger_fields().intersection(vals):
+            return super().write(vals)
+        before = self._rollup_snapshot()
+        res = super().write(vals)
+        self._apply_rollup(before, self._rollup_snapshot())
+        return res
+
+    def unlink(self):
+        before = self._rollup_snapshot()
+        res = super().unlink()
+        self._apply_rollup(before, [])
+        return res
+
+
+class RollupParentMixin(models.AbstractModel):
+    """Records whose totals are rolled up from ``construction.rollup.mixin`` children"""
+    _name = 'construction.rollup.parent.mixin'
+    _description = 'Rolled-up Totals Parent'
+
+    def _get_rollup_children(self):
+        """Return the child models rolling up into this model"""
+        children = []
+        for model_name in self.env.registry.descendants(['construction.rollup.mixin'], '_inherit'):
+            model = self.env[model_name]
+            if model._abstract or not model._rollup_parent:
+                continue
+            if model._fields[model._rollup_parent].comodel_name == self._name:
+                children.append(model)
+        return children
+
+    @api.model
+    def _reconcile_rollup_totals(self, domain=None):
+        """Recompute the rolled-up totals of the records matching ``domain`` (all by default) from
+        their children and fix the ones that drifted"""
+        parents = self.search(domain or [])
+        expected = defaultdict(lambda: defaultdict(float))
+        parent_fields = set()
+        for child in self._get_rollup_children():
+            if domain:
+                child_domain = [(child._rollup_parent, 'in', parents.ids)]
+            else:
+                child_domain = [(child._rollup_parent, '!=', False)]
+            groups = child.read_group(child_domain, ['%s:sum' % name for name in child._rollup_fields],
+                                      [child._rollup_parent], lazy=False)
+            for group in groups:
+                parent_id = group[child._rollup_parent][0]
+                for name, names in child._rollup_fields.items():
+                    for parent_field in names:
+                        expected[parent_id][parent_field] += group[name] or 0.0
+            for names in child._rollup_fields.values():
+                parent_fields.update(names)
+        fixed = self.browse()
+        for rec in parents:
+            currency = rec.currency_id or self.env.company.currency_id
+            vals = {name: expected[rec.id][name] for name in parent_fields
+                    if currency.compare_amounts(rec[name], expected[rec.id][name])}
+            if vals:
+                rec.write(vals)
+                fixed |= rec
+        return fixed
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+
+from flectra import fields, api, models
+from flectra.exceptions import ValidationError
+
+# Override type: [(line model, owner, owner field, key field, quantity field, price field)]. A line without
+# quantity field is priced from a rate analysis, its quantity is its rated amount over its unit rate.
+SCENARIO_SOURCES = {
+    'product': [
+        ('construction.boq.material.line', 'boq', 'boq_line_id', 'product_id', 'quantity', 'unit_price'),
+        ('construction.boq.equipment.line', 'boq', 'boq_line_id', 'product_id', 'quantity', 'unit_price'),
+        ('construction.phase.material.entry', 'phase', 'phase_id', 'product_id', 'quantity', 'unit_price'),
+        ('construction.phase.equipment.entry', 'phase', 'phase_id', 'product_id', 'quantity', 'unit_price'),
+    ],
+    'labor': [
+        ('construction.boq.labor.line', 'boq', 'boq_line_id', 'name', 'hours', 'rate'),
+        ('construction.phase.labor.entry', 'phase', 'phase_id', 'name', 'hours', 'rate'),
+    ],
+    'rate_analysis': [
+        ('construction.boq.line', 'boq', 'boq_id', 'rate_analysis_id', False, 'unit_rate'),
+        ('construction.project.phase', 'phase', 'id', 'rate_analysis_id', False, 'unit_rate'),
+    ],
+}
+# Owner: (model, domain of the open records, total field, rated model, rated owner field). The total field
+# only adds up the cost lines, the amounts priced from rate analyses are read from the rated model.
+SCENARIO_OWNERS = {
+    'boq': ('construction.boq', [('state', '!=', 'cancel')], 'total_budget', 'construction.boq.line', 'boq_id'),
+    'phase': ('construction.project.phase', [('state', 'not in', ('completed', 'cancel'))], 'total_cost',
+              'construction.project.phase', 'id'),
+}
+
+
+class Scenario(models.Model):
+    _name = 'construction.scenario'
+    _description = 'What-if Scenario'
+    _order = 'id desc'
+
+    name = fields.Char(string='Scenario', required=True)
+    description = fields.Text(string='Description')
+    line_ids = fields.One2many('construction.scenario.line', 'scenario_id', string='Price Changes', copy=True)
+    result_ids = fields.One2many('construction.scenario.result', 'scenario_id', string='Impact', readonly=True)
+    simulation_date = fields.Datetime(string='Simulated On', readonly=True, copy=False)
+    company_id = fields.Many2one('res.company', string='Company', default=lambda self: self.env.company)
+    currency_id = fields.Many2one(related='company_id.currency_id', string='Currency', readonly=True)
+    delta_amount = fields.Monetary(string='Total Impact', readonly=True, copy=False)
+
+    def _get_overrides(self):
+        """Return the new prices as ``{override type: {key: price}}``.
+
+        Overridden rate analyses also change the composite rates built on them, evaluated in memory.
+        """
+        overrides = defaultdict(dict)
+        for line in self.line_ids:
+            overrides[line.override_type][line._get_key()] = line.new_price
+        if overrides['rate_analysis']:
+            rates = self.env['construction.rate.analysis'].browse(list(overrides['rate_analysis']))
+            totals, dummy, dummy = rates._evaluate_downstream_rates(overrides['rate_analysis'])
+            overrides['rate_analysis'].update(totals)
+        return overrides
+
+    @api.model
+    def _build_index(self, overrides):
+        """Index the lines of the open BOQs and phases using the overridden keys.
+
+        :return: ``{(override type, key): [(owner, owner id, quantity, current price, price factor)]}``,
+            the price factor converting the new price into the unit of the line
+        """
+        index = defaultdict(list)
+        boq_line_ids = set()
+        entries = []
+        for override_type, prices in overrides.items():
+            if not prices:
+                continue
+            rate_totals = {}
+            if override_type == 'rate_analysis':
+                rates = self.env['construction.rate.analysis'].search_read(
+                    [('id', 'in', list(prices))], ['total_rate'])
+                rate_totals = {rate['id']: rate['total_rate'] for rate in rates}
+            for model, owner, owner_field, key_field, quantity_field, price_field in SCENARIO_SOURCES[override_type]:
+                prefix = {'id': '', 'boq_line_id': 'boq_line_id.boq_id.'}.get(owner_field, owner_field + '.')
+                domain = [(key_field, 'in', list(prices))]
+                domain += [(prefix + field_name, operator, value)
+                           for field_name, operator, value in SCENARIO_OWNERS[owner][1]]
+                read_fields = [owner_field, key_field, price_field, quantity_field or 'rate_amount']
+                for line in self.env[model].search_read(domain, read_fields, load=None):
+                    price = line[price_field] or 0.0
+                    if quantity_field:
+                        quantity, factor = line[quantity_field], 1.0
+                    elif price and rate_totals.get(line[key_field]):
+                        quantity, factor = line['rate_amount'] / price, price / rate_totals[line[key_field]]
+                    else:
+                        continue
+                    if owner_field == 'boq_line_id':
+                        boq_line_ids.add(line[owner_field])
+                    entries.append(((override_type, line[key_field]), owner, owner_field, line[owner_field],
+                                    quantity, price, factor))
+        boq_lines = self.env['construction.boq.line'].search_read([('id', 'in', list(boq_line_ids))], ['boq_id'],
+                                                                  load=None)
+        line_boqs = {line['id']: line['boq_id'] for line in boq_lines}
+        for key, owner, owner_field, owner_id, quantity, price, factor in entries:
+            if owner_field == 'boq_line_id':
+                owner_id = line_boqs[owner_id]
+            index[key].append((owner, owner_id, quantity, price, factor))
+        return index
+
+    @api.model
+    def _get_rated_amounts(self, owner, owner_ids):
+        """Return the amounts priced from rate analyses per owner id"""
+        dummy, dummy, dummy, model, owner_field = SCENARIO_OWNERS[owner]
+        amounts = defaultdict(float)
+        for line in self.env[model].search_read([(owner_field, 'in', owner_ids)], [owner_field, 'rate_amount'],
+                                                load=None):
+            amounts[line[owner_field]] += line['rate_amount'] or 0.0
+        return amounts
+
+    def action_simulate(self):
+        """Compute the impact of the price changes on every open BOQ and phase, without writing to them.
+
+        The current amount of a BOQ or phase is its cost lines total plus its rated amounts, the base
+        of both the cost line and the rate analysis changes.
+        """
+        self.ensure_one()
+        if not self.line_ids:
+            raise ValidationError("! Add at least one price change to simulate")
+        overrides = self._get_overrides()
+        deltas = defaultdict(float)
+        for (override_type, key), entries in self._build_index(overrides).items():
+            new_price = overrides[override_type][key]
+            for owner, owner_id, quantity, price, factor in entries:
+                deltas[(owner, owner_id)] += quantity * (new_price * factor - price)
+        result_vals = []
+        for owner, (model, dummy, total_field, dummy, dummy) in SCENARIO_OWNERS.items():
+            owner_ids = [owner_id for key_owner, owner_id in deltas if key_owner == owner]
+            rated_amounts = self._get_rated_amounts(owner, owner_ids)
+            for record in self.env[model].search_read([('id', 'in', owner_ids)], [total_field], load=None):
+                delta = deltas[(owner, record['id'])]
+                if self.currency_id.is_zero(delta):
+                    continue
+                current = (record[total_field] or 0.0) + rated_amounts[record['id']]
+                result_vals.append({
+                    '%s_id' % owner: record['id'],
+                    'current_amount': current,
+                    'simulated_amount': current + delta,
+                    'delta_amount': delta,
+                    'delta_percent': delta / current * 100.0 if current else 0.0,
+                })
+        result_vals.sort(key=lambda vals: abs(vals['delta_amount']), reverse=True)
+        for rank, vals in enumerate(result_vals, start=1):
+            vals['rank'] = rank
+        self.write({
+            'result_ids': [fields.Command.clear()] + [fields.Command.create(vals) for vals in result_vals],
+            'simulation_date': fields.Datetime.now(),
+            'delta_amount': sum(vals['delta_amount'] for vals in result_vals),
+        })
+
+
+class ScenarioLine(models.Model):
+    _name = 'construction.scenario.line'
+    _description = 'What-if Scenario Price Change'
+
+    scenario_id = fields.Many2one('construction.scenario', string='Scenario', required=True, ondelete='cascade')
+    override_type = fields.Selection([
+        ('product', 'Material / Equipment Price'),
+        ('labor', 'Labor Rate'),
+        ('rate_analysis', 'Rate Analysis'),
+    ], string='Change', required=True, default='product')
+    product_id = fields.Many2one('product.product', string='Product',
+                                 domain=['|', ('is_material', '=', True), ('is_equipment', '=', True)])
+    labor_name = fields.Char(string='Labor Description')
+    rate_analysis_id = fields.Many2one('construction.rate.analysis', string='Rate Analysis')
+    new_price = fields.Monetary(string='New Price', help="Unit price, hourly rate or total rate")
+    currency_id = fields.Many2one(related='scenario_id.currency_id', readonly=True)
+
+    @api.constrains('override_type', 'product_id', 'labor_name', 'rate_analysis_id')
+    def _check_key(self):
+        for rec in self:
+            if not rec._get_key():
+                raise ValidationError("! Select what the price change applies to")
+
+    def _get_key(self):
+        if self.override_type == 'product':
+            return self.product_id.id
+        if self.override_type == 'labor':
+            return self.labor_name
+        return self.rate_analysis_id.id
+
+
+class ScenarioResult(models.Model):
+    _name = 'construction.scenario.result'
+    _description = 'What-if Scenario Impact'
+    _order = 'scenario_id, rank'
+
+    scenario_id = fields.Many2one('construction.scenario', string='Scenario', required=True, index=True,
+                                  ondelete='cascade')
+    rank = fields.Integer(string='Rank')
+    boq_id = fields.Many2one('construction.boq', string='BOQ', ondelete='cascade')
+    phase_id = fields.Many2one('construction.project.phase', string='Phase', ondelete='cascade')
+    project_id = fields.Many2one('project.project', string='Sub Project', compute='_compute_project_id', store=True)
+    currency_id = fields.Many2one(related='scenario_id.currency_id', readonly=True)
+    current_amount = fields.Monetary(string='Current Total')
+    simulated_amount = fields.Monetary(string='Simulated Total')
+    delta_amount = fields.Monetary(string='Impact')
+    delta_percent = fields.Float(string='Impact (%)', digits=(16, 2))
+
+    @api.depends('boq_id', 'phase_id')
+    def _compute_project_id(self):
+        for rec in self:
+            rec.project_id = rec.boq_id.project_id or rec.phase_id.project_id
@@ -7,11 +7,13 @@ from flectra.exceptions import ValidationError
 
 class TaskLibrary(models.Model):
     _name = 'construction.task.library'
+    _inherit = ['construction.catalog.search.mixin']
     _description = 'Task Library'
     _order = 'name'
+    _catalog_search_fields = ['name', 'description']
 
-    name = fields.Char(string='Task Name', required=True)
-    description = fields.Text(string='Description')
+    name = fields.Char(string='Task Name', required=True, index='trigram')
+    description = fields.Text(string='Description', index='trigram')
     work_type_id = fields.Many2one('construction.work.type', string='Work Type')
     work_subtype_id = fields.Many2one('construction.work.subtype', string='Work Sub Type')
     
@@ -44,7 +46,8 @@ class TaskLibrary(models.Model):
     company_id = fields.Many2one('res.company', string='Company', default=lambda self: self.env.company)
     currency_id = fields.Many2one('res.currency', related='company_id.currency_id', string='Currency', readonly=True)
 
-    @api.depends('material_line_ids', 'equipment_line_ids', 'labor_line_ids', 'overhead_line_ids', 'subcontractor_line_ids')
+    @api.depends('material_line_ids.total', 'equipment_line_ids.total', 'labor_line_ids.total',
+                 'overhead_line_ids.total', 'subcontractor_line_ids.total')
     def _compute_totals(self):
         for rec in self:
             rec.material_total = sum(rec.material_line_ids.mapped('total'))
@@ -69,7 +72,7 @@ class TaskLibrary(models.Model):
             'res_model': 'construction.import.task.library.wizard',
             'view_mode': 'form',
             'target': 'new',
-            'context': {'default_task_library_id': self.id}
+            'context': {'default_task_library_ids': self.ids}
         }
 
 
@@ -4,12 +4,14 @@ from flectra import fields, api, models
 
 class ToolsCatalog(models.Model):
     _name = 'construction.tools.catalog'
+    _inherit = ['construction.catalog.search.mixin']
     _description = 'Tools Catalog'
     _order = 'name'
+    _catalog_search_fields = ['name', 'code', 'description']
 
-    name = fields.Char(string='Tool Name', required=True)
-    code = fields.Char(string='Code')
-    description = fields.Text(string='Description')
+    name = fields.Char(string='Tool Name', required=True, index='trigram')
+    code = fields.Char(string='Code', index='trigram')
+    description = fields.Text(string='Description', index='trigram')
     category_id = fields.Many2one('construction.tools.category', string='Category')
     vendor_id = fields.Many2one('res.partner', string='Vendor')
     unit_price = fields.Monetary(string='Unit Price')
@@ -38,3 +40,6 @@ class ConstructionConfigSettings(models.TransientModel):
     email_on_material_requisition = fields.Boolean(string='Email on Material Requisition', config_parameter='construction_management.email_on_material_requisition')
     email_on_subcontract_approval = fields.Boolean(string='Email on Subcontract Approval', config_parameter='construction_management.email_on_subcontract_approval')
 
+    # Procurement Settings
+    consolidate_purchase_orders = fields.Boolean(string='Consolidate Purchase Orders per Vendor', config_parameter='construction_management.consolidate_purchase_orders')
+
@@ -5,6 +5,7 @@ from flectra.exceptions import ValidationError
 
 class ProjectPhase(models.Model):
     _name = 'construction.project.phase'
+    _inherit = ['construction.rollup.parent.mixin', 'construction.rate.pricing.mixin']
     _description = 'Construction Project Phase (WBS)'
     _order = 'sequence, id'
 
@@ -16,6 +17,8 @@ class ProjectPhase(models.Model):
     description = fields.Text(string='Description')
     start_date = fields.Date(string='Start Date')
     end_date = fields.Date(string='End Date')
+    boq_line_id = fields.Many2one('construction.boq.line', string='BOQ Line', readonly=True, index=True,
+                                  ondelete='set null', copy=False)
     
     # Phase Entries
     material_entry_ids = fields.One2many('construction.phase.material.entry', 'phase_id', string='Material Entries')
@@ -24,11 +27,11 @@ class ProjectPhase(models.Model):
     overhead_entry_ids = fields.One2many('construction.phase.overhead.entry', 'phase_id', string='Overhead Entries')
     
     # Totals
-    total_material = fields.Monetary(string='Total Material', compute='_compute_totals', store=True)
-    total_equipment = fields.Monetary(string='Total Equipment', compute='_compute_totals', store=True)
-    total_labor = fields.Monetary(string='Total Labor', compute='_compute_totals', store=True)
-    total_overhead = fields.Monetary(string='Total Overhead', compute='_compute_totals', store=True)
-    total_cost = fields.Monetary(string='Total Cost', compute='_compute_totals', store=True)
+    total_material = fields.Monetary(string='Total Material', readonly=True, copy=False)
+    total_equipment = fields.Monetary(string='Total Equipment', readonly=True, copy=False)
+    total_labor = fields.Monetary(string='Total Labor', readonly=True, copy=False)
+    total_overhead = fields.Monetary(string='Total Overhead', readonly=True, copy=False)
+    total_cost = fields.Monetary(string='Total Cost', readonly=True, copy=False)
     
     # Work Orders
     work_order_ids = fields.One2many('construction.work.order', 'phase_id', string='Work Orders')
@@ -43,8 +46,25 @@ class ProjectPhase(models.Model):
         ('cancel', 'Cancelled'),
     ], default='draft', string='Status')
 
-    @api.depends('material_entry_ids', 'equipment_entry_ids', 'labor_entry_ids', 'overhead_entry_ids')
-    def _compute_totals(self):
+    @api.model_create_multi
+    def create(self, vals_list):
+        phases = super().create(vals_list)
+        self.env['construction.dashboard']._invalidate_stats_cache()
+        return phases
+
+    def write(self, vals):
+        res = super().write(vals)
+        if 'state' in vals or 'project_id' in vals:
+            self.env['construction.dashboard']._invalidate_stats_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env['construction.dashboard']._invalidate_stats_cache()
+        return res
+
+    @api.onchange('material_entry_ids', 'equipment_entry_ids', 'labor_entry_ids', 'overhead_entry_ids')
+    def _onchange_totals(self):
         for rec in self:
             rec.total_material = sum(rec.material_entry_ids.mapped('total'))
             rec.total_equipment = sum(rec.equipment_entry_ids.mapped('total'))
@@ -52,6 +72,13 @@ class ProjectPhase(models.Model):
             rec.total_overhead = sum(rec.overhead_entry_ids.mapped('total'))
             rec.total_cost = rec.total_material + rec.total_equipment + rec.total_labor + rec.total_overhead
 
+    def _get_rate_key(self):
+        return (self.company_id.id or self.env.company.id, self.work_type_id.id, self.work_subtype_id.id,
+                self.boq_line_id.unit_id.id)
+
+    def _get_rate_quantity(self):
+        return self.boq_line_id.quantity or 1.0
+
     @api.depends('work_order_ids')
     def _compute_work_order_count(self):
         for rec in self:
@@ -84,13 +111,16 @@ class ProjectPhase(models.Model):
             'res_model': 'construction.import.task.library.wizard',
             'view_mode': 'form',
             'target': 'new',
-            'context': {'default_phase_id': self.id}
+            'context': {'default_phase_ids': self.ids}
         }
 
 
 class PhaseMaterialEntry(models.Model):
     _name = 'construction.phase.material.entry'
+    _inherit = ['construction.rollup.mixin']
     _description = 'Phase Material Entry'
+    _rollup_parent = 'phase_id'
+    _rollup_fields = {'total': ('total_material', 'total_cost')}
 
     phase_id = fields.Many2one('construction.project.phase', string='Phase', required=True, ondelete='cascade')
     product_id = fields.Many2one('product.product', string='Material', required=True, domain=[('is_material', '=', True)])
@@ -110,7 +140,10 @@ class PhaseMaterialEntry(models.Model):
 
 class PhaseEquipmentEntry(models.Model):
     _name = 'construction.phase.equipment.entry'
+    _inherit = ['construction.rollup.mixin']
     _description = 'Phase Equipment Entry'
+    _rollup_parent = 'phase_id'
+    _rollup_fields = {'total': ('total_equipment', 'total_cost')}
 
     phase_id = fields.Many2one('construction.project.phase', string='Phase', required=True, ondelete='cascade')
     product_id = fields.Many2one('product.product', string='Equipment', required=True, domain=[('is_equipment', '=', True)])
@@ -130,7 +163,10 @@ class PhaseEquipmentEntry(models.Model):
 
 class PhaseLaborEntry(models.Model):
     _name = 'construction.phase.labor.entry'
+    _inherit = ['construction.rollup.mixin']
     _description = 'Phase Labor Entry'
+    _rollup_parent = 'phase_id'
+    _rollup_fields = {'total': ('total_labor', 'total_cost')}
 
     phase_id = fields.Many2one('construction.project.phase', string='Phase', required=True, ondelete='cascade')
     name = fields.Char(string='Labor Description', required=True)
@@ -149,7 +185,10 @@ class PhaseLaborEntry(models.Model):
 
 class PhaseOverheadEntry(models.Model):
     _name = 'construction.phase.overhead.entry'
+    _inherit = ['construction.rollup.mixin']
     _description = 'Phase Overhead Entry'
+    _rollup_parent = 'phase_id'
+    _rollup_fields = {'total': ('total_overhead', 'total_cost')}
 
     phase_id = fields.Many2one('construction.project.phase', string='Phase', required=True, ondelete='cascade')
     name = fields.Char(string='Overhead Description', required=True)
@@ -205,7 +244,20 @@ class WorkOrder(models.Model):
         for vals in vals_list:
             if vals.get('name') in (False, 'New'):
                 vals['name'] = self.env['ir.sequence'].next_by_code('construction.work.order') or 'New'
-        return super().create(vals_list)
+        work_orders = super().create(vals_list)
+        self.env['construction.dashboard']._invalidate_stats_cache()
+        return work_orders
+
+    def write(self, vals):
+        res = super().write(vals)
+        if 'state' in vals or 'project_id' in vals:
+            self.env['construction.dashboard']._invalidate_stats_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env['construction.dashboard']._invalidate_stats_cache()
+        return res
 
     @api.onchange('phase_id')
     def _onchange_phase_id(self):
@@ -1,3 +1,15 @@
 # -*- coding: utf-8 -*-
 
 from . import test_construction_details
+from . import test_construction_dashboard
+from . import test_cost_ledger
+from . import test_boq_rollup
+from . import test_boq_import
+from . import test_boq_revision
+from . import test_budget_variance
+from . import test_reprice
+from . import test_rate_analysis
+from . import test_escalation
+from . import test_scenario
+from . import test_task_library_import
+from . import test_catalog_search
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+import base64
+
+from flectra.tests import common
+
+BOQ_CSV = """line,work_type,work_subtype,description,quantity,uom,type,item,item_quantity,price
+1,Concrete,,Foundation,2,,labor,Mason,10,20
+1,Concrete,,Foundation,2,,overhead,Site Office,,50
+2,Unknown,,Roof,1,,labor,Roofer,5,30
+2,Unknown,,Roof,1,,overhead,Scaffold,,10
+3,Concrete,,Columns,1,,labor,Mason,4,abc
+3,Concrete,,Columns,1,,labor,Helper,4,10
+"""
+
+
+class TestBoqImport(common.TransactionCase):
+    def setUp(self):
+        super().setUp()
+        project = self.env["project.project"].create({"name": "Import Project"})
+        self.env["construction.work.type"].create({"name": "Concrete"})
+        self.boq = self.env["construction.boq"].create({"project_id": project.id})
+
+    def test_import_creates_lines_and_reports_errors(self):
+        wizard = self.env["construction.import.boq.wizard"].create({
+            "boq_id": self.boq.id,
+            "file": base64.b64encode(BOQ_CSV.encode()),
+            "file_name": "tender.csv",
+            "batch_size": 1,
+        })
+        wizard.action_import()
+
+        self.assertEqual(wizard.state, "done")
+        self.assertEqual(wizard.imported_line_count, 2)
+        self.assertEqual(wizard.imported_row_count, 3)
+        self.assertEqual(wizard.error_count, 3)
+        self.assertIn("Row 4", wizard.error_log)
+        self.assertIn("Row 6", wizard.error_log)
+
+        foundation = self.boq.line_ids.filtered(lambda line: line.description == "Foundation")
+        self.assertEqual(len(foundation.labor_line_ids), 1)
+        self.assertEqual(foundation.total, 250.0)
+        self.assertEqual(self.boq.total_labor, 240.0)
+        self.assertEqual(self.boq.total_budget, 290.0)
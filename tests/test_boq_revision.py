@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from flectra.tests import common
+
+
+class TestBoqRevision(common.TransactionCase):
+    def setUp(self):
+        super().setUp()
+        project = self.env["project.project"].create({"name": "Revision Project"})
+        self.concrete = self.env["construction.work.type"].create({"name": "Concrete"})
+        self.steel = self.env["construction.work.type"].create({"name": "Steel"})
+        self.boq = self.env["construction.boq"].create({
+            "project_id": project.id,
+            "line_ids": [(0, 0, {
+                "work_type_id": work_type.id,
+                "description": work_type.name,
+                "overhead_line_ids": [(0, 0, {"name": "Cost", "amount": 100.0})],
+            }) for work_type in (self.concrete, self.steel)],
+        })
+
+    def test_revisions_store_only_changed_lines(self):
+        first = self.boq.action_create_revision()
+        self.assertEqual(first.changed_line_count, 2)
+        self.assertFalse(self.boq.action_create_revision(), "An unchanged BOQ needs no new revision.")
+
+        concrete_line = self.boq.line_ids.filtered(lambda line: line.work_type_id == self.concrete)
+        concrete_line.overhead_line_ids.amount = 250.0
+        second = self.boq.action_create_revision()
+
+        self.assertEqual(second.parent_id, first)
+        self.assertEqual(second.changed_line_count, 1)
+        self.assertEqual(self.boq.current_revision_id, second)
+        self.assertEqual(len(second._get_snapshot()), 2)
+        self.assertEqual(second._get_snapshot()[str(concrete_line.id)]["overhead_lines"], [["Cost", 250.0, 250.0]])
+        self.assertEqual(first._get_snapshot()[str(concrete_line.id)]["overhead_lines"], [["Cost", 100.0, 100.0]],
+                         "A revision must keep the cost lines it was taken with.")
+
+        self.boq.line_ids.filtered(lambda line: line.work_type_id == self.steel).unlink()
+        third = self.boq.action_create_revision()
+        self.assertEqual((third.changed_line_count, third.removed_line_count), (0, 1))
+        self.assertEqual(list(third._get_snapshot()), [str(concrete_line.id)])
+
+        deltas = {values["work_type_id"]: values["total_delta"] for values in first._compare(third)}
+        self.assertEqual(deltas, {self.concrete.id: 150.0, self.steel.id: -100.0})
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+from flectra.tests import common
+
+
+class TestBoqRollup(common.TransactionCase):
+    def setUp(self):
+        super().setUp()
+        self.project = self.env["project.project"].create({"name": "Rollup Project"})
+        self.work_type = self.env["construction.work.type"].create({"name": "Concrete"})
+        self.boq = self.env["construction.boq"].create({
+            "project_id": self.project.id,
+            "line_ids": [(0, 0, {
+                "work_type_id": self.work_type.id,
+                "description": "Foundation",
+                "labor_line_ids": [(0, 0, {"name": "Mason", "hours": 10.0, "rate": 20.0})],
+                "overhead_line_ids": [(0, 0, {"name": "Site Office", "amount": 50.0})],
+            })],
+        })
+        self.line = self.boq.line_ids
+
+    def test_totals_follow_line_changes(self):
+        self.assertEqual(self.line.labor_total, 200.0)
+        self.assertEqual(self.line.total, 250.0)
+        self.assertEqual(self.boq.total_labor, 200.0)
+        self.assertEqual(self.boq.total_budget, 250.0)
+
+        self.line.labor_line_ids.hours = 15.0
+        self.assertEqual(self.line.total, 350.0)
+        self.assertEqual(self.boq.total_budget, 350.0)
+
+        self.line.overhead_line_ids.unlink()
+        self.assertEqual(self.line.overhead_total, 0.0)
+        self.assertEqual(self.boq.total_overhead, 0.0)
+        self.assertEqual(self.boq.total_budget, 300.0)
+
+        self.line.unlink()
+        self.assertEqual(self.boq.total_budget, 0.0)
+
+    def test_reconciliation_fixes_drifted_totals(self):
+        self.line.write({"labor_total": 999.0, "total": 999.0})
+        self.boq.write({"total_labor": 1.0, "total_budget": 1.0})
+
+        self.boq._cron_reconcile_totals()
+
+        self.assertEqual(self.line.labor_total, 200.0)
+        self.assertEqual(self.line.total, 250.0)
+        self.assertEqual(self.boq.total_labor, 200.0)
+        self.assertEqual(self.boq.total_budget, 250.0)
+
+    def test_phase_totals_follow_entries(self):
+        phase = self.env["construction.project.phase"].create({
+            "name": "Excavation",
+            "project_id": self.project.id,
+            "labor_entry_ids": [(0, 0, {"name": "Digger", "hours": 4.0, "rate": 25.0})],
+        })
+        self.assertEqual(phase.total_labor, 100.0)
+        phase.labor_entry_ids.rate = 30.0
+        self.assertEqual(phase.total_cost, 120.0)
+
+    def test_generate_phases_from_approved_boq(self):
+        self.boq.action_approve()
+        self.boq.action_generate_phases()
+
+        phase = self.env["construction.project.phase"].search([("boq_line_id", "=", self.line.id)])
+        self.assertEqual(len(phase), 1)
+        self.assertEqual(phase.project_id, self.project)
+        self.assertEqual(phase.labor_entry_ids.boq_hours, 10.0)
+        self.assertEqual(phase.total_labor, 200.0)
+        self.assertEqual(phase.total_cost, 250.0)
+
+        self.boq.action_generate_phases()
+        self.assertEqual(self.env["construction.project.phase"].search_count([("boq_line_id", "=", self.line.id)]), 1,
+                         "A BOQ line must not generate its phase twice.")
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from flectra.tests import common
+
+
+class TestBudgetVariance(common.TransactionCase):
+    def setUp(self):
+        super().setUp()
+        self.project = self.env["project.project"].create({"name": "Variance Project"})
+        self.work_type = self.env["construction.work.type"].create({"name": "Concrete"})
+        self.boq = self.env["construction.boq"].create({
+            "project_id": self.project.id,
+            "line_ids": [(0, 0, {
+                "work_type_id": self.work_type.id,
+                "description": "Foundation",
+                "labor_line_ids": [(0, 0, {"name": "Mason", "hours": 10.0, "rate": 20.0})],
+                "overhead_line_ids": [(0, 0, {"name": "Site Office", "amount": 50.0})],
+            })],
+        })
+        self.report_model = self.env["construction.budget.variance.report"]
+
+    def test_budget_variance_report(self):
+        self.env.flush_all()
+        report = self.report_model.search([("project_id", "=", self.project.id)])
+        self.assertEqual(len(report), 1)
+        self.assertEqual(report.work_type_id, self.work_type)
+        self.assertEqual(report.boq_amount, 250.0)
+        self.assertEqual(report.actual_amount, 0.0)
+        self.assertEqual(report.variance_amount, 250.0)
+
+    def test_committed_amount_in_company_currency(self):
+        currency = self.env["res.currency"].create({
+            "name": "CMX",
+            "symbol": "X",
+            "rate_ids": [(0, 0, {"name": "2000-01-01", "rate": 2.0})],
+        })
+        site = self.env["construction.site"].create({"name": "Variance Site"})
+        construction = self.env["construction.details"].create({"site_id": site.id, "project_id": self.project.id})
+        order = self.env["purchase.order"].create({
+            "partner_id": self.env["res.partner"].create({"name": "Supplier"}).id,
+            "currency_id": currency.id,
+            "construction_id": construction.id,
+            "order_line": [(0, 0, {
+                "product_id": self.env["product.product"].create({"name": "Cement"}).id,
+                "product_qty": 1.0,
+                "price_unit": 100.0,
+                "taxes_id": [(5, 0, 0)],
+            })],
+        })
+        order.button_confirm()
+        self.assertEqual(order.currency_rate, 2.0)
+
+        self.env.flush_all()
+        report = self.report_model.search([("project_id", "=", self.project.id), ("work_type_id", "=", False)])
+        self.assertEqual(report.committed_amount, 50.0,
+                         "Order lines must be reported in the company currency.")
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from flectra.tests import common
+
+
+class TestCatalogSearch(common.TransactionCase):
+    def setUp(self):
+        super().setUp()
+        if not self.registry.has_trigram:
+            self.skipTest("The pg_trgm extension is not available")
+        self.tools = self.env["construction.tools.catalog"].create([
+            {"name": "Hammer Drill", "code": "HD-200"},
+            {"name": "Drill Bit Set", "code": "DB-010", "description": "Masonry drill bits"},
+            {"name": "Angle Grinder", "code": "AG-115"},
+        ])
+
+    def test_ranked_name_search(self):
+        result = self.env["construction.tools.catalog"].name_search("drill bit")
+        self.assertEqual(result[0][0], self.tools[1].id)
+        self.assertNotIn(self.tools[2].id, [record_id for record_id, dummy in result])
+
+    def test_fuzzy_name_search(self):
+        result = self.env["construction.tools.catalog"].name_search("hamer dril")
+        self.assertEqual(result[0][0], self.tools[0].id)
+        result = self.env["construction.tools.catalog"].name_search("AG-115")
+        self.assertEqual([record_id for record_id, dummy in result], [self.tools[2].id])
+
+    def test_product_name_search(self):
+        cement = self.env["product.product"].create({
+            "name": "Portland Cement", "default_code": "CEM-42", "is_material": True,
+        })
+        result = self.env["product.product"].name_search("portland cemnt", [("is_material", "=", True)])
+        self.assertEqual(result[0][0], cement.id)
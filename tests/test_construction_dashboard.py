@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+from flectra.tests import common
+
+
+class TestConstructionDashboard(common.TransactionCase):
+    def setUp(self):
+        super().setUp()
+        self.dashboard_model = self.env["construction.dashboard"]
+        self.site_type = self.env["site.type"].create({"name": "Residential"})
+        self.site = self.env["construction.site"].create({
+            "name": "Dashboard Site",
+            "site_type_id": self.site_type.id,
+        })
+
+    def test_stats_follow_construction_stages(self):
+        before = self.dashboard_model._get_dashboard_stats()
+        self.env["construction.details"].create([
+            {"site_id": self.site.id, "estimate_cost": 1000.0},
+            {"site_id": self.site.id, "estimate_cost": 500.0, "stage": "in_progress"},
+        ])
+        after = self.dashboard_model._get_dashboard_stats()
+
+        self.assertEqual(after["job_order"], before["job_order"] + 1)
+        self.assertEqual(after["site_in_progress"], before["site_in_progress"] + 1)
+        self.assertAlmostEqual(after["total_budget"], before["total_budget"] + 1500.0)
+        self.assertEqual(after["remaining_budget"], after["total_budget"] - after["total_spent"])
+
+    def test_entry_points_share_the_same_payload(self):
+        stats = self.dashboard_model._get_dashboard_stats()
+        payload = self.dashboard_model.get_construction_stats()
+        defaults = self.dashboard_model.default_get(["total_site", "cancel_site", "total_budget"])
+
+        self.assertEqual(payload["total_site"], stats["total_site"])
+        self.assertEqual(payload["complete_site"], stats["complete_site"] + stats["close_site"])
+        self.assertEqual(defaults["cancel_site"], stats["cancel_site"])
+        self.assertIn(self.site_type.name, payload["site_type"][0])
+        index = payload["site_type"][0].index(self.site_type.name)
+        self.assertEqual(payload["site_type"][1][index], 1)
+
+    def test_snapshot_serves_dashboard_until_refreshed(self):
+        snapshot = self.env["construction.dashboard.snapshot"]._get_snapshot()
+        snapshot.action_refresh()
+        total_site = snapshot.total_site
+        self.assertTrue(snapshot.refresh_date)
+
+        self.env["construction.site"].create({"name": "Late Site"})
+        defaults = self.dashboard_model.default_get(["total_site", "snapshot_date"])
+        self.assertEqual(defaults["total_site"], total_site,
+                         "Dashboard reads must come from the stored snapshot.")
+
+        snapshot._refresh()
+        self.assertEqual(snapshot.total_site, total_site + 1,
+                         "A cron refresh must pick up sites written after the last refresh.")
+
+    def test_stats_cache_invalidated_by_stage_change(self):
+        construction = self.env["construction.details"].create({"site_id": self.site.id})
+        first = self.dashboard_model.get_construction_stats()
+        info = self.dashboard_model.get_stats_cache_info()
+
+        second = self.dashboard_model.get_construction_stats()
+        self.assertEqual(second, first)
+        self.assertEqual(self.dashboard_model.get_stats_cache_info()["hits"], info["hits"] + 1,
+                         "Unchanged data must be served from the cache.")
+
+        construction.write({"stage": "in_progress"})
+        third = self.dashboard_model.get_construction_stats()
+        self.assertEqual(third["site_in_progress"], first["site_in_progress"] + 1)
+        self.assertEqual(self.dashboard_model.get_stats_cache_info()["misses"], info["misses"] + 1,
+                         "A stage change must invalidate the cached statistics.")
+
+    def test_snapshot_is_per_company(self):
+        snapshot = self.env["construction.dashboard.snapshot"]._get_snapshot()
+        snapshot.action_refresh()
+        total_site = snapshot.total_site
+        version = snapshot.stats_version
+
+        other_company = self.env["res.company"].create({"name": "Other Construction Company"})
+        self.env["construction.site"].create({"name": "Other Site", "company_id": other_company.id})
+        self.assertNotEqual(self.dashboard_model._get_stats_version(), version,
+                            "Creating a site must mark the snapshots as outdated.")
+        snapshot._refresh()
+        self.assertEqual(snapshot.total_site, total_site,
+                         "A company snapshot must not count the sites of other companies.")
+
+        other_snapshot = self.env["construction.dashboard.snapshot"].create({"company_id": other_company.id})
+        other_snapshot.action_refresh()
+        self.assertEqual(other_snapshot.total_site,
+                         self.env["construction.site"].search_count(
+                             [("company_id", "in", [other_company.id, False])]))
@@ -1,4 +1,5 @@
 from flectra import fields
+from flectra.exceptions import ValidationError
 from flectra.tests import common
 
 
@@ -85,3 +86,113 @@ class TestConstructionDetails(common.TransactionCase):
             ("task_id", "=", task.id),
         ], limit=1)
         self.assertTrue(inspection, "Inspection record must link back to the generated task.")
+
+    def _create_equipment_groups(self, construction, count):
+        product = self.env["product.product"].create({
+            "name": "Test Excavator",
+            "type": "product",
+            "is_equipment": True,
+        })
+        return self.env["construction.equipment"].create([{
+            "name": f"Equipment {index}",
+            "construction_id": construction.id,
+            "construction_equipment_ids": [(0, 0, {
+                "equipment_id": product.id,
+                "qty": 1,
+                "cost": 100.0,
+            })],
+        } for index in range(count)])
+
+    def test_equipment_po_one_order_per_group(self):
+        construction = self._create_construction({
+            "customer_company_id": self.customer.id,
+        })
+        groups = self._create_equipment_groups(construction, 2)
+        orders = construction._generate_purchase_orders("equipment", consolidate=False)
+
+        self.assertEqual(len(orders), 2)
+        self.assertEqual(groups.mapped("equipment_po_id"), orders)
+        self.assertEqual(orders.mapped("equipment_id"), groups)
+        self.assertFalse(construction._generate_purchase_orders("equipment", consolidate=False),
+                         "Groups already ordered must not be ordered twice.")
+
+    def test_equipment_po_consolidated_per_vendor(self):
+        construction = self._create_construction({
+            "customer_company_id": self.customer.id,
+        })
+        groups = self._create_equipment_groups(construction, 2)
+        order = construction._generate_purchase_orders("equipment", consolidate=True)
+
+        self.assertEqual(len(order), 1)
+        self.assertEqual(len(order.order_line), 2)
+        self.assertEqual(groups.mapped("equipment_po_id"), order)
+        self.assertEqual(order.partner_id, self.customer)
+
+    def test_month_end_bills_created_in_one_batch(self):
+        construction = self._create_construction({
+            "customer_company_id": self.customer.id,
+        })
+        construction.stage = "in_progress"
+        expense_product = self.env["product.product"].create({
+            "name": "Site Electricity",
+            "type": "service",
+            "is_expense_product": True,
+        })
+        expenses = self.env["construction.expense"].create([{
+            "expense_product_id": expense_product.id,
+            "construction_id": construction.id,
+            "note": f"Expense {index}",
+            "cost": 50.0,
+        } for index in range(2)])
+
+        bills = construction.action_create_bills()
+
+        self.assertEqual(len(bills), 2)
+        self.assertEqual(set(bills.mapped("state")), {"posted"})
+        self.assertEqual(expenses.mapped("expense_bill_id"), bills)
+        self.assertFalse(construction.action_create_bills(), "Billed lines must not be billed twice.")
+
+    def test_stored_totals_follow_child_changes(self):
+        construction = self._create_construction()
+        engineer = self.env["construction.engineer.line"].create({
+            "construction_id": construction.id,
+            "charges": 300.0,
+        })
+        self.assertEqual(construction.total_engineer_charges, 300.0)
+        engineer.charges = 450.0
+        self.assertEqual(construction.total_engineer_charges, 450.0)
+
+        document = self.env["construction.document.line"].create({
+            "construction_id": construction.id,
+        })
+        self.assertFalse(construction.is_approved_document)
+        document.state = "approved"
+        self.assertTrue(construction.is_approved_document)
+        self.assertIn(construction, self.construction_model.search([("is_approved_document", "=", True)]))
+
+    def test_bulk_stage_transition(self):
+        records = self.construction_model.create([{"site_id": self.site.id} for dummy in range(3)])
+        records.write({"stage": "done"})
+        records.action_close_project()
+
+        self.assertEqual(set(records.mapped("stage")), {"close"})
+        self.assertTrue(all(rec.message_ids for rec in records),
+                        "Each transition must be logged in the chatter.")
+        with self.assertRaises(ValidationError):
+            records.action_confirm()
+
+    def test_bulk_transition_validates_before_writing(self):
+        confirmed, started = self.construction_model.create([{"site_id": self.site.id} for dummy in range(2)])
+        started.stage = "in_progress"
+        with self.assertRaises(ValidationError):
+            self.construction_model.bulk_transition_stage({
+                "cancel": confirmed.ids,
+                "close": started.ids,
+            })
+        self.assertEqual(confirmed.stage, "confirm", "No transition may be applied when one is invalid.")
+
+        self.construction_model.bulk_transition_stage({
+            "cancel": confirmed.ids,
+            "done": started.ids,
+        })
+        self.assertEqual((confirmed.stage, started.stage), ("cancel", "done"))
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+from flectra.tests import common
+
+
+class TestCostLedger(common.TransactionCase):
+    def setUp(self):
+        super().setUp()
+        self.site = self.env["construction.site"].create({"name": "Ledger Site"})
+        self.construction = self.env["construction.details"].create({
+            "site_id": self.site.id,
+            "estimate_cost": 10000.0,
+            "accountancy_type": "paid",
+        })
+        self.ledger_model = self.env["construction.cost.ledger"]
+
+    def test_accountancy_reads_ledger(self):
+        self.ledger_model.create([
+            {"construction_id": self.construction.id, "order_type": "labour",
+             "amount_all": 1200.0, "amount_paid": 200.0},
+            {"construction_id": self.construction.id, "order_type": "material",
+             "amount_all": 800.0, "amount_paid": 800.0},
+        ])
+        self.construction.invalidate_recordset()
+
+        self.assertEqual(self.construction.total_labour_bill_amount, 200.0)
+        self.assertEqual(self.construction.remaining_labour_bill_amount, 1000.0)
+        self.assertEqual(self.construction.total_to_pay, 2000.0)
+        self.assertEqual(self.construction.remaining_to_pay, 1000.0)
+        self.assertEqual(self.construction.remaining_budget_amount, 9000.0)
+
+    def test_refresh_drops_rows_without_bills(self):
+        self.ledger_model.create({
+            "construction_id": self.construction.id,
+            "order_type": "expense",
+            "amount_all": 50.0,
+        })
+        self.ledger_model._refresh_constructions(self.construction.ids)
+        self.assertFalse(self.ledger_model.search([("construction_id", "=", self.construction.id)]),
+                         "A refresh must rebuild the rows from the construction's bills only.")
+
+    def test_bill_hooks_update_totals_in_transaction(self):
+        vendor = self.env["res.partner"].create({"name": "Ledger Vendor"})
+        bill = self.env["account.move"].create({
+            "move_type": "in_invoice",
+            "partner_id": vendor.id,
+            "invoice_date": "2026-01-01",
+            "construction_id": self.construction.id,
+            "order_type": "labour",
+            "invoice_line_ids": [(0, 0, {"name": "Masonry", "quantity": 1.0, "price_unit": 300.0})],
+        })
+        bill.action_post()
+        self.assertEqual(self.construction.total_to_pay, bill.amount_total,
+                         "Posted bills must be counted without waiting for the commit.")
+        self.assertEqual(self.construction.total_labour_bill_amount, 0.0)
+        self.assertEqual(self.construction.remaining_labour_bill_amount, bill.amount_total)
+
+        self.env["account.payment.register"].with_context(
+            active_model="account.move", active_ids=bill.ids,
+        ).create({})._create_payments()
+        self.assertEqual(bill.payment_state, "paid")
+        self.assertEqual(self.construction.total_labour_bill_amount, bill.amount_total)
+        self.assertEqual(self.construction.remaining_labour_bill_amount, 0.0)
+        self.assertEqual(self.construction.remaining_budget_amount, 10000.0 - bill.amount_total)
+
+    def test_bill_hooks_write_ledger_at_commit(self):
+        vendor = self.env["res.partner"].create({"name": "Ledger Vendor"})
+        bill = self.env["account.move"].create({
+            "move_type": "in_invoice",
+            "partner_id": vendor.id,
+            "invoice_date": "2026-01-01",
+            "construction_id": self.construction.id,
+            "order_type": "labour",
+            "invoice_line_ids": [(0, 0, {"name": "Masonry", "quantity": 1.0, "price_unit": 300.0})],
+        })
+        bill.action_post()
+        self.assertEqual(self._read_committed_ledger(),
+                         [("labour", bill.amount_total, 0.0, self.construction.company_id.id)])
+
+        self.env["account.payment.register"].with_context(
+            active_model="account.move", active_ids=bill.ids,
+        ).create({})._create_payments()
+        self.assertEqual(self._read_committed_ledger(),
+                         [("labour", bill.amount_total, bill.amount_total, self.construction.company_id.id)],
+                         "Ledger rows updated at commit must reach the database.")
+
+    def _read_committed_ledger(self):
+        # flush and run the precommit hooks as a commit does, then read what reached the database
+        self.env.cr.flush()
+        self.env.cr.execute("""
+            SELECT order_type, amount_all, amount_paid, company_id
+              FROM construction_cost_ledger
+             WHERE construction_id = %s
+        """, [self.construction.id])
+        return self.env.cr.fetchall()
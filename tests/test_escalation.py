@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from datetime import date
+
+from psycopg2 import IntegrityError
+
+from flectra.tests import common
+from flectra.tools import mute_logger
+
+
+class TestEscalation(common.TransactionCase):
+    def setUp(self):
+        super().setUp()
+        project = self.env["project.project"].create({"name": "Escalation Project"})
+        self.work_type = self.env["construction.work.type"].create({"name": "Concrete"})
+        self.boq = self.env["construction.boq"].create({
+            "project_id": project.id,
+            "line_ids": [(0, 0, {
+                "work_type_id": self.work_type.id,
+                "description": "Foundation",
+                "labor_line_ids": [(0, 0, {"name": "Mason", "hours": 10.0, "rate": 10.0})],
+                "overhead_line_ids": [(0, 0, {"name": "Site Office", "amount": 50.0})],
+            })],
+        })
+        self.env["construction.escalation.index"].create({
+            "name": "Labor Index",
+            "cost_type": "labor",
+            "value_ids": [
+                (0, 0, {"date": date(2024, 1, 1), "value": 100.0}),
+                (0, 0, {"date": date(2024, 3, 1), "value": 110.0}),
+            ],
+        })
+
+    def test_boq_escalation(self):
+        wizard = self.env["construction.escalation.wizard"].create({
+            "target": "boq",
+            "boq_ids": [(6, 0, self.boq.ids)],
+            "base_date": date(2024, 1, 15),
+            "date_from": date(2024, 2, 1),
+            "date_to": date(2024, 4, 30),
+        })
+        wizard.action_compute()
+        self.assertEqual(wizard.line_ids.mapped("escalated_amount"), [150.0, 160.0, 160.0])
+        self.assertEqual(wizard.adjustment_amount, 20.0)
+
+    def test_rate_analysis_escalation(self):
+        rate = self.env["construction.rate.analysis"].create({
+            "work_type_id": self.work_type.id,
+            "unit_id": self.env.ref("uom.product_uom_unit").id,
+            "labor_line_ids": [(0, 0, {"name": "Mason", "hours": 1.0, "rate": 20.0})],
+        })
+        result = self.env["construction.escalation.index"]._escalate_rate_analyses(
+            rate, date(2024, 1, 1), [date(2024, 1, 1), date(2024, 3, 1)])
+        self.assertAlmostEqual(result[0][0], 20.0)
+        self.assertAlmostEqual(result[0][1], 22.0)
+
+    def test_unused_index_without_base_value(self):
+        self.env["construction.escalation.index"].create({
+            "name": "Steel Index",
+            "cost_type": "material",
+            "value_ids": [(0, 0, {"date": date(2025, 1, 1), "value": 100.0})],
+        })
+        result = self.env["construction.escalation.index"]._escalate_boq_lines(
+            self.boq.line_ids, date(2024, 1, 15), [date(2024, 3, 1)])
+        self.assertAlmostEqual(result[0][0], 160.0)
+
+    def test_company_index_preferred_over_shared(self):
+        Index = self.env["construction.escalation.index"]
+        shared = Index.search([("cost_type", "=", "labor")])
+        shared.company_id = False
+        with self.assertRaises(IntegrityError), mute_logger("flectra.sql_db"), self.cr.savepoint():
+            Index.create({"name": "Other Labor Index", "cost_type": "labor", "company_id": False})
+        Index.create({
+            "name": "Company Labor Index",
+            "cost_type": "labor",
+            "value_ids": [
+                (0, 0, {"date": date(2024, 1, 1), "value": 100.0}),
+                (0, 0, {"date": date(2024, 3, 1), "value": 150.0}),
+            ],
+        })
+        result = Index._escalate_boq_lines(self.boq.line_ids, date(2024, 1, 15), [date(2024, 3, 1)])
+        self.assertAlmostEqual(result[0][0], 200.0)
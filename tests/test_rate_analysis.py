@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+from flectra.exceptions import ValidationError
+from flectra.tests import common
+
+
+class TestRateAnalysis(common.TransactionCase):
+    def setUp(self):
+        super().setUp()
+        self.project = self.env["project.project"].create({"name": "Rate Project"})
+        self.work_type = self.env["construction.work.type"].create({"name": "Concrete"})
+        self.unit = self.env.ref("uom.product_uom_unit")
+        self.dozen = self.env.ref("uom.product_uom_dozen")
+        self.rate = self.env["construction.rate.analysis"].create({
+            "work_type_id": self.work_type.id,
+            "unit_id": self.unit.id,
+            "labor_line_ids": [(0, 0, {"name": "Mason", "hours": 2.0, "rate": 10.0})],
+            "overhead_line_ids": [(0, 0, {"name": "Tools", "amount": 5.0})],
+        })
+
+    def test_resolve_rates_converts_units(self):
+        company_id = self.env.company.id
+        key_unit = (company_id, self.work_type.id, False, self.unit.id)
+        key_dozen = (company_id, self.work_type.id, False, self.dozen.id)
+        rates = self.env["construction.rate.analysis"]._resolve_rates([key_unit, key_dozen])
+        self.assertEqual(rates[key_unit]["rate_analysis_id"], self.rate.id)
+        self.assertEqual(rates[key_unit]["labor_cost"], 20.0)
+        self.assertEqual(rates[key_unit]["total_rate"], 25.0)
+        self.assertAlmostEqual(rates[key_dozen]["total_rate"], 300.0)
+
+    def test_line_change_invalidates_cache(self):
+        key = (self.env.company.id, self.work_type.id, False, self.unit.id)
+        RateAnalysis = self.env["construction.rate.analysis"]
+        self.assertEqual(RateAnalysis._resolve_rates([key])[key]["total_rate"], 25.0)
+        self.rate.labor_line_ids.rate = 20.0
+        self.assertEqual(RateAnalysis._resolve_rates([key])[key]["total_rate"], 45.0)
+
+    def test_apply_rates_to_boq_and_job_costing(self):
+        boq = self.env["construction.boq"].create({
+            "project_id": self.project.id,
+            "line_ids": [(0, 0, {
+                "work_type_id": self.work_type.id,
+                "description": "Foundation",
+                "quantity": 4.0,
+                "unit_id": self.unit.id,
+            })],
+        })
+        boq.action_apply_rates()
+        self.assertEqual(boq.line_ids.rate_analysis_id, self.rate)
+        self.assertEqual(boq.line_ids.unit_rate, 25.0)
+        self.assertEqual(boq.line_ids.rate_amount, 100.0)
+
+        costing = self.env["job.costing"].create({
+            "area_plot": 10.0,
+            "work_type_id": self.work_type.id,
+            "area_unit_id": self.unit.id,
+        })
+        costing.action_apply_rates()
+        self.assertEqual(costing.construction_rate, 25.0)
+        self.assertEqual(costing.cost_of_construction, 250.0)
+
+    def test_composite_rates_follow_their_components(self):
+        RateAnalysis = self.env["construction.rate.analysis"]
+        mix = RateAnalysis.create({
+            "work_type_id": self.work_type.id,
+            "unit_id": self.unit.id,
+            "overhead_line_ids": [(0, 0, {"name": "Mixer", "amount": 10.0})],
+        })
+        slab = RateAnalysis.create({
+            "work_type_id": self.work_type.id,
+            "unit_id": self.unit.id,
+            "component_line_ids": [(0, 0, {"component_id": mix.id, "quantity": 2.0})],
+        })
+        self.rate.write({"component_line_ids": [(0, 0, {"component_id": slab.id, "quantity": 3.0})]})
+        self.assertEqual(slab.component_cost, 20.0)
+        self.assertEqual(slab.total_rate, 20.0)
+        self.assertEqual(self.rate.total_rate, 85.0)
+
+        mix.overhead_line_ids.amount = 15.0
+        self.assertEqual(slab.total_rate, 30.0)
+        self.assertEqual(slab.component_line_ids.unit_rate, 15.0)
+        self.assertEqual(self.rate.total_rate, 115.0)
+
+    def test_circular_components_are_rejected(self):
+        other = self.env["construction.rate.analysis"].create({
+            "work_type_id": self.work_type.id,
+            "unit_id": self.unit.id,
+            "component_line_ids": [(0, 0, {"component_id": self.rate.id, "quantity": 1.0})],
+        })
+        with self.assertRaises(ValidationError):
+            self.rate.write({"component_line_ids": [(0, 0, {"component_id": other.id, "quantity": 1.0})]})
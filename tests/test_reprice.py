@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from flectra.tests import common
+
+
+class TestReprice(common.TransactionCase):
+    def setUp(self):
+        super().setUp()
+        project = self.env["project.project"].create({"name": "Reprice Project"})
+        work_type = self.env["construction.work.type"].create({"name": "Concrete"})
+        self.cement = self.env["product.product"].create({
+            "name": "Cement", "is_material": True, "standard_price": 12.0,
+        })
+        self.boq = self.env["construction.boq"].create({
+            "project_id": project.id,
+            "line_ids": [(0, 0, {
+                "work_type_id": work_type.id,
+                "description": "Foundation",
+                "material_line_ids": [(0, 0, {"product_id": self.cement.id, "quantity": 10.0, "unit_price": 10.0})],
+                "overhead_line_ids": [(0, 0, {"name": "Site Office", "amount": 50.0})],
+            })],
+        })
+        self.rate = self.env["construction.rate.analysis"].create({
+            "work_type_id": work_type.id,
+            "unit_id": self.env.ref("uom.product_uom_unit").id,
+            "material_line_ids": [(0, 0, {"product_id": self.cement.id, "quantity": 2.0, "unit_price": 10.0})],
+        })
+
+    def test_preview_then_apply(self):
+        wizard = self.env["construction.reprice.wizard"].create({
+            "source": "standard_price",
+            "reprice_task_library": False,
+        })
+        wizard.action_preview()
+        self.assertEqual(wizard.changed_line_count, 2)
+        self.assertEqual(wizard.delta_amount, 24.0)
+        self.assertEqual(self.boq.line_ids.material_line_ids.unit_price, 10.0)
+
+        wizard.action_apply()
+        self.assertEqual(wizard.state, "done")
+        line = self.boq.line_ids
+        self.assertEqual(line.material_line_ids.unit_price, 12.0)
+        self.assertEqual(line.material_line_ids.total, 120.0)
+        self.assertEqual(line.material_total, 120.0)
+        self.assertEqual(self.boq.total_material, 120.0)
+        self.assertEqual(self.boq.total_budget, 170.0)
+        self.assertEqual(self.rate.material_cost, 24.0)
+        self.assertEqual(self.rate.total_rate, 24.0)
+
+    def test_approved_boq_is_not_repriced(self):
+        self.boq.action_approve()
+        wizard = self.env["construction.reprice.wizard"].create({"reprice_rate_analysis": False})
+        wizard.action_apply()
+        self.assertEqual(wizard.changed_line_count, 0)
+        self.assertEqual(self.boq.total_material, 100.0)
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+from flectra.tests import common
+
+
+class TestScenario(common.TransactionCase):
+    def setUp(self):
+        super().setUp()
+        project = self.env["project.project"].create({"name": "Scenario Project"})
+        work_type = self.env["construction.work.type"].create({"name": "Concrete"})
+        self.cement = self.env["product.product"].create({"name": "Cement", "is_material": True})
+        self.boq = self.env["construction.boq"].create({
+            "project_id": project.id,
+            "line_ids": [(0, 0, {
+                "work_type_id": work_type.id,
+                "description": "Foundation",
+                "material_line_ids": [(0, 0, {"product_id": self.cement.id, "quantity": 10.0, "unit_price": 10.0})],
+                "labor_line_ids": [(0, 0, {"name": "Mason", "hours": 10.0, "rate": 20.0})],
+            })],
+        })
+        self.phase = self.env["construction.project.phase"].create({
+            "name": "Excavation",
+            "project_id": project.id,
+            "material_entry_ids": [(0, 0, {"product_id": self.cement.id, "quantity": 5.0, "unit_price": 10.0})],
+        })
+
+    def test_simulation_ranks_impact_without_writing(self):
+        scenario = self.env["construction.scenario"].create({
+            "name": "Cement and labor increase",
+            "line_ids": [
+                (0, 0, {"override_type": "product", "product_id": self.cement.id, "new_price": 12.0}),
+                (0, 0, {"override_type": "labor", "labor_name": "Mason", "new_price": 25.0}),
+            ],
+        })
+        scenario.action_simulate()
+
+        self.assertEqual(scenario.result_ids.mapped("rank"), [1, 2])
+        boq_result, phase_result = scenario.result_ids
+        self.assertEqual(boq_result.boq_id, self.boq)
+        self.assertEqual(boq_result.current_amount, 300.0)
+        self.assertEqual(boq_result.delta_amount, 70.0)
+        self.assertEqual(boq_result.simulated_amount, 370.0)
+        self.assertEqual(phase_result.phase_id, self.phase)
+        self.assertEqual(phase_result.delta_amount, 10.0)
+        self.assertEqual(scenario.delta_amount, 80.0)
+        self.assertEqual(self.boq.total_budget, 300.0)
+        self.assertEqual(self.boq.line_ids.material_line_ids.unit_price, 10.0)
+
+    def test_rate_analysis_change_reaches_composite_rates(self):
+        RateAnalysis = self.env["construction.rate.analysis"]
+        unit = self.env.ref("uom.product_uom_unit")
+        mix_type = self.env["construction.work.type"].create({"name": "Mortar"})
+        slab_type = self.env["construction.work.type"].create({"name": "Slab"})
+        mix = RateAnalysis.create({
+            "work_type_id": mix_type.id,
+            "unit_id": unit.id,
+            "overhead_line_ids": [(0, 0, {"name": "Mixer", "amount": 10.0})],
+        })
+        slab = RateAnalysis.create({
+            "work_type_id": slab_type.id,
+            "unit_id": unit.id,
+            "component_line_ids": [(0, 0, {"component_id": mix.id, "quantity": 2.0})],
+        })
+        boq = self.env["construction.boq"].create({
+            "project_id": self.boq.project_id.id,
+            "line_ids": [(0, 0, {
+                "work_type_id": slab_type.id,
+                "description": "Ground Slab",
+                "quantity": 4.0,
+                "unit_id": unit.id,
+            })],
+        })
+        boq.action_apply_rates()
+        self.assertEqual(boq.line_ids.rate_analysis_id, slab)
+        self.assertEqual(boq.line_ids.rate_amount, 80.0)
+
+        scenario = self.env["construction.scenario"].create({
+            "name": "Mortar increase",
+            "line_ids": [(0, 0, {"override_type": "rate_analysis", "rate_analysis_id": mix.id, "new_price": 15.0})],
+        })
+        scenario.action_simulate()
+
+        result = scenario.result_ids.filtered(lambda rec: rec.boq_id == boq)
+        self.assertEqual(result.current_amount, 80.0)
+        self.assertEqual(result.delta_amount, 40.0)
+        self.assertEqual(result.simulated_amount, 120.0)
+        self.assertEqual(result.delta_percent, 50.0)
+        self.assertEqual(slab.total_rate, 20.0, "Simulating must not change the stored rates.")
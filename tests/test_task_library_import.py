@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+from flectra.exceptions import ValidationError
+from flectra.tests import common
+
+
+class TestTaskLibraryImport(common.TransactionCase):
+    def setUp(self):
+        super().setUp()
+        project = self.env["project.project"].create({"name": "Import Project"})
+        cement = self.env["product.product"].create({"name": "Cement", "is_material": True})
+        self.libraries = self.env["construction.task.library"].create([{
+            "name": "Slab",
+            "material_line_ids": [(0, 0, {"product_id": cement.id, "quantity": 2.0, "unit_price": 10.0})],
+            "labor_line_ids": [(0, 0, {"name": "Mason", "hours": 3.0, "rate": 5.0})],
+        }, {
+            "name": "Finishing",
+            "overhead_line_ids": [(0, 0, {"name": "Scaffolding", "amount": 40.0})],
+            "subcontractor_line_ids": [(0, 0, {"name": "Plastering", "quantity": 1.0, "unit_price": 25.0})],
+        }])
+        self.phases = self.env["construction.project.phase"].create([
+            {"name": "Ground Floor", "project_id": project.id},
+            {"name": "First Floor", "project_id": project.id},
+        ])
+
+    def test_import_into_several_phases(self):
+        wizard = self.env["construction.import.task.library.wizard"].with_context(
+            active_model="construction.project.phase", active_ids=self.phases.ids,
+        ).create({"task_library_ids": [(6, 0, self.libraries.ids)], "quantity_factor": 2.0})
+        self.assertEqual(wizard.phase_ids, self.phases)
+        wizard.action_import()
+        for phase in self.phases:
+            self.assertEqual(phase.material_entry_ids.quantity, 4.0)
+            self.assertEqual(phase.labor_entry_ids.hours, 6.0)
+            self.assertEqual(sorted(phase.overhead_entry_ids.mapped("amount")), [40.0, 50.0])
+            self.assertEqual(phase.total_material, 40.0)
+            self.assertEqual(phase.total_labor, 30.0)
+            self.assertEqual(phase.total_overhead, 90.0)
+            self.assertEqual(phase.total_cost, 160.0)
+
+    def test_only_draft_phases(self):
+        self.phases[0].state = "in_progress"
+        wizard = self.env["construction.import.task.library.wizard"].create({
+            "task_library_ids": [(6, 0, self.libraries.ids)],
+            "phase_ids": [(6, 0, self.phases.ids)],
+        })
+        with self.assertRaises(ValidationError):
+            wizard.action_import()
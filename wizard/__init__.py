@@ -2,4 +2,8 @@
 # Copyright 2020 - Today Techkhedut.
 # Part of Techkhedut. See LICENSE file for full copyright and licensing details.
 from . import construction_inspection
-from . import import_task_library
\ No newline at end of file
+from . import import_task_library
+from . import import_boq
+from . import boq_revision_compare
+from . import reprice
+from . import escalation
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+from flectra import fields, api, models
+from flectra.exceptions import ValidationError
+
+
+class BOQRevisionCompare(models.TransientModel):
+    _name = 'construction.boq.revision.compare'
+    _description = 'Compare BOQ Revisions'
+
+    boq_id = fields.Many2one('construction.boq', string='BOQ', required=True)
+    from_revision_id = fields.Many2one('construction.boq.revision', string='From Revision', required=True,
+                                       domain="[('boq_id', '=', boq_id)]")
+    to_revision_id = fields.Many2one('construction.boq.revision', string='To Revision', required=True,
+                                     domain="[('boq_id', '=', boq_id)]")
+    currency_id = fields.Many2one(related='boq_id.currency_id', readonly=True)
+    line_ids = fields.One2many('construction.boq.revision.compare.line', 'compare_id', string='Cost Deltas',
+                               readonly=True)
+    total_delta = fields.Monetary(string='Total Delta', compute='_compute_total_delta')
+
+    @api.model
+    def default_get(self, fields_list):
+        res = super().default_get(fields_list)
+        boq = self.env['construction.boq'].browse(res.get('boq_id'))
+        if boq.current_revision_id:
+            res.setdefault('to_revision_id', boq.current_revision_id.id)
+            res.setdefault('from_revision_id', (boq.current_revision_id.parent_id
+                                                or boq.current_revision_id).id)
+        return res
+
+    @api.depends('line_ids.total_delta')
+    def _compute_total_delta(self):
+        for rec in self:
+            rec.total_delta = sum(rec.line_ids.mapped('total_delta'))
+
+    def action_compare(self):
+        self.ensure_one()
+        if self.from_revision_id.boq_id != self.boq_id or self.to_revision_id.boq_id != self.boq_id:
+            raise ValidationError("! Both revisions must belong to the selected BOQ")
+        result = self.from_revision_id._compare(self.to_revision_id)
+        self.line_ids = [(5, 0, 0)] + [(0, 0, values) for values in result]
+        return {
+            'type': 'ir.actions.act_window',
+            'name': 'Compare Revisions',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+
+    def action_print(self):
+        return self.env.ref('construction_management.action_report_boq_revision_compare').report_action(self)
+
+
+class BOQRevisionCompareLine(models.TransientModel):
+    _name = 'construction.boq.revision.compare.line'
+    _description = 'BOQ Revision Cost Delta'
+    _order = 'id'
+
+    compare_id = fields.Many2one('construction.boq.revision.compare', required=True, ondelete='cascade')
+    currency_id = fields.Many2one(related='compare_id.currency_id', readonly=True)
+    work_type_id = fields.Many2one('construction.work.type', string='Work Type')
+    old_total = fields.Monetary(string='From Total')
+    new_total = fields.Monetary(string='To Total')
+    material_total_delta = fields.Monetary(string='Material Delta')
+    equipment_total_delta = fields.Monetary(string='Equipment Delta')
+    labor_total_delta = fields.Monetary(string='Labor Delta')
+    overhead_total_delta = fields.Monetary(string='Overhead Delta')
+    total_delta = fields.Monetary(string='Total Delta')
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import numpy
+from dateutil.relativedelta import relativedelta
+
+from flectra import fields, api, models
+from flectra.exceptions import ValidationError
+
+
+class EscalationWizard(models.TransientModel):
+    _name = 'construction.escalation.wizard'
+    _description = 'Price Escalation Wizard'
+
+    target = fields.Selection([
+        ('boq', 'BOQ'),
+        ('rate_analysis', 'Rate Analysis'),
+    ], string='Escalate', default='boq', required=True)
+    boq_ids = fields.Many2many('construction.boq', string='BOQs')
+    rate_analysis_ids = fields.Many2many('construction.rate.analysis', string='Rate Analyses')
+    base_date = fields.Date(string='Base Date', required=True, help="Date of the prices being escalated")
+    date_from = fields.Date(string='From', required=True, default=fields.Date.context_today)
+    date_to = fields.Date(string='To', required=True, default=fields.Date.context_today)
+    line_ids = fields.One2many('construction.escalation.wizard.line', 'wizard_id', string='Escalation')
+    currency_id = fields.Many2one('res.currency', default=lambda self: self.env.company.currency_id)
+    adjustment_amount = fields.Monetary(string='Total Adjustment', readonly=True)
+
+    @api.constrains('date_from', 'date_to')
+    def _check_dates(self):
+        for rec in self:
+            if rec.date_from > rec.date_to:
+                raise ValidationError("! The end date must be after the start date")
+
+    def _get_dates(self):
+        """Return the first day of every month of the period"""
+        dates = []
+        date = self.date_from.replace(day=1)
+        while date <= self.date_to:
+            dates.append(date)
+            date += relativedelta(months=1)
+        return dates
+
+    def _escalate_boqs(self, dates):
+        """Return the BOQs with their base totals and escalated totals per month"""
+        boqs = self.boq_ids or self.env['construction.boq'].search([('state', '!=', 'cancel')])
+        lines = self.env['construction.boq.line'].search([('boq_id', 'in', boqs.ids)])
+        escalated = self.env['construction.escalation.index']._escalate_boq_lines(lines, self.base_date, dates)
+        boq_rows = {boq_id: row for row, boq_id in enumerate(boqs.ids)}
+        line_boq_rows = numpy.array([boq_rows[line.boq_id.id] for line in lines], dtype=int)
+        escalated_totals = numpy.zeros((len(boqs), len(dates)))
+        numpy.add.at(escalated_totals, line_boq_rows, escalated)
+        base_totals = numpy.bincount(line_boq_rows, weights=lines.mapped('total'), minlength=len(boqs))
+        return boqs, base_totals, escalated_totals
+
+    def _escalate_rates(self, dates):
+        """Return the rate analyses with their total rates and escalated rates per month"""
+        rates = self.rate_analysis_ids or self.env['construction.rate.analysis'].search([])
+        escalated = self.env['construction.escalation.index']._escalate_rate_analyses(rates, self.base_date, dates)
+        return rates, numpy.array(rates.mapped('total_rate')), escalated
+
+    def action_compute(self):
+        """Escalate the BOQs or rate analyses for every month of the period, in one pass over all lines"""
+        self.ensure_one()
+        dates = self._get_dates()
+        if self.target == 'boq':
+            records, base_totals, escalated_totals = self._escalate_boqs(dates)
+        else:
+            records, base_totals, escalated_totals = self._escalate_rates(dates)
+        adjustments = escalated_totals - base_totals[:, None]
+        line_vals = [fields.Command.clear()]
+        for row, record in enumerate(records):
+            for column, date in enumerate(dates):
+                line_vals.append(fields.Command.create({
+                    '%s_id' % self.target: record.id,
+                    'date': date,
+                    'base_amount': float(base_totals[row]),
+                    'escalated_amount': float(escalated_totals[row, column]),
+                    'adjustment_amount': float(adjustments[row, column]),
+                }))
+        self.write({
+            'line_ids': line_vals,
+            'adjustment_amount': float(adjustments.sum()) if self.target == 'boq' else 0.0,
+        })
+        return {
+            'type': 'ir.actions.act_window',
+            'name': 'Price Escalation',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+
+
+class EscalationWizardLine(models.TransientModel):
+    _name = 'construction.escalation.wizard.line'
+    _description = 'Price Escalation Wizard Line'
+    _order = 'boq_id, rate_analysis_id, date'
+
+    wizard_id = fields.Many2one('construction.escalation.wizard', string='Wizard', required=True, ondelete='cascade')
+    boq_id = fields.Many2one('construction.boq', string='BOQ')
+    rate_analysis_id = fields.Many2one('construction.rate.analysis', string='Rate Analysis')
+    date = fields.Date(string='Month')
+    currency_id = fields.Many2one(related='wizard_id.currency_id')
+    base_amount = fields.Monetary(string='Base Amount')
+    escalated_amount = fields.Monetary(string='Escalated Amount')
+    adjustment_amount = fields.Monetary(string='Adjustment')
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+import csv
+import io
+import logging
+from collections import defaultdict
+
+from flectra import fields, api, models
+from flectra.exceptions import ValidationError
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+_logger = logging.getLogger(__name__)
+
+# Line type: (child model, product flag, quantity field, price field)
+BOQ_IMPORT_TYPES = {
+    'material': ('construction.boq.material.line', 'is_material', 'quantity', 'unit_price'),
+    'equipment': ('construction.boq.equipment.line', 'is_equipment', 'quantity', 'unit_price'),
+    'labor': ('construction.boq.labor.line', False, 'hours', 'rate'),
+    'overhead': ('construction.boq.overhead.line', False, False, 'amount'),
+}
+BOQ_IMPORT_REQUIRED_COLUMNS = {'line', 'work_type', 'description'}
+# Row errors kept in the import report, the remaining ones are only counted
+BOQ_IMPORT_MAX_ERRORS = 500
+
+
+class ImportBOQWizard(models.TransientModel):
+    _name = 'construction.import.boq.wizard'
+    _description = 'Import BOQ Lines Wizard'
+
+    boq_id = fields.Many2one('construction.boq', string='BOQ', required=True)
+    file = fields.Binary(string='File', required=True, attachment=True)
+    file_name = fields.Char(string='File Name')
+    batch_size = fields.Integer(string='Batch Size', default=1000)
+    state = fields.Selection([('draft', 'Draft'), ('done', 'Done')], default='draft')
+    imported_line_count = fields.Integer(string='Imported BOQ Lines', readonly=True)
+    imported_row_count = fields.Integer(string='Imported Rows', readonly=True)
+    error_count = fields.Integer(string='Rejected Rows', readonly=True)
+    error_log = fields.Text(string='Errors', readonly=True)
+
+    def _open_file(self):
+        """Return a binary stream on the uploaded file, read from the filestore when possible"""
+        attachment = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name), ('res_field', '=', 'file'), ('res_id', '=', self.id)], limit=1)
+        if attachment.store_fname:
+            return open(attachment._full_path(attachment.store_fname), 'rb')
+        return io.BytesIO(attachment.raw or b'')
+
+    def _read_rows(self):
+        """Yield ``(row number, {column: value})`` for every data row, one row at a time"""
+        stream = self._open_file()
+        try:
+            if (self.file_name or '').lower().endswith('.xlsx'):
+                if openpyxl is None:
+                    raise ValidationError("! The openpyxl library is required to import XLSX files")
+                workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+                rows = workbook.active.iter_rows(values_only=True)
+            else:
+                rows = csv.reader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+            header = [str(column or '').strip().lower() for column in next(rows, [])]
+            missing = BOQ_IMPORT_REQUIRED_COLUMNS.difference(header)
+            if missing:
+                raise ValidationError("! Missing columns in the file: %s" % ", ".join(sorted(missing)))
+            for number, values in enumerate(rows, start=2):
+                if not any(values):
+                    continue
+                yield number, dict(zip(header, ('' if value is None else str(value).strip() for value in values)))
+        finally:
+            stream.close()
+
+    @api.model
+    def _get_lookups(self):
+        """Load the work types, sub types, units and products referenced by name or internal reference"""
+        lookups = {
+            'work_type': {rec['name'].lower(): rec['id']
+                          for rec in self.env['construction.work.type'].search_read([], ['name'])},
+            'work_subtype': {(rec['work_type_id'][0], rec['name'].lower()): rec['id']
+                             for rec in self.env['construction.work.subtype'].search_read(
+                                 [('work_type_id', '!=', False)], ['name', 'work_type_id'])},
+            'uom': {rec['name'].lower(): rec['id'] for rec in self.env['uom.uom'].search_read([], ['name'])},
+            'is_material': {},
+            'is_equipment': {},
+        }
+        products = self.env['product.product'].search_read(
+            ['|', ('is_material', '=', True), ('is_equipment', '=', True)],
+            ['name', 'default_code', 'is_material', 'is_equipment'])
+        for product in products:
+            for flag in ('is_material', 'is_equipment'):
+                if product[flag]:
+                    lookups[flag].setdefault(product['name'].lower(), product['id'])
+                    if product['default_code']:
+                        lookups[flag][product['default_code'].lower()] = product['id']
+        return lookups
+
+    @api.model
+    def _parse_float(self, value, column):
+        try:
+            return float(value) if value else 0.0
+        except ValueError:
+            raise ValidationError("Invalid number '%s' in column %s" % (value, column))
+
+    def _prepare_line(self, row, lookups):
+        work_type_id = lookups['work_type'].get(row.get('work_type', '').lower())
+        if not work_type_id:
+            raise ValidationError("Unknown work type '%s'" % row.get('work_type'))
+        if not row.get('description'):
+            raise ValidationError("A description is required")
+        vals = {
+            'boq_id': self.boq_id.id,
+            'work_type_id': work_type_id,
+            'description': row['description'],
+            'quantity': self._parse_float(row.get('quantity'), 'quantity') or 1.0,
+            'material_total': 0.0,
+            'equipment_total': 0.0,
+            'labor_total': 0.0,
+            'overhead_total': 0.0,
+            'total': 0.0,
+        }
+        if row.get('work_subtype'):
+            vals['work_subtype_id'] = lookups['work_subtype'].get((work_type_id, row['work_subtype'].lower()))
+            if not vals['work_subtype_id']:
+                raise ValidationError("Unknown work sub type '%s'" % row['work_subtype'])
+        if row.get('uom'):
+            vals['unit_id'] = lookups['uom'].get(row['uom'].lower())
+            if not vals['unit_id']:
+                raise ValidationError("Unknown unit of measure '%s'" % row['uom'])
+        return vals
+
+    @api.model
+    def _prepare_child(self, row, line_type, lookups):
+        dummy, product_flag, quantity_field, price_field = BOQ_IMPORT_TYPES[line_type]
+        item = row.get('item', '')
+        if not item:
+            raise ValidationError("An item is required for %s lines" % line_type)
+        vals = {price_field: self._parse_float(row.get('price'), 'price')}
+        if product_flag:
+            vals['product_id'] = lookups[product_flag].get(item.lower())
+            if not vals['product_id']:
+                raise ValidationError("Unknown %s '%s'" % (line_type, item))
+        else:
+            vals['name'] = item
+        if quantity_field:
+            vals[quantity_field] = self._parse_float(row.get('item_quantity'), 'item_quantity') or 1.0
+        return vals, vals[price_field] * vals.get(quantity_field, 1.0)
+
+    def _create_lines(self, batch):
+        """Create a batch of BOQ lines with their totals, then their child lines in one create per type.
+
+        The line totals are computed while reading the file, so the child lines skip the rollup.
+        """
+        lines = self.env['construction.boq.line'].create([vals for vals, dummy in batch])
+        child_vals = defaultdict(list)
+        for line, (dummy, children) in zip(lines, batch):
+            for line_type, vals in children:
+                vals['boq_line_id'] = line.id
+                child_vals[line_type].append(vals)
+        for line_type, vals_list in child_vals.items():
+            self.env[BOQ_IMPORT_TYPES[line_type][0]].with_context(rollup_skip=True).create(vals_list)
+        return lines
+
+    def action_import(self):
+        """Stream the file and create the BOQ lines in batches.
+
+        Rows sharing the same ``line`` reference must follow each other and build one BOQ line;
+        a row with a ``type`` adds a material, equipment, labor or overhead line to it.
+        """
+        self.ensure_one()
+        if self.boq_id.state != 'draft':
+            raise ValidationError("! Lines can only be imported in a draft BOQ")
+        lookups = self._get_lookups()
+        batch_size = max(self.batch_size, 1)
+        errors = []
+        error_count = row_count = line_count = 0
+        batch = []
+        current_ref = current = None
+        for number, row in self._read_rows():
+            try:
+                if row.get('line', '') != current_ref:
+                    current_ref, current = row.get('line', ''), None
+                    current = (self._prepare_line(row, lookups), [])
+                    batch.append(current)
+                elif current is None:
+                    raise ValidationError("The BOQ line of this row was rejected")
+                line_type = row.get('type', '').lower()
+                if line_type:
+                    if line_type not in BOQ_IMPORT_TYPES:
+                        raise ValidationError("Unknown line type '%s'" % line_type)
+                    vals, total = self._prepare_child(row, line_type, lookups)
+                    line_vals = current[0]
+                    line_vals['%s_total' % line_type] += total
+                    line_vals['total'] += total
+                    current[1].append((line_type, vals))
+                row_count += 1
+            except ValidationError as error:
+                error_count += 1
+                if len(errors) < BOQ_IMPORT_MAX_ERRORS:
+                    errors.append("Row %s: %s" % (number, error.args[0]))
+            if len(batch) > batch_size:
+                # keep the line being read, its next rows may still add to it
+                line_count += len(self._create_lines(batch[:-1]))
+                batch = batch[-1:]
+                _logger.info("BOQ %s import: %s lines created from %s rows", self.boq_id.name, line_count, number)
+        if batch:
+            line_count += len(self._create_lines(batch))
+        _logger.info("BOQ %s import done: %s lines, %s rejected rows", self.boq_id.name, line_count, error_count)
+        self.write({
+            'state': 'done',
+            'imported_line_count': line_count,
+            'imported_row_count': row_count,
+            'error_count': error_count,
+            'error_log': "\n".join(errors),
+        })
+        return {
+            'type': 'ir.actions.act_window',
+            'name': 'Import BOQ Lines',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
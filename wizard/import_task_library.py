@@ -1,16 +1,40 @@
 # -*- coding: utf-8 -*-
 # Copyright 2020 - Today Techkhedut.
 # Part of Techkhedut. See LICENSE file for full copyright and licensing details.
+from collections import defaultdict
+
 from flectra import fields, api, models
 from flectra.exceptions import ValidationError
 
+# Line type: (wizard option, task library line model, phase entry model, scaled fields)
+TASK_LIBRARY_IMPORT_TYPES = {
+    'material': ('import_materials', 'construction.task.library.material.line',
+                 'construction.phase.material.entry', ['quantity']),
+    'equipment': ('import_equipment', 'construction.task.library.equipment.line',
+                  'construction.phase.equipment.entry', ['quantity']),
+    'labor': ('import_labor', 'construction.task.library.labor.line', 'construction.phase.labor.entry', ['hours']),
+    'overhead': ('import_overhead', 'construction.task.library.overhead.line',
+                 'construction.phase.overhead.entry', []),
+    # phases have no subcontractor entries, subcontracted work is budgeted as overhead
+    'subcontractor': ('import_subcontractor', 'construction.task.library.subcontractor.line',
+                      'construction.phase.overhead.entry', ['quantity']),
+}
+TASK_LIBRARY_IMPORT_FIELDS = {
+    'material': ['product_id', 'quantity', 'unit_price'],
+    'equipment': ['product_id', 'quantity', 'unit_price'],
+    'labor': ['name', 'hours', 'rate'],
+    'overhead': ['name', 'amount'],
+    'subcontractor': ['name', 'quantity', 'unit_price'],
+}
+
 
 class ImportTaskLibraryWizard(models.TransientModel):
     _name = 'construction.import.task.library.wizard'
     _description = 'Import Task Library to Phase Wizard'
 
-    task_library_id = fields.Many2one('construction.task.library', string='Task Library', required=True)
-    phase_id = fields.Many2one('construction.project.phase', string='Phase', required=True)
+    task_library_ids = fields.Many2many('construction.task.library', string='Task Libraries', required=True)
+    phase_ids = fields.Many2many('construction.project.phase', string='Phases', required=True,
+                                 domain=[('state', '=', 'draft')])
     
     import_materials = fields.Boolean(string='Import Materials', default=True)
     import_equipment = fields.Boolean(string='Import Equipment', default=True)
@@ -18,59 +42,76 @@ class ImportTaskLibraryWizard(models.TransientModel):
     import_overhead = fields.Boolean(string='Import Overhead', default=True)
     import_subcontractor = fields.Boolean(string='Import Subcontractor', default=True)
 
+    quantity_factor = fields.Float(string='Quantity Factor', default=1.0,
+                                   help="Multiplies the quantities and hours of the imported lines")
+    scale_by_boq_quantity = fields.Boolean(string='Scale by BOQ Quantity',
+                                           help="Also multiply the quantities of each phase by the quantity of "
+                                                "the BOQ line it was generated from")
+
+    @api.model
+    def default_get(self, fields_list):
+        res = super().default_get(fields_list)
+        active_ids = self.env.context.get('active_ids')
+        active_model = self.env.context.get('active_model')
+        if active_ids and active_model == 'construction.project.phase' and 'phase_ids' not in res:
+            res['phase_ids'] = [fields.Command.set(active_ids)]
+        elif active_ids and active_model == 'construction.task.library' and 'task_library_ids' not in res:
+            res['task_library_ids'] = [fields.Command.set(active_ids)]
+        return res
+
+    def _get_phase_factors(self):
+        factors = {}
+        for phase in self.phase_ids:
+            factor = self.quantity_factor
+            if self.scale_by_boq_quantity and phase.boq_line_id:
+                factor *= phase.boq_line_id.quantity
+            factors[phase.id] = factor
+        return factors
+
+    @api.model
+    def _prepare_entry(self, line_type, line, phase_id, factor):
+        vals = {name: value for name, value in line.items() if name not in ('id', 'task_library_id')}
+        for name in TASK_LIBRARY_IMPORT_TYPES[line_type][3]:
+            vals[name] *= factor
+        if line_type == 'subcontractor':
+            vals = {'name': vals['name'], 'amount': vals['quantity'] * vals['unit_price']}
+        vals['phase_id'] = phase_id
+        return vals
+
     def action_import(self):
-        """Import task library entries to the selected phase"""
+        """Import the entries of every task library into every phase.
+
+        The entries of all phases are prepared first and created with one create per entry model;
+        the phase totals are then rebuilt once.
+        """
         self.ensure_one()
-        if not self.phase_id:
-            raise ValidationError("Please select a phase to import to.")
-        
-        # Import Materials
-        if self.import_materials:
-            for line in self.task_library_id.material_line_ids:
-                self.env['construction.phase.material.entry'].create({
-                    'phase_id': self.phase_id.id,
-                    'product_id': line.product_id.id,
-                    'quantity': line.quantity,
-                    'unit_price': line.unit_price,
-                })
-        
-        # Import Equipment
-        if self.import_equipment:
-            for line in self.task_library_id.equipment_line_ids:
-                self.env['construction.phase.equipment.entry'].create({
-                    'phase_id': self.phase_id.id,
-                    'product_id': line.product_id.id,
-                    'quantity': line.quantity,
-                    'unit_price': line.unit_price,
-                })
-        
-        # Import Labor
-        if self.import_labor:
-            for line in self.task_library_id.labor_line_ids:
-                self.env['construction.phase.labor.entry'].create({
-                    'phase_id': self.phase_id.id,
-                    'name': line.name,
-                    'hours': line.hours,
-                    'rate': line.rate,
-                })
-        
-        # Import Overhead
-        if self.import_overhead:
-            for line in self.task_library_id.overhead_line_ids:
-                self.env['construction.phase.overhead.entry'].create({
-                    'phase_id': self.phase_id.id,
-                    'name': line.name,
-                    'amount': line.amount,
-                })
+        if not self.task_library_ids or not self.phase_ids:
+            raise ValidationError("! Select the task libraries and the phases to import to")
+        if any(state != 'draft' for state in self.phase_ids.mapped('state')):
+            raise ValidationError("! Task libraries can only be imported into draft phases")
+        factors = self._get_phase_factors()
+        entry_vals = defaultdict(list)
+        for line_type, (option, line_model, entry_model, dummy) in TASK_LIBRARY_IMPORT_TYPES.items():
+            if not self[option]:
+                continue
+            lines = self.env[line_model].search_read([('task_library_id', 'in', self.task_library_ids.ids)],
+                                                     TASK_LIBRARY_IMPORT_FIELDS[line_type], load=None,
+                                                     order='task_library_id, id')
+            for phase in self.phase_ids:
+                entry_vals[entry_model] += [self._prepare_entry(line_type, line, phase.id, factors[phase.id])
+                                            for line in lines]
+        entry_count = 0
+        for entry_model, vals_list in entry_vals.items():
+            entry_count += len(self.env[entry_model].with_context(rollup_skip=True).create(vals_list))
+        self.env['construction.project.phase']._reconcile_rollup_totals([('id', 'in', self.phase_ids.ids)])
         
         return {
             'type': 'ir.actions.client',
             'tag': 'display_notification',
             'params': {
                 'title': 'Success',
-                'message': 'Task library imported successfully to phase.',
+                'message': '%s entries imported into %s phases.' % (entry_count, len(self.phase_ids)),
                 'type': 'success',
                 'sticky': False,
             }
         }
-
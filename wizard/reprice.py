@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+import logging
+from collections import defaultdict
+
+from flectra import fields, api, models
+from flectra.exceptions import ValidationError
+from flectra.tools import split_every
+
+_logger = logging.getLogger(__name__)
+
+# Target: (parent field, priced line models)
+REPRICE_TARGETS = {
+    'boq': ('boq_line_id', ['construction.boq.material.line', 'construction.boq.equipment.line']),
+    'rate_analysis': ('rate_analysis_id',
+                      ['construction.rate.analysis.material', 'construction.rate.analysis.equipment']),
+    'task_library': ('task_library_id',
+                     ['construction.task.library.material.line', 'construction.task.library.equipment.line']),
+}
+
+
+class RepriceWizard(models.TransientModel):
+    _name = 'construction.reprice.wizard'
+    _description = 'Reprice Estimate Lines Wizard'
+
+    source = fields.Selection([
+        ('standard_price', 'Product Cost'),
+        ('vendor_price', 'Vendor Pricelist'),
+        ('last_purchase', 'Last Purchase Price'),
+    ], string='Price Source', default='standard_price', required=True)
+    reprice_boq = fields.Boolean(string='Draft BOQs', default=True)
+    reprice_rate_analysis = fields.Boolean(string='Rate Analysis', default=True)
+    reprice_task_library = fields.Boolean(string='Task Library', default=True)
+    product_ids = fields.Many2many('product.product', string='Products',
+                                   domain=['|', ('is_material', '=', True), ('is_equipment', '=', True)],
+                                   help="Leave empty to reprice every material and equipment")
+    state = fields.Selection([('draft', 'Draft'), ('preview', 'Preview'), ('done', 'Done')], default='draft')
+    line_ids = fields.One2many('construction.reprice.wizard.line', 'wizard_id', string='Price Changes')
+    changed_line_count = fields.Integer(string='Changed Lines', readonly=True)
+    delta_amount = fields.Float(string='Total Change', readonly=True)
+
+    def _get_targets(self):
+        return [target for target in REPRICE_TARGETS if self['reprice_%s' % target]]
+
+    def _get_line_domain(self, target):
+        domain = []
+        if target == 'boq':
+            domain.append(('boq_line_id.boq_id.state', '=', 'draft'))
+        if self.product_ids:
+            domain.append(('product_id', 'in', self.product_ids.ids))
+        return domain
+
+    @api.model
+    def _get_standard_prices(self, products, company):
+        prices = {}
+        for product in products.with_company(company):
+            if product.standard_price:
+                prices[product.id] = product.uom_id._compute_price(product.standard_price, product.uom_po_id)
+        return prices
+
+    @api.model
+    def _get_vendor_prices(self, products, company):
+        """Best valid vendor price of each product: variant prices first, then by sequence, quantity and price"""
+        today = fields.Date.context_today(self)
+        infos = self.env['product.supplierinfo'].search([
+            ('company_id', 'in', [company.id, False]),
+            '|', ('product_id', 'in', products.ids),
+            '&', ('product_id', '=', False), ('product_tmpl_id', 'in', products.product_tmpl_id.ids),
+            '|', ('date_start', '=', False), ('date_start', '<=', today),
+            '|', ('date_end', '=', False), ('date_end', '>=', today),
+        ], order='sequence, min_qty, price')
+        prices = {}
+        for info in infos.filtered('product_id') + infos.filtered(lambda rec: not rec.product_id):
+            for product in info.product_id or (info.product_tmpl_id.product_variant_ids & products):
+                if product.id not in prices:
+                    prices[product.id] = info.currency_id._convert(info.price, company.currency_id, company, today)
+        return prices
+
+    @api.model
+    def _get_last_purchase_prices(self, products, company):
+        """Unit price of the latest confirmed purchase of each product, in company currency"""
+        self.env['purchase.order.line'].flush_model(['product_id', 'product_uom', 'price_unit', 'order_id'])
+        self.env['purchase.order'].flush_model(['state', 'date_order', 'currency_rate', 'company_id'])
+        self.env.cr.execute("""
+            SELECT DISTINCT ON (pol.product_id) pol.product_id, pol.product_uom,
+                   pol.price_unit / COALESCE(NULLIF(po.currency_rate, 0), 1)
+              FROM purchase_order_line pol
+              JOIN purchase_order po ON po.id = pol.order_id
+             WHERE pol.product_id IN %s AND po.company_id = %s AND po.state IN ('purchase', 'done')
+          ORDER BY pol.product_id, po.date_order DESC, pol.id DESC
+        """, (tuple(products.ids), company.id))
+        prices = {}
+        for product_id, uom_id, price in self.env.cr.fetchall():
+            product = products.browse(product_id)
+            prices[product_id] = self.env['uom.uom'].browse(uom_id)._compute_price(price, product.uom_po_id)
+        return prices
+
+    def _get_prices(self, products, company):
+        """Return the new unit prices as ``{product id: price}``, products without price are left out"""
+        if not products:
+            return {}
+        return getattr(self, '_get_%s_prices' % self.source.replace('_price', ''))(products, company)
+
+    def _get_changes(self):
+        """Read the priced lines and return those whose price changes.
+
+        :return: ``{(target, line model): [(line id, parent id, company id, product id, old total,
+            new price, new total)]}``
+        """
+        self.ensure_one()
+        lines_by_model = {}
+        product_ids = set()
+        company_ids = set()
+        for target in self._get_targets():
+            parent_field = REPRICE_TARGETS[target][0]
+            for model in REPRICE_TARGETS[target][1]:
+                lines = self.env[model].search_read(
+                    self._get_line_domain(target),
+                    [parent_field, 'company_id', 'product_id', 'quantity', 'unit_price', 'total'], load=None)
+                lines_by_model[(target, model)] = (parent_field, lines)
+                product_ids.update(line['product_id'] for line in lines)
+                company_ids.update(line['company_id'] or self.env.company.id for line in lines)
+        products = self.env['product.product'].browse(product_ids)
+        prices = {company_id: self._get_prices(products, self.env['res.company'].browse(company_id))
+                  for company_id in company_ids}
+        changes = {}
+        for key, (parent_field, lines) in lines_by_model.items():
+            changes[key] = []
+            for line in lines:
+                company = self.env['res.company'].browse(line['company_id'] or self.env.company.id)
+                price = prices[company.id].get(line['product_id'])
+                if price is None or not company.currency_id.compare_amounts(price, line['unit_price'] or 0.0):
+                    continue
+                changes[key].append((line['id'], line[parent_field], company.id, line['product_id'],
+                                     line['total'] or 0.0, price,
+                                     company.currency_id.round(price * (line['quantity'] or 0.0))))
+        return changes
+
+    def action_preview(self):
+        """Dry run: list the price changes per target and product without touching the lines"""
+        self.ensure_one()
+        if not self._get_targets():
+            raise ValidationError("! Select at least one target to reprice")
+        summary = defaultdict(lambda: {'line_count': 0, 'old_amount': 0.0, 'new_amount': 0.0})
+        for (target, dummy), changes in self._get_changes().items():
+            for dummy, dummy, company_id, product_id, old_total, price, new_total in changes:
+                values = summary[(target, company_id, product_id, price)]
+                values['line_count'] += 1
+                values['old_amount'] += old_total
+                values['new_amount'] += new_total
+        line_vals = [fields.Command.clear()]
+        for (target, company_id, product_id, price), values in summary.items():
+            line_vals.append(fields.Command.create(dict(
+                values, target=target, company_id=company_id, product_id=product_id, new_price=price,
+                delta_amount=values['new_amount'] - values['old_amount'])))
+        self.write({
+            'state': 'preview',
+            'line_ids': line_vals,
+            'changed_line_count': sum(values['line_count'] for values in summary.values()),
+            'delta_amount': sum(values['new_amount'] - values['old_amount'] for values in summary.values()),
+        })
+        return self._reopen()
+
+    @api.model
+    def _write_prices(self, model, changes):
+        """Update the unit prices and totals of the lines with one statement per chunk, bypassing the ORM"""
+        Line = self.env[model]
+        Line.flush_model(['unit_price', 'total'])
+        for chunk in split_every(1000, changes, list):
+            params = []
+            for line_id, dummy, dummy, dummy, dummy, price, total in chunk:
+                params += [line_id, price, total]
+            self.env.cr.execute("""
+                UPDATE %s AS line
+                   SET unit_price = new.unit_price, total = new.total, write_uid = %%s,
+                       write_date = NOW() AT TIME ZONE 'UTC'
+                  FROM (VALUES %s) AS new (id, unit_price, total)
+                 WHERE line.id = new.id
+            """ % (Line._table, ", ".join(["(%s, %s::numeric, %s::numeric)"] * len(chunk))),
+                [self.env.uid] + params)
+        lines = Line.browse([change[0] for change in changes])
+        lines.invalidate_recordset(['unit_price', 'total', 'write_uid', 'write_date'])
+        return lines
+
+    def action_apply(self):
+        """Apply the price changes in bulk, then recompute the parent totals once"""
+        self.ensure_one()
+        if not self._get_targets():
+            raise ValidationError("! Select at least one target to reprice")
+        changed_line_count = 0
+        delta_amount = 0.0
+        boq_line_ids = set()
+        for (target, model), changes in self._get_changes().items():
+            if not changes:
+                continue
+            lines = self._write_prices(model, changes)
+            if target == 'boq':
+                boq_line_ids.update(change[1] for change in changes)
+            else:
+                # stored totals of the rate analyses and task library entries
+                lines.modified(['total'])
+            if target == 'rate_analysis':
+                rates = self.env['construction.rate.analysis'].browse({change[1] for change in changes})
+                rates._rates_changed(rates)
+            changed_line_count += len(changes)
+            delta_amount += sum(change[6] - change[4] for change in changes)
+            _logger.info("Repriced %s %s lines from %s", len(changes), model, self.source)
+        if boq_line_ids:
+            # the BOQ totals are rolled up: rebuild the touched lines, then their BOQs, in bulk
+            boq_lines = self.env['construction.boq.line'].browse(list(boq_line_ids))
+            boq_lines.with_context(rollup_skip=True)._reconcile_rollup_totals([('id', 'in', boq_lines.ids)])
+            self.env['construction.boq']._reconcile_rollup_totals([('id', 'in', boq_lines.boq_id.ids)])
+        self.env.flush_all()
+        self.write({'state': 'done', 'changed_line_count': changed_line_count, 'delta_amount': delta_amount})
+        return self._reopen()
+
+    def _reopen(self):
+        return {
+            'type': 'ir.actions.act_window',
+            'name': 'Reprice Estimates',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+
+
+class RepriceWizardLine(models.TransientModel):
+    _name = 'construction.reprice.wizard.line'
+    _description = 'Reprice Estimate Lines Wizard Line'
+    _order = 'target, delta_amount'
+
+    wizard_id = fields.Many2one('construction.reprice.wizard', string='Wizard', required=True, ondelete='cascade')
+    target = fields.Selection([
+        ('boq', 'BOQ'),
+        ('rate_analysis', 'Rate Analysis'),
+        ('task_library', 'Task Library'),
+    ], string='Target')
+    company_id = fields.Many2one('res.company', string='Company')
+    currency_id = fields.Many2one(related='company_id.currency_id', string='Currency')
+    product_id = fields.Many2one('product.product', string='Product')
+    line_count = fields.Integer(string='Lines')
+    old_amount = fields.Monetary(string='Current Amount')
+    new_price = fields.Monetary(string='New Unit Price')
+    new_amount = fields.Monetary(string='New Amount')
+    delta_amount = fields.Monetary(string='Change')